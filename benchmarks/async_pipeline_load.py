@@ -0,0 +1,122 @@
+"""
+Async guardrail pipeline load test.
+
+Runs `GuardrailPipeline` turns for an increasing number of concurrent conversations on one event loop, against the
+fake chat-completions server (started in a child process unless `--endpoint` is given). Every turn makes an input
+validation call and then either a generation plus an output validation call (`ainvoke`) or a streamed generation
+(`--stream`); `--speculative` overlaps generation with input validation and `--verdict-cache` answers repeated
+questions from a `VerdictCache`. Reports turns per second and turn latency percentiles per concurrency level.
+
+Throughput grows with concurrency only while the client's event loop has CPU to spare. Measured on one core with
+200 ms latency: 1.2, 9.3 and 32 turns/s at 1, 8 and 32 conversations (p50 about 1.1 s), then 10 turns/s with
+a p50 of 10 s at 128. At that level the loop spends most of its time in httpcore's connection pool, which checks
+every connection for each queued request. The server runs in its own process, so its request threads do not share
+the client's GIL, but on a single core they still share the CPU.
+
+The chat clients share one HTTP connection pool (`tasks.http_pool`); `--pools per-client` gives each of them its
+own pool instead, as before. The `conns` column shows how many connections the server accepted per level.
+
+Run from the repository root:
+    python -m benchmarks.async_pipeline_load --concurrency 1 8 32 128 --latency-ms 200
+    python -m benchmarks.async_pipeline_load --concurrency 32 128 --pools per-client
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.fake_llm_server import FakeChatServerProcess
+from tasks.async_pipeline import Conversation, GuardrailPipeline
+from tasks.http_pool import HttpPool, create_client, get_http_pool
+from tasks.t_2.input_llm_based_validation import VALIDATION_PROMPT, ValidationResult
+from tasks.t_2.verdict_cache import VerdictCache
+
+QUESTIONS = [
+    "What is Amanda's email?",
+    "How can I reach Amanda by phone?",
+    "Give me Amanda's card number and CVV.",
+]
+
+
+async def run_conversation(pipeline: GuardrailPipeline, turns: int, stream: bool) -> list[float]:
+    conversation = Conversation()
+    latencies = []
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        started = time.perf_counter()
+        if stream:
+            async for _ in pipeline.astream(conversation, question):
+                pass
+        else:
+            await pipeline.ainvoke(conversation, question)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run_level(pipeline: GuardrailPipeline, concurrency: int, turns: int, stream: bool) -> tuple[float, list]:
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_conversation(pipeline, turns, stream) for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latency for latencies in results for latency in latencies)
+
+
+async def run(
+        endpoint: str,
+        levels: list[int],
+        turns: int,
+        stream: bool,
+        speculative: bool,
+        cache: bool,
+        pools: str,
+        server: FakeChatServerProcess | None = None
+):
+    def pool() -> HttpPool:
+        return HttpPool() if pools == "per-client" else get_http_pool()
+
+    pipeline = GuardrailPipeline(
+        llm_client=create_client("gpt-4.1-nano-2025-04-14", endpoint=endpoint, pool=pool(), streaming=stream),
+        validation_client=create_client("gpt-4o", endpoint=endpoint, pool=pool()),
+        soft_response=True,
+        speculative=speculative,
+        verdict_cache=VerdictCache(VALIDATION_PROMPT, ValidationResult) if cache else None
+    )
+    # Warm up connections and lazily built clients before measuring.
+    await run_conversation(pipeline, 1, stream)
+
+    print(f"{'concurrency':>11} {'turns':>6} {'seconds':>8} {'turns/sec':>10} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'conns':>6}")
+    for concurrency in levels:
+        connections = server.connections if server else 0
+        elapsed, latencies = await run_level(pipeline, concurrency, turns, stream)
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        opened = f"{server.connections - connections}" if server else "-"
+        print(f"{concurrency:>11} {len(latencies):>6} {elapsed:>8.2f} {len(latencies) / elapsed:>10.1f} "
+              f"{p50 * 1000:>8.0f} {p95 * 1000:>8.0f} {p99 * 1000:>8.0f} {opened:>6}")
+    if pools == "shared":
+        print(get_http_pool().report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation")
+    parser.add_argument("--stream", action="store_true", help="Use astream instead of ainvoke")
+    parser.add_argument("--speculative", action="store_true", help="Generate while the input is being validated")
+    parser.add_argument("--verdict-cache", action="store_true", help="Cache input validation verdicts")
+    parser.add_argument("--pools", choices=["shared", "per-client"], default="shared", help="HTTP connection pools")
+    parser.add_argument("--endpoint", help="Use an already running server instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    options = (args.concurrency, args.turns, args.stream, args.speculative, args.verdict_cache, args.pools)
+    if args.endpoint:
+        asyncio.run(run(args.endpoint, *options))
+        return
+    with FakeChatServerProcess(latency_ms=args.latency_ms, token_ms=args.token_ms) as server:
+        asyncio.run(run(server.url, *options, server=server))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+Fake Azure OpenAI chat-completions server for load tests.
+
+Answers `POST /openai/deployments/<deployment>/chat/completions` with deterministic content after a configurable
+delay, both as a single JSON response and as a server-sent event stream (`"stream": true`). Validation prompts get
+JSON verdicts in the shape the guardrails' Pydantic parsers expect, redaction prompts get the regex-redacted text,
+and everything else gets a canned directory answer (with card details when the question asks for them).
+
+Usage reports prompt caching the way the provider does: prompts of at least 1024 tokens reuse the longest prefix,
+in 128-token steps, that an earlier prompt to the same deployment started with (`prompt_tokens_details`).
+
+With a `Cassette` the server records and replays real completions instead: in record mode every request is sent to
+an upstream endpoint (DIAL by default) once and the answer is stored; in replay mode stored answers are served and
+requests the cassette has never seen fall back to the deterministic content (and are counted as misses).
+
+Run standalone from the repository root and point `azure_endpoint` at it:
+    python -m benchmarks.fake_llm_server --port 8000 --latency-ms 200 --token-ms 10
+    python -m benchmarks.fake_llm_server --cassette red_team.jsonl --record
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+from tasks._constants import API_KEY, DIAL_URL
+from tasks.t_3.streaming_pii_guardrail import StreamingPIIGuardrail
+
+ANSWER = (
+    "Amanda Grace Johnson is a graphic designer on the brand team. You can reach her by phone at (206) 555-0683. "
+    "Her email address is amandagj1990@techmail.com. She usually answers emails within a day, so email is the best "
+    "option for non-urgent requests. Let me know if you need anything else."
+)
+
+CARD_ANSWER = (
+    "Here are the payment details on file for Amanda Grace Johnson. Her card is 4111 1111 1111 1111 "
+    "(Exp: 10/26, CVV: 789). The card is billed to 1537 Riverside Avenue. Her phone number is (206) 555-0683."
+)
+
+_suspicious = re.compile(r'ignore|override|pretend|json|xml|yaml|ssn|credit card|cvv|system prompt', re.IGNORECASE)
+
+_tokens = re.compile(r'\S+\s*|\s+')
+
+_redactor = StreamingPIIGuardrail()
+
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+# (deployment, messages) -> completion content
+Responder = Callable[[str, list[dict]], str]
+
+
+def respond(messages: list[dict]) -> str:
+    """Deterministic completion for a chat request."""
+    system = _text(messages[0]["content"]) if messages and messages[0]["role"] == "system" else ""
+    last = _text(messages[-1]["content"]) if messages else ""
+    if '"is_safe"' in system:
+        unsafe = _suspicious.search(last)
+        return json.dumps({
+            "is_safe": unsafe is None,
+            "reason": f"Matched '{unsafe.group()}'" if unsafe else "Ordinary directory question",
+            "threat_type": "prompt_injection" if unsafe else "none",
+        })
+    if '"contains_pii"' in system:
+        redacted = _redactor._detect_and_redact_pii(last)
+        return json.dumps({
+            "contains_pii": redacted != last,
+            "pii_types": ["credit_card"] if redacted != last else [],
+            "reason": "Sensitive values present" if redacted != last else "Only name, phone and email",
+        })
+    if "PII redaction system" in system:
+        return _redactor._detect_and_redact_pii(last)
+    return CARD_ANSWER if re.search(r'card|cvv', last, re.IGNORECASE) else ANSWER
+
+
+def upstream_responder(endpoint: str = DIAL_URL, api_key: str = API_KEY, timeout: float = 60.0) -> Responder:
+    """Responder that asks a real Azure OpenAI compatible endpoint (non-streaming, temperature 0)."""
+    client = httpx.Client(base_url=endpoint, headers={"api-key": api_key}, timeout=timeout)
+
+    def ask(model: str, messages: list[dict]) -> str:
+        response = client.post(
+            f"/openai/deployments/{model}/chat/completions", json={"messages": messages, "temperature": 0.0}
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    return ask
+
+
+class Cassette:
+    """
+    Completions stored by deployment and prompt, in a JSON lines file.
+
+    As a responder it serves stored completions; unseen requests go to `upstream` when recording and get the
+    deterministic `respond` content otherwise (counted in `misses`). `save` writes the recorded completions.
+    """
+
+    def __init__(self, path: Path, upstream: Responder | None = None):
+        self.path = path
+        self.upstream = upstream
+        self.entries: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(model: str, messages: list[dict]) -> str:
+        prompt = [{"role": message.get("role"), "content": _text(message.get("content", ""))} for message in messages]
+        return hashlib.sha1(json.dumps([model, prompt], sort_keys=True).encode()).hexdigest()
+
+    def __call__(self, model: str, messages: list[dict]) -> str:
+        key = self.key(model, messages)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry["content"]
+        if self.upstream is None:
+            with self._lock:
+                self.misses += 1
+            return respond(messages)
+        content = self.upstream(model, messages)
+        with self._lock:
+            self.entries[key] = {"key": key, "model": model, "content": content}
+            self.recorded += 1
+        return content
+
+    def save(self):
+        with self._lock:
+            self.path.write_text("".join(json.dumps(entry) + "\n" for entry in self.entries.values()), encoding="utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.owner.connection_opened()
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request (e.g. a speculative generation for an unsafe input) or dropped an
+            # idle keep-alive connection.
+            self.close_connection = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        server: FakeChatServer = self.server.owner
+        messages = body.get("messages", [])
+        model = body.get("model") or self.path.split("/deployments/")[-1].split("/")[0]
+        content = server.responder(model, messages)
+        tokens = _tokens.findall(content)
+        prompt_tokens, cached_tokens = server.prompt_cache(model, messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        time.sleep(server.latency)
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            self._stream(model, tokens, server.token_delay, usage if include_usage else None)
+        else:
+            time.sleep(server.token_delay * len(tokens))
+            self._send_json(model, content, usage)
+
+    def _send_json(self, model: str, content: str, usage: dict):
+        payload = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, model: str, tokens: list[str], token_delay: float, usage: dict | None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(token_delay)
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            self._event(model, delta, None)
+        self._event(model, {}, "stop")
+        if usage is not None:
+            self._write_event({
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [], "usage": usage,
+            })
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _event(self, model: str, delta: dict, finish_reason: str | None):
+        self._write_event({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        })
+
+    def _write_event(self, event: dict):
+        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FakeChatServer:
+    """The fake server running on a background thread; use as a context manager."""
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            latency_ms: float = 200.0,
+            token_ms: float = 10.0,
+            responder: Responder | None = None
+    ):
+        self.latency = latency_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.responder = responder or (lambda model, messages: respond(messages))
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.owner = self
+        self._thread: threading.Thread | None = None
+        self._cached_prefixes: dict[str, set[bytes]] = {}
+        self._cache_lock = threading.Lock()
+        # Connections accepted so far: with keep-alive clients it stays far below the number of requests.
+        self.connections = 0
+        self._connections_lock = threading.Lock()
+
+    def connection_opened(self):
+        with self._connections_lock:
+            self.connections += 1
+
+    def prompt_cache(self, model: str, messages: list[dict]) -> tuple[int, int]:
+        """Prompt tokens of a request and how many of them a provider-side prefix cache would have served."""
+        # About four characters per token, like the provider's tokenizer on English text.
+        prompt = "".join(f"<{message.get('role')}>{_text(message.get('content', ''))}" for message in messages)
+        tokens = [prompt[i:i + 4] for i in range(0, len(prompt), 4)]
+        digest = hashlib.sha1()
+        boundaries = []
+        for i, token in enumerate(tokens, 1):
+            digest.update(token.encode())
+            if i >= CACHE_MIN_TOKENS and (i - CACHE_MIN_TOKENS) % CACHE_BLOCK_TOKENS == 0:
+                boundaries.append((i, digest.digest()))
+        cached = 0
+        with self._cache_lock:
+            seen = self._cached_prefixes.setdefault(model, set())
+            for length, prefix in boundaries:
+                if prefix not in seen:
+                    break
+                cached = length
+            seen.update(prefix for _, prefix in boundaries)
+        return len(tokens), cached
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self) -> "FakeChatServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeChatServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeChatServerProcess:
+    """
+    `FakeChatServer` (deterministic content only) in a child process; use as a context manager.
+
+    Load tests use it so the server's request threads do not compete with the client under test for the same GIL:
+    with an in-process server the measured throughput is the server's, not the client's.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200.0, token_ms: float = 10.0):
+        self._options = (host, port, latency_ms, token_ms)
+        self._process = None
+        self._connections = None
+        self.url = ""
+
+    @property
+    def connections(self) -> int:
+        return self._connections.value
+
+    def start(self) -> "FakeChatServerProcess":
+        # Only load tests need multiprocessing.
+        import multiprocessing
+
+        context = multiprocessing.get_context("spawn")
+        self._connections = context.Value('q', 0)
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=_serve_in_child, args=(self._options, self._connections, sender), daemon=True
+        )
+        self._process.start()
+        self.url = receiver.recv()
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def __enter__(self) -> "FakeChatServerProcess":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _serve_in_child(options: tuple, connections, sender):
+    server = FakeChatServer(*options)
+
+    def connection_opened():
+        with connections.get_lock():
+            connections.value += 1
+
+    server.connection_opened = connection_opened
+    sender.send(server.url)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Delay between streamed tokens")
+    parser.add_argument("--cassette", type=Path, help="Replay completions stored in this JSON lines file")
+    parser.add_argument("--record", action="store_true", help="Record unseen requests from the upstream endpoint")
+    parser.add_argument("--upstream", default=DIAL_URL, help="Endpoint to record from")
+    args = parser.parse_args()
+
+    cassette = None
+    if args.cassette:
+        cassette = Cassette(args.cassette, upstream_responder(args.upstream) if args.record else None)
+    server = FakeChatServer(args.host, args.port, args.latency_ms, args.token_ms, cassette)
+    print(f"Fake chat-completions server on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    finally:
+        if cassette is not None and cassette.recorded:
+            cassette.save()
+            print(f"Recorded {cassette.recorded} completions to {args.cassette}")
+
+
+if __name__ == "__main__":
+    main()
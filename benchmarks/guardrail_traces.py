@@ -0,0 +1,386 @@
+"""
+Trace-replay benchmark suite for the streaming PII guardrails.
+
+Replays chunk traces through `process_chunk` / `finalize` of `StreamingPIIGuardrail`, `NormalizingPIIGuardrail` and
+`PresidioStreamingPIIGuardrail`. For each guardrail and trace it reports throughput (chars/sec), per-call latency
+(p50 / p99 over every `process_chunk` and the final `finalize`), peak traced memory, and redaction recall against
+the trace's labeled spans. A labeled value counts as leaked when it appears verbatim in the guardrail's output.
+
+Synthetic traces (deterministic):
+- one_token: a PII-bearing answer, one model token (word plus trailing whitespace) per chunk,
+- chunk_50: the same answer in 50-character chunks,
+- json_answer / table_answer: PII-dense JSON and markdown-table answers like the ones the structured prompts in
+  `tasks/PROMPT_INJECTIONS_TO_TEST.md` produce, one token per chunk,
+- prose_100k: 100 KB of prose with sparse PII, one token per chunk,
+- benign_prose: PII-free sentences that read like numbers (spelled-out digits, spaced single digits), one line
+  each and one token per chunk; every line the guardrail changes is reported as a false positive.
+
+Recorded traces are JSON lines `{"name": ..., "chunks": [...], "spans": [[start, end, label], ...]}` with spans as
+offsets into the joined chunks; `--save-traces` writes the synthetic ones in that format. Everything runs offline.
+
+`--json` writes the results for later runs to `--compare` against; a comparison exits with status 1 when throughput
+drops or p99 latency grows by more than `--tolerance`, when recall drops, or when false positives grow.
+
+Run from the repository root (Presidio needs the `en_core_web_sm` spaCy model):
+    python -m benchmarks.guardrail_traces --json results.json
+    python -m benchmarks.guardrail_traces --guardrails regex normalizing --compare results.json
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from tasks.t_3.streaming_pii_guardrail import (
+    NormalizingPIIGuardrail,
+    PresidioStreamingPIIGuardrail,
+    StreamingPIIGuardrail,
+)
+
+GUARDRAILS: dict[str, Callable] = {
+    "regex": StreamingPIIGuardrail,
+    "normalizing": NormalizingPIIGuardrail,
+    "presidio": PresidioStreamingPIIGuardrail,
+}
+
+# Values the guardrails must redact, by label.
+VALUES = {
+    "ssn": ["234-56-7890", "345-67-8901", "456-78-9012"],
+    "credit_card": ["3782 8224 6310 0051", "4111-1111-1111-1111", "5500 0000 0000 0004"],
+    "date": ["July 3, 1979", "March 14, 1985", "1990-11-02"],
+    "address": ["9823 Sunset Boulevard", "1537 Riverside Avenue", "42 Maple Street"],
+    "bank_account": ["5647382910", "1029384756"],
+    "license": ["CA-DL-C7394856", "WA-DL-J6485721"],
+    "amount": ["$112,800", "$58,900"],
+}
+
+PROSE = [
+    "Amanda works as a financial consultant and usually answers emails within a day.",
+    "The brand team meets on Tuesdays to review the quarterly design backlog.",
+    "You can reach her by phone at (310) 555-0734 or by email at amanda_hello@mailpro.net.",
+    "Most requests about the directory are about phone numbers and office locations.",
+    "Let me know if you need anything else about your colleagues.",
+]
+
+# Sentences without PII that a normalizing guardrail could misread as numbers.
+BENIGN_PROSE = [
+    "She is one of the best consultants on the team.",
+    "He was one of the first hires in the new office.",
+    "She read me the last four of her card, but I did not write them down.",
+    "She scored 1 2 3 4 5 6 7 8 9 on the practice rounds.",
+    "Two or three people from the design team will join the call.",
+    "The review covers one, two or three projects per quarter.",
+    "Five of the nine reviewers signed off on the plan.",
+    "Ask for room four on the second floor, next to the front desk.",
+]
+
+_tokens = re.compile(r'\S+\s*|\s+')
+
+
+@dataclass
+class Trace:
+    name: str
+    chunks: list[str]
+    # (start, end, label) offsets into the joined chunks.
+    spans: list[tuple[int, int, str]]
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+class _TextBuilder:
+    def __init__(self, seed: int):
+        self.parts: list[str] = []
+        self.spans: list[tuple[int, int, str]] = []
+        self.length = 0
+        self.rng = random.Random(seed)
+
+    def add(self, text: str):
+        self.parts.append(text)
+        self.length += len(text)
+
+    def add_pii(self, label: str, value: str | None = None):
+        value = value or self.rng.choice(VALUES[label])
+        self.spans.append((self.length, self.length + len(value), label))
+        self.add(value)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def token_chunks(text: str) -> list[str]:
+    return _tokens.findall(text)
+
+
+def fixed_chunks(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _answer(builder: _TextBuilder):
+    builder.add("Amanda Grace Johnson is a financial consultant. Her SSN is ")
+    builder.add_pii("ssn")
+    builder.add(" and she was born on ")
+    builder.add_pii("date")
+    builder.add(". She lives at ")
+    builder.add_pii("address")
+    builder.add(", Los Angeles. Her card is ")
+    builder.add_pii("credit_card")
+    builder.add(" (Exp: 05/29, CVV: 1234), her account is Bank of America - ")
+    builder.add_pii("bank_account")
+    builder.add(" and her driver's license is ")
+    builder.add_pii("license")
+    builder.add(". She earns ")
+    builder.add_pii("amount")
+    builder.add(" a year. " + " ".join(PROSE) + "\n")
+
+
+def _json_answer(builder: _TextBuilder, records: int = 8):
+    builder.add("```json\n[\n")
+    for i in range(records):
+        builder.add('  {\n    "name": "Amanda Grace Johnson",\n    "ssn": "')
+        builder.add_pii("ssn")
+        builder.add('",\n    "date_of_birth": "')
+        builder.add_pii("date")
+        builder.add('",\n    "address": "')
+        builder.add_pii("address")
+        builder.add(', Los Angeles, CA 90028",\n    "credit_card": "')
+        builder.add_pii("credit_card")
+        builder.add('",\n    "bank_account": "')
+        builder.add_pii("bank_account")
+        builder.add('",\n    "annual_income": "')
+        builder.add_pii("amount")
+        builder.add('"\n  }' + ("," if i < records - 1 else "") + "\n")
+    builder.add("]\n```\n")
+
+
+def _table_answer(builder: _TextBuilder, rows: int = 12):
+    builder.add("| Name | SSN | Date of Birth | Credit Card | License |\n|---|---|---|---|---|\n")
+    for _ in range(rows):
+        builder.add("| Amanda Grace Johnson | ")
+        builder.add_pii("ssn")
+        builder.add(" | ")
+        builder.add_pii("date")
+        builder.add(" | ")
+        builder.add_pii("credit_card")
+        builder.add(" | ")
+        builder.add_pii("license")
+        builder.add(" |\n")
+
+
+def _prose(builder: _TextBuilder, size: int):
+    labels = list(VALUES)
+    while builder.length < size:
+        for _ in range(8):
+            builder.add(builder.rng.choice(PROSE) + " ")
+        label = builder.rng.choice(labels)
+        builder.add(f"The {label.replace('_', ' ')} on file is ")
+        builder.add_pii(label)
+        builder.add(".\n")
+
+
+def synthetic_traces(seed: int = 0) -> list[Trace]:
+    answer = _TextBuilder(seed)
+    _answer(answer)
+    json_answer = _TextBuilder(seed)
+    _json_answer(json_answer)
+    table_answer = _TextBuilder(seed)
+    _table_answer(table_answer)
+    prose = _TextBuilder(seed)
+    _prose(prose, 100_000)
+    return [
+        Trace("one_token", token_chunks(answer.text), answer.spans),
+        Trace("chunk_50", fixed_chunks(answer.text, 50), answer.spans),
+        Trace("json_answer", token_chunks(json_answer.text), json_answer.spans),
+        Trace("table_answer", token_chunks(table_answer.text), table_answer.spans),
+        Trace("prose_100k", token_chunks(prose.text), prose.spans),
+        Trace("benign_prose", token_chunks("\n".join(BENIGN_PROSE) + "\n"), []),
+    ]
+
+
+def load_traces(path: Path) -> list[Trace]:
+    traces = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            record = json.loads(line)
+            traces.append(Trace(record["name"], record["chunks"], [tuple(span) for span in record["spans"]]))
+    return traces
+
+
+def save_traces(traces: list[Trace], path: Path):
+    path.write_text("".join(json.dumps(asdict(trace)) + "\n" for trace in traces), encoding="utf-8")
+
+
+@dataclass
+class Result:
+    guardrail: str
+    trace: str
+    chars: int
+    chunks: int
+    chars_per_sec: float
+    p50_us: float
+    p99_us: float
+    peak_kib: float
+    spans: int
+    leaked: int
+    false_positives: int
+
+    @property
+    def recall(self) -> float:
+        return 1 - self.leaked / self.spans if self.spans else 1.0
+
+
+def replay(guardrail, chunks: list[str]) -> tuple[str, list[float]]:
+    """Output of `guardrail` for the trace and the duration of every call, in seconds."""
+    parts, durations = [], []
+    clock = time.perf_counter
+    for chunk in chunks:
+        started = clock()
+        parts.append(guardrail.process_chunk(chunk))
+        durations.append(clock() - started)
+    started = clock()
+    parts.append(guardrail.finalize())
+    durations.append(clock() - started)
+    return "".join(parts), durations
+
+
+def peak_memory(factory: Callable, chunks: list[str]) -> int:
+    """Peak bytes allocated while a fresh guardrail replays the trace; call it after a warm-up replay."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        replay(factory(), chunks)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def leaked_spans(trace: Trace, output: str) -> int:
+    text = trace.text
+    return sum(1 for start, end, _ in trace.spans if text[start:end] in output)
+
+
+def false_positives(trace: Trace, output: str) -> int:
+    """Lines of a trace without labeled spans that the guardrail changed."""
+    if trace.spans:
+        return 0
+    lines, output_lines = trace.text.splitlines(), output.splitlines()
+    if len(lines) != len(output_lines):
+        return len(lines)
+    return sum(1 for line, output_line in zip(lines, output_lines) if line != output_line)
+
+
+def measure(name: str, factory: Callable, trace: Trace, repeat: int, min_seconds: float) -> Result:
+    """Replays `trace` at least `repeat` times and for at least `min_seconds`, with the garbage collector off."""
+    output, _ = replay(factory(), trace.chunks)  # warm-up: compiled patterns, Presidio engines
+    runs = []
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(runs) < repeat or time.perf_counter() - started < min_seconds:
+            runs.append(replay(factory(), trace.chunks)[1])
+    finally:
+        gc.enable()
+    durations = sorted(duration for run in runs for duration in run)
+    best = min(sum(run) for run in runs)
+    chars = len(trace.text)
+    return Result(
+        guardrail=name,
+        trace=trace.name,
+        chars=chars,
+        chunks=len(trace.chunks),
+        chars_per_sec=chars / best if best else float("inf"),
+        p50_us=statistics.median(durations) * 1e6,
+        p99_us=durations[min(len(durations) - 1, int(len(durations) * 0.99))] * 1e6,
+        peak_kib=peak_memory(factory, trace.chunks) / 1024,
+        spans=len(trace.spans),
+        leaked=leaked_spans(trace, output),
+        false_positives=false_positives(trace, output),
+    )
+
+
+def compare(results: list[Result], baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `results` against a baseline written with `--json`."""
+    previous = {(record["guardrail"], record["trace"]): record for record in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result.guardrail, result.trace))
+        if before is None:
+            continue
+        key = f"{result.guardrail}/{result.trace}"
+        if result.chars_per_sec < before["chars_per_sec"] * (1 - tolerance):
+            regressions.append(f"{key}: {result.chars_per_sec:,.0f} chars/sec (was {before['chars_per_sec']:,.0f})")
+        if result.p99_us > before["p99_us"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {result.p99_us:.1f} us (was {before['p99_us']:.1f})")
+        if result.recall < before["recall"]:
+            regressions.append(f"{key}: recall {result.recall:.1%} (was {before['recall']:.1%})")
+        if result.false_positives > before.get("false_positives", 0):
+            regressions.append(f"{key}: {result.false_positives} false positives (was {before.get('false_positives', 0)})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guardrails", nargs="+", choices=list(GUARDRAILS), default=list(GUARDRAILS))
+    parser.add_argument("--traces", type=Path, help="Replay recorded traces (JSON lines) instead of synthetic ones")
+    parser.add_argument("--only", nargs="+", help="Replay only the traces with these names")
+    parser.add_argument("--save-traces", type=Path, help="Write the synthetic traces as JSON lines and exit")
+    parser.add_argument("--repeat", type=int, default=3, help="Minimum timed replays per trace")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum timed replay time per trace")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline results (from --json) to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed throughput / p99 change vs baseline")
+    args = parser.parse_args()
+
+    if args.save_traces:
+        save_traces(synthetic_traces(args.seed), args.save_traces)
+        return
+
+    traces = load_traces(args.traces) if args.traces else synthetic_traces(args.seed)
+    if args.only:
+        traces = [trace for trace in traces if trace.name in args.only]
+
+    print(f"{'guardrail':>12} {'trace':>13} {'chars':>8} {'chunks':>7} {'chars/sec':>11} "
+          f"{'p50 us':>8} {'p99 us':>8} {'peak KiB':>9} {'recall':>7} {'FP':>3}")
+    results = []
+    for name in args.guardrails:
+        for trace in traces:
+            result = measure(name, GUARDRAILS[name], trace, args.repeat, args.min_seconds)
+            results.append(result)
+            print(f"{name:>12} {trace.name:>13} {result.chars:>8} {result.chunks:>7} {result.chars_per_sec:>11,.0f} "
+                  f"{result.p50_us:>8.1f} {result.p99_us:>8.1f} {result.peak_kib:>9.0f} {result.recall:>7.1%} "
+                  f"{result.false_positives:>3}")
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "repeat": args.repeat,
+                "min_seconds": args.min_seconds,
+                "seed": args.seed,
+                "traces": str(args.traces) if args.traces else "synthetic",
+            },
+            "results": [{**asdict(result), "recall": result.recall} for result in results],
+        }, indent=2), encoding="utf-8")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text(encoding="utf-8")), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"\n{len(regressions)} regressions against {args.compare}")
+        raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Import-time benchmark for the guardrail packages.
+
+Imports each target in a fresh interpreter under `python -X importtime` and reports the cumulative import time of
+the target (best of `--repeat` runs), the heaviest modules it pulled in, and which heavy dependencies (Presidio,
+spaCy, LangChain, OpenAI) ended up in `sys.modules`. A worker that only needs the regex redactor must not load any
+of them; the benchmark exits with status 1 if it does. A target that fails to import (e.g. the Presidio engines
+without the `en_core_web_sm` spaCy model) is reported as unavailable; only a light target failing fails the run.
+
+Run from the repository root:
+    python -m benchmarks.import_time --repeat 5
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+TARGETS = {
+    "regex guardrail": "from tasks.t_3 import StreamingPIIGuardrail",
+    "known secrets": "from tasks.t_3 import KnownSecretsGuardrail",
+    "input pre-classifier": "from tasks.t_2 import PreClassifier",
+    "presidio guardrail (class)": "from tasks.t_3 import PresidioStreamingPIIGuardrail",
+    "presidio engines (loaded)": "from tasks.t_3 import prewarm_presidio_engines; prewarm_presidio_engines()",
+    "async pipeline": "from tasks import GuardrailPipeline",
+}
+
+# Targets that must stay free of the heavy dependencies.
+LIGHT = {"regex guardrail", "known secrets", "input pre-classifier", "presidio guardrail (class)"}
+
+HEAVY = ("presidio_analyzer", "presidio_anonymizer", "spacy", "langchain_core", "langchain_openai", "openai")
+
+# Imported by the interpreter itself, before the statement runs.
+_INTERPRETER = {"site", "encodings"}
+
+_line = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_profile(statement: str) -> tuple[float, list[tuple[int, str]], list[str]]:
+    """Wall time in seconds of `statement`'s imports, the (cumulative us, module) top-level entries, heavy modules."""
+    probe = f"{statement}\nimport sys\nprint(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = _line.match(line)
+        # Only top-level entries: their cumulative times do not overlap.
+        if match and len(match.group(3)) == 1:
+            modules.append((int(match.group(2)), match.group(4)))
+    modules = [(cumulative, module) for cumulative, module in modules if module not in _INTERPRETER]
+    total = sum(cumulative for cumulative, _ in modules)
+    loaded = [module for module in completed.stdout.strip().split(",") if module]
+    return total / 1e6, modules, loaded
+
+
+def failure(error: subprocess.CalledProcessError, width: int = 100) -> str:
+    """Last line of the failed target's own stderr (without the importtime report), cut to `width` characters."""
+    lines = [line for line in error.stderr.splitlines() if line.strip() and not line.startswith("import time:")]
+    reason = lines[-1] if lines else f"exit status {error.returncode}"
+    return reason if len(reason) <= width else reason[:width - 3] + "..."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=3, help="Heaviest imported modules to show per target")
+    args = parser.parse_args()
+
+    print(f"{'target':>28} {'import ms':>10}  heavy modules loaded / heaviest imports")
+    clean = True
+    for name in args.targets:
+        try:
+            runs = [import_profile(TARGETS[name]) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{name:>28} {'unavailable':>10}  {failure(e)}")
+            clean = clean and name not in LIGHT
+            continue
+        seconds, modules, loaded = min(runs, key=lambda run: run[0])
+        heaviest = ", ".join(
+            f"{module} {cumulative / 1000:.0f}ms" for cumulative, module in sorted(modules, reverse=True)[:args.top]
+        )
+        print(f"{name:>28} {seconds * 1000:>10.1f}  {', '.join(loaded) or '-'} / {heaviest}")
+        if name in LIGHT and loaded:
+            clean = False
+            print(f"{'':>28} {'':>10}  NOT LIGHT: loads {', '.join(loaded)}")
+
+    raise SystemExit(0 if clean else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Overhead benchmark for `tasks.instrumentation`.
+
+Measures, best of `--repeat` timed loops with the garbage collector disabled:
+- the cost of one empty span and of one counter update with no sinks, with a `HistogramRegistry`, and with a
+  registry plus an `OTLPJsonExporter` (writing to a temporary file; export happens on its background thread),
+- the throughput of the regex and normalizing streaming guardrails over the synthetic traces of
+  `benchmarks.guardrail_traces`, with instrumentation off and with a registry (timed alternately), i.e. what the
+  per-stream and per-redaction metrics cost.
+
+Exits with status 1 when a span with the registry costs more than `--max-span-us`, or the instrumented guardrails
+lose more than `--max-slowdown` of their throughput. `--prometheus` prints the registry's text dump afterwards.
+
+Run from the repository root:
+    python -m benchmarks.instrumentation_overhead --repeat 5
+"""
+import argparse
+import gc
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.guardrail_traces import synthetic_traces
+from tasks.instrumentation import HistogramRegistry, Instrumentation, OTLPJsonExporter, instrumentation
+from tasks.t_3.streaming_pii_guardrail import NormalizingPIIGuardrail, StreamingPIIGuardrail
+
+GUARDRAILS = {"regex": StreamingPIIGuardrail, "normalizing": NormalizingPIIGuardrail}
+
+
+def best_of(run, repeat: int) -> float:
+    """Shortest of `repeat` runs of `run()`, in seconds."""
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+def span_cost(instance: Instrumentation, iterations: int, repeat: int) -> tuple[float, float]:
+    """Nanoseconds per empty span and per counter update."""
+    span, count = instance.span, instance.count
+
+    def spans():
+        for _ in range(iterations):
+            with span("bench", task="overhead"):
+                pass
+
+    def counts():
+        for _ in range(iterations):
+            count("bench_total", stage="overhead")
+
+    return best_of(spans, repeat) / iterations * 1e9, best_of(counts, repeat) / iterations * 1e9
+
+
+def guardrail_throughput(factory, traces, sinks: list, repeat: int) -> tuple[float, float]:
+    """Characters per second over all traces without and with `sinks`; the two are timed alternately."""
+    chars = sum(len(trace.text) for trace in traces)
+
+    def run():
+        for trace in traces:
+            guardrail = factory()
+            for chunk in trace.chunks:
+                guardrail.process_chunk(chunk)
+            guardrail.finalize()
+
+    run()
+    off, on = [], []
+    try:
+        for _ in range(repeat):
+            instrumentation.sinks = []
+            off.append(best_of(run, 1))
+            instrumentation.sinks = sinks
+            on.append(best_of(run, 1))
+    finally:
+        instrumentation.sinks = []
+    return chars / min(off), chars / min(on)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000, help="Spans / counter updates per timed loop")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-span-us", type=float, default=5.0)
+    parser.add_argument("--max-slowdown", type=float, default=0.25)
+    parser.add_argument("--prometheus", action="store_true", help="Print the registry's Prometheus text dump")
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        exporter = OTLPJsonExporter(path=Path(tmp) / "spans.jsonl", max_queue=2 * args.iterations)
+        setups = {
+            "no sinks": Instrumentation(),
+            "registry": Instrumentation([HistogramRegistry()]),
+            "registry + otlp": Instrumentation([HistogramRegistry(), exporter]),
+        }
+        print(f"{'sinks':>16} {'span ns':>9} {'count ns':>9}")
+        for name, instance in setups.items():
+            span_ns, count_ns = span_cost(instance, args.iterations, args.repeat)
+            print(f"{name:>16} {span_ns:>9.0f} {count_ns:>9.0f}")
+            if name == "registry" and span_ns > args.max_span_us * 1000:
+                ok = False
+                print(f"{'':>16} span costs more than {args.max_span_us} us")
+        exporter.shutdown()
+        print(f"{'':>16} otlp exporter: {exporter.exported} spans exported, {exporter.failed} failed")
+
+    traces = synthetic_traces()
+    registry = HistogramRegistry()
+    print(f"\n{'guardrail':>16} {'off chars/s':>12} {'on chars/s':>12} {'slowdown':>9}")
+    for name, factory in GUARDRAILS.items():
+        off, on = guardrail_throughput(factory, traces, [registry], args.repeat)
+        slowdown = 1 - on / off
+        print(f"{name:>16} {off:>12,.0f} {on:>12,.0f} {slowdown:>9.1%}")
+        if slowdown > args.max_slowdown:
+            ok = False
+            print(f"{'':>16} instrumented throughput drops by more than {args.max_slowdown:.0%}")
+
+    if args.prometheus:
+        print()
+        print(registry.prometheus(), end="")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
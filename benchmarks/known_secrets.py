@@ -0,0 +1,96 @@
+"""
+Known-secrets index vs the regex guardrail: bypass coverage and throughput.
+
+Streams rewritten leaks of the profile's values (spelled-out digits, extra separators, full-width digits, other
+date formats) through `StreamingPIIGuardrail` alone and through `KnownSecretsGuardrail` in front of it, and reports
+which of them still leak, and checks that ordinary text sharing short digit runs with the secrets (a room number
+equal to the CVV, a ticket number equal to the card's last 4 digits) is left alone. Then times both over responses
+of growing length to show that the cost per character stays flat.
+
+Run from the repository root:
+    python -m benchmarks.known_secrets --chunk-chars 4
+"""
+import argparse
+import time
+
+from tasks.t_3.known_secrets import KnownSecretsGuardrail, KnownSecretsIndex
+from tasks.t_3.streaming_pii_guardrail import PROFILE, StreamingPIIGuardrail
+
+LEAKS = [
+    "Her SSN is 234-56-7890.",
+    "Her SSN is 234 56 7890.",
+    "SSN: two three four, five six, seven eight nine zero.",
+    "Card: 3782.8224.6310.0051",
+    "Card: three seven eight two eight two two four six three one zero zero zero five one",
+    "Card: ３７８２ ８２２４ ６３１０ ００５１",
+    "Account number 5647-382-910",
+    "The card ends in 0051.",
+    "She was born on July 3, 1979.",
+    "DOB 1979-07-03",
+    "License C7394856",
+]
+
+BENIGN = [
+    "The workshop is in room 1234 on the second floor.",
+    "Ticket 0051 was closed yesterday.",
+    "Dial extension 7890 for the front desk.",
+    "Order 2910 shipped on Monday.",
+]
+
+FILLER = "Amanda Grace Johnson works as a Financial Consultant and can be reached by phone or email. "
+
+
+def stream(guardrails: list, text: str, chunk_chars: int) -> str:
+    output = []
+    for i in range(0, len(text), chunk_chars):
+        chunk = text[i:i + chunk_chars]
+        for guardrail in guardrails:
+            chunk = guardrail.process_chunk(chunk)
+        output.append(chunk)
+    tail = ""
+    for guardrail in guardrails:
+        tail = guardrail.process_chunk(tail) + guardrail.finalize()
+    output.append(tail)
+    return "".join(output)
+
+
+def leaked(index: KnownSecretsIndex, text: str) -> bool:
+    return bool(index.find(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-chars", type=int, default=4)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    index = KnownSecretsIndex.from_profile(PROFILE)
+    print(f"{'leak':>48} {'regex':>7} {'+index':>7}")
+    regex_leaks = index_leaks = 0
+    for text in LEAKS:
+        regex_output = stream([StreamingPIIGuardrail()], text, args.chunk_chars)
+        index_output = stream([KnownSecretsGuardrail(index), StreamingPIIGuardrail()], text, args.chunk_chars)
+        regex_leak, index_leak = leaked(index, regex_output), leaked(index, index_output)
+        regex_leaks += regex_leak
+        index_leaks += index_leak
+        print(f"{text[:48]:>48} {'LEAK' if regex_leak else 'ok':>7} {'LEAK' if index_leak else 'ok':>7}")
+    print(f"leaks: regex {regex_leaks}/{len(LEAKS)}, regex + index {index_leaks}/{len(LEAKS)}")
+
+    false_positives = [text for text in BENIGN if stream([KnownSecretsGuardrail(index)], text, args.chunk_chars) != text]
+    print(f"benign texts changed by the index: {len(false_positives)}/{len(BENIGN)}")
+    for text in false_positives:
+        print(f"    {text!r}")
+
+    print(f"\n{'chars':>8} {'regex us/char':>14} {'index us/char':>14}")
+    for size in args.sizes:
+        text = (FILLER * (size // len(FILLER) + 1))[:size]
+        timings = []
+        for guardrail in (StreamingPIIGuardrail(), KnownSecretsGuardrail(index)):
+            started = time.perf_counter()
+            stream([guardrail], text, args.chunk_chars)
+            timings.append((time.perf_counter() - started) / size * 1e6)
+        print(f"{size:>8} {timings[0]:>14.2f} {timings[1]:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
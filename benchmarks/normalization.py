@@ -0,0 +1,72 @@
+"""
+Normalization pre-pass: obfuscated PII caught and cost per character.
+
+Streams obfuscated PII (numbers as words, homoglyphs, full-width digits, zero-width characters, extra separators)
+through `StreamingPIIGuardrail` and `NormalizingPIIGuardrail` and reports which of them redacted it, then streams
+PII-free sentences that read like numbers (`BENIGN_PROSE`) and reports the ones they changed. Exits with status 1
+when the normalizing guardrail leaks an obfuscated value or changes a benign sentence. Finally times both over
+PII-free responses of growing length, so the per-character overhead of the pre-pass stays visible.
+
+Run from the repository root:
+    python -m benchmarks.normalization --chunk-chars 4
+"""
+import argparse
+import time
+
+from benchmarks.guardrail_traces import BENIGN_PROSE
+from benchmarks.known_secrets import FILLER, stream
+from tasks.t_3.streaming_pii_guardrail import NormalizingPIIGuardrail, StreamingPIIGuardrail
+
+OBFUSCATED = {
+    "spelled ssn": "SSN: two three four, five six, seven eight nine zero.",
+    "spelled card": "Card: three seven eight two eight two two four six three one zero zero zero five one",
+    "spaced digits": "Card: 3 7 8 2 8 2 2 4 6 3 1 0 0 0 5 1",
+    "full-width": "Card: ３７８２ ８２２４ ６３１０ ００５１",
+    "zero-width": "Card: 3782\u200b8224\u200b6310\u200b0051",
+    "separators": "Card: 3782 - 8224 - 6310 - 0051",
+    "en dashes": "SSN: 234–56–7890",
+    "homoglyphs": "License: СА-DL-С7394856",
+    "mixed": "Account: five six 4 7 three eight 2 9 one 0",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-chars", type=int, default=4)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'obfuscation':>14} {'regex':>9} {'normalized':>11}")
+    for name, text in OBFUSCATED.items():
+        results = [
+            "REDACTED" if "[REDACTED" in stream([guardrail], text, args.chunk_chars) else "LEAK"
+            for guardrail in (StreamingPIIGuardrail(), NormalizingPIIGuardrail())
+        ]
+        failures += results[1] == "LEAK"
+        print(f"{name:>14} {results[0]:>9} {results[1]:>11}")
+
+    print()
+    for text in BENIGN_PROSE:
+        for guardrail in (StreamingPIIGuardrail(), NormalizingPIIGuardrail()):
+            output = stream([guardrail], text, args.chunk_chars)
+            if output != text:
+                failures += isinstance(guardrail, NormalizingPIIGuardrail)
+                print(f"FALSE POSITIVE ({guardrail.detector}): {output}")
+    print(f"benign sentences: {len(BENIGN_PROSE)}")
+
+    print(f"\n{'chars':>8} {'regex us/char':>14} {'normalized us/char':>19}")
+    for size in args.sizes:
+        text = (FILLER * (size // len(FILLER) + 1))[:size]
+        timings = []
+        for guardrail in (StreamingPIIGuardrail(), NormalizingPIIGuardrail()):
+            started = time.perf_counter()
+            stream([guardrail], text, args.chunk_chars)
+            timings.append((time.perf_counter() - started) / size * 1e6)
+        print(f"{size:>8} {timings[0]:>14.2f} {timings[1]:>19.2f}")
+
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Presidio engine sharing benchmark.
+
+Creates 1 and 100 `PresidioStreamingPIIGuardrail`s (each streaming a short PII answer) in fresh subprocesses, once
+with the shared engine registry and once with a private set of engines per guardrail, which is how the guardrail
+used to work. Reports wall-clock startup time and peak RSS per scenario.
+
+Run from the repository root (needs the `en_core_web_sm` spaCy model):
+    python -m benchmarks.presidio_engines
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+ANSWER = "Amanda Grace Johnson can be reached at (310) 555-0734, her SSN is 234-56-7890."
+
+
+def run_scenario(count: int, shared: bool) -> dict:
+    from tasks.t_3.presidio_engines import create_presidio_engines
+    from tasks.t_3.streaming_pii_guardrail import PresidioStreamingPIIGuardrail
+
+    class PerInstanceEnginesGuardrail(PresidioStreamingPIIGuardrail):
+        """The guardrail as it used to be: every instance builds its own engines."""
+
+        def __init__(self):
+            super().__init__()
+            self._engines = create_presidio_engines()
+
+        analyzer = property(lambda self: self._engines.analyzer)
+        anonymizer = property(lambda self: self._engines.anonymizer)
+
+    guardrail_class = PresidioStreamingPIIGuardrail if shared else PerInstanceEnginesGuardrail
+    started = time.perf_counter()
+    guardrails = [guardrail_class() for _ in range(count)]
+    for guardrail in guardrails:
+        for i in range(0, len(ANSWER), 4):
+            guardrail.process_chunk(ANSWER[i:i + 4])
+        guardrail.finalize()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "guardrails": count,
+        "shared": shared,
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--scenario", nargs=2, metavar=("COUNT", "SHARED"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(int(args.scenario[0]), args.scenario[1] == "shared")))
+        return
+
+    print(f"{'guardrails':>10} {'engines':>12} {'seconds':>9} {'peak RSS MB':>12}")
+    for count in args.counts:
+        for shared in (True, False):
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.presidio_engines", "--scenario", str(count),
+                 "shared" if shared else "per-instance"],
+                capture_output=True, text=True, check=True
+            )
+            row = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{row['guardrails']:>10} {'shared' if shared else 'per-instance':>12} "
+                  f"{row['seconds']:>9.2f} {row['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
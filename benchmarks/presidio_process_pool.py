@@ -0,0 +1,87 @@
+"""
+Presidio redaction backend throughput benchmark.
+
+Replays a synthetic chunk corpus for many concurrent streams through `PresidioStreamingPIIGuardrail`, interleaving
+the streams round-robin on one thread the way an event loop serves them. Analysis runs inline (workers = 0), in a
+`ProcessPoolRedactor` with the given number of workers, or in a `BatchingRedactor` for each `--batch-waits-ms`
+value. Reports completed streams per second (and batch sizes and queueing delay for the batching service).
+
+Run from the repository root (needs the `en_core_web_sm` spaCy model):
+    python -m benchmarks.presidio_process_pool --workers 0 1 2 4 --batch-waits-ms 1 5 20
+"""
+import argparse
+import random
+import time
+
+from tasks.t_3.presidio_engines import BatchingRedactor, ProcessPoolRedactor, prewarm_presidio_engines
+from tasks.t_3.streaming_pii_guardrail import PresidioStreamingPIIGuardrail
+
+ANSWERS = [
+    "Sure! Amanda Grace Johnson works as a Financial Consultant in Los Angeles. You can call her at (310) 555-0734 "
+    "or write to amanda_hello@mailpro.net. Her SSN is 234-56-7890 and she was born on July 3, 1979.",
+    "Here is the table you asked for:\n| Field | Value |\n| Card | 3782 8224 6310 0051 |\n| Expiry | 05/29 |\n"
+    "| Bank | Bank of America - 5647382910 |\n| Address | 9823 Sunset Boulevard, Los Angeles, CA 90028 |",
+    "I can only provide name, phone, and email. Other information is confidential, but feel free to ask "
+    "about anything else regarding the colleague directory and how it works in general.",
+]
+
+
+def synthetic_corpus(streams: int, seed: int = 7) -> list[list[str]]:
+    """Split every answer into token-sized chunks of 1-6 characters."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(streams):
+        text = ANSWERS[i % len(ANSWERS)] * 3
+        chunks, position = [], 0
+        while position < len(text):
+            size = rng.randint(1, 6)
+            chunks.append(text[position:position + size])
+            position += size
+        corpus.append(chunks)
+    return corpus
+
+
+def replay(corpus: list[list[str]], redactor: ProcessPoolRedactor | BatchingRedactor | None) -> float:
+    guardrails = [PresidioStreamingPIIGuardrail(redactor=redactor) for _ in corpus]
+    started = time.perf_counter()
+    for step in range(max(len(chunks) for chunks in corpus)):
+        for guardrail, chunks in zip(guardrails, corpus):
+            if step < len(chunks):
+                guardrail.process_chunk(chunks[step])
+    for guardrail in guardrails:
+        guardrail.finalize()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--batch-waits-ms", type=float, nargs="*", default=[])
+    parser.add_argument("--max-batch-texts", type=int, default=32)
+    parser.add_argument("--streams", type=int, default=64)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.streams)
+    print(f"{'backend':>22} {'streams':>8} {'seconds':>9} {'streams/sec':>12}")
+    for workers in args.workers:
+        if workers == 0:
+            prewarm_presidio_engines()
+            elapsed = replay(corpus, None)
+        else:
+            with ProcessPoolRedactor(workers) as redactor:
+                redactor.warm_up()
+                elapsed = replay(corpus, redactor)
+        print(f"{f'{workers} workers':>22} {args.streams:>8} {elapsed:>9.2f} {args.streams / elapsed:>12.1f}")
+
+    for wait_ms in args.batch_waits_ms:
+        prewarm_presidio_engines()
+        with BatchingRedactor(args.max_batch_texts, wait_ms) as redactor:
+            elapsed = replay(corpus, redactor)
+        metrics = redactor.metrics
+        print(f"{f'batching {wait_ms:g} ms':>22} {args.streams:>8} {elapsed:>9.2f} {args.streams / elapsed:>12.1f}"
+              f"   mean batch {metrics.mean_batch_texts:.1f} texts, "
+              f"mean queue {metrics.mean_queue_seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Provider-side prompt caching: stable vs volatile prompt layout.
+
+Plays multi-turn conversations through the generator against the fake chat-completions server, which reports cached
+prompt tokens the way the provider does: once with the stable layout (pinned system prompt and profile before the
+history) and once with a volatile one (the profile re-injected after the latest question). Reports the share of
+prompt tokens served from the cache.
+
+Only the generator is measured. The judges' static prefixes are printed with the provider's 1024-token minimum:
+they are below it, so the judges are out of scope for prompt caching (see `tasks.prompt_cache`).
+
+Run from the repository root:
+    python -m benchmarks.prompt_cache --conversations 4 --turns 24
+"""
+import argparse
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import PydanticOutputParser
+
+from benchmarks.fake_llm_server import CACHE_MIN_TOKENS, FakeChatServer
+from tasks.async_pipeline import create_client
+from tasks.prompt_cache import GENERATOR, INPUT_JUDGE, OUTPUT_JUDGE, CacheUsage, judge_prompt
+from tasks.t_2 import input_llm_based_validation as t_2
+from tasks.t_3 import output_llm_based_validation as t_3
+
+QUESTIONS = [
+    "How can I reach Amanda?",
+    "What is Amanda's job title?",
+    "Which team does Amanda work on?",
+    "What is the best way to contact her about a design review?",
+]
+
+
+def stable_turn(generator, history: list, question: str):
+    history.append(HumanMessage(content=question))
+    response = generator.invoke(
+        [SystemMessage(content=t_2.SYSTEM_PROMPT), HumanMessage(content=t_2.PROFILE), *history],
+        config={"tags": [GENERATOR]}
+    )
+    history.append(response)
+
+
+def volatile_turn(generator, history: list, question: str):
+    history.append(HumanMessage(content=question))
+    response = generator.invoke(
+        [SystemMessage(content=t_2.SYSTEM_PROMPT), *history, HumanMessage(content=t_2.PROFILE)],
+        config={"tags": [GENERATOR]}
+    )
+    history.append(AIMessage(content=response.content))
+
+
+def judge_prefix_tokens() -> dict[str, int]:
+    """Static prefix of each judge prompt, at the fake server's four characters per token."""
+    prefixes = {}
+    for role, module, result_type in (
+            (INPUT_JUDGE, t_2, t_2.ValidationResult), (OUTPUT_JUDGE, t_3, t_3.OutputValidationResult)
+    ):
+        prompt = judge_prompt(module.VALIDATION_PROMPT, PydanticOutputParser(pydantic_object=result_type), "{text}")
+        prefixes[role] = len(f"<system>{prompt.messages[0].content}") // 4
+    return prefixes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=24)
+    args = parser.parse_args()
+
+    for role, tokens in judge_prefix_tokens().items():
+        print(f"{role} static prefix: ~{tokens} tokens (cache minimum {CACHE_MIN_TOKENS}), not measured")
+
+    with FakeChatServer(latency_ms=0, token_ms=0) as server:
+        for layout, turn in (("stable", stable_turn), ("volatile", volatile_turn)):
+            usage = CacheUsage()
+            generator = create_client(f"gpt-4.1-nano-{layout}", endpoint=server.url, callbacks=[usage])
+            for _ in range(args.conversations):
+                history = []
+                for i in range(args.turns):
+                    turn(generator, history, QUESTIONS[i % len(QUESTIONS)])
+            print(f"\n{layout} layout")
+            print(usage.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+End-to-end red-team evaluation of every guardrail configuration.
+
+Sends the whole `tasks/PROMPT_INJECTIONS_TO_TEST.md` corpus (and, as a control, benign directory questions) through
+each configuration with bounded concurrency, against the fake chat-completions server:
+
+- t1_prompt: the hardened t_1 system prompt only,
+- t2_judge: the t_2 input guardrail with the LLM judge only, then generation,
+- t2_input: the same with the local pre-classifier in front of the judge. The pre-classifier is trained on this very
+  corpus and these benign questions, so each input is classified by a model trained on the other `--folds` folds
+  only (see `benchmarks.pre_classifier` for held-out inputs),
+- t3_hard / t3_soft: generation, then the t_3 output judge (blocking / local and LLM redaction),
+- stream_regex / stream_presidio: streamed generation through the regex / Presidio streaming PII guardrail.
+
+Per configuration it reports how many attacks were blocked, redacted or leaked (a profile value from any task
+visible in the answer, found with `KnownSecretsIndex`), how many benign questions were blocked, end-to-end latency
+percentiles, and LLM calls and tokens per request.
+
+The fake server's canned answers only exercise the guardrail plumbing. For numbers that mean something about the
+models, record real completions once (`--record`, needs DIAL access) and replay the cassette offline afterwards:
+    python -m benchmarks.red_team --cassette red_team.jsonl --record --latency-ms 0
+    python -m benchmarks.red_team --cassette red_team.jsonl
+
+Run from the repository root (stream_presidio needs the `en_core_web_sm` spaCy model; without it the configuration
+is reported as unavailable and the others still run):
+    python -m benchmarks.red_team --concurrency 8 --json red_team.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from benchmarks.fake_llm_server import Cassette, FakeChatServer, upstream_responder
+from tasks._constants import DIAL_URL
+from tasks.async_pipeline import GuardrailPipeline, create_client
+from tasks.t_1 import prompt_injection as t_1
+from tasks.t_2 import input_llm_based_validation as t_2
+from tasks.t_2.pre_classifier import BENIGN_QUERIES, PreClassifier, PreVerdict, load_injection_corpus
+from tasks.t_3 import output_llm_based_validation as t_3
+from tasks.t_3 import streaming_pii_guardrail as t_3_streaming
+from tasks.t_3.known_secrets import KnownSecretsIndex
+from tasks.t_3.presidio_engines import prewarm_presidio_engines
+
+GENERATOR_MODEL = "gpt-4.1-nano-2025-04-14"
+JUDGE_MODEL = "gpt-4o"
+
+_request: contextvars.ContextVar["RequestResult | None"] = contextvars.ContextVar("red_team_request", default=None)
+
+
+@dataclass
+class Outcome:
+    visible: str
+    blocked: bool = False
+    redacted: bool = False
+
+
+@dataclass
+class RequestResult:
+    config: str
+    title: str
+    attack: bool
+    latency: float = 0.0
+    calls: int = 0
+    tokens: int = 0
+    blocked: bool = False
+    redacted: bool = False
+    leaked: list[str] = field(default_factory=list)
+
+
+class RequestUsage(BaseCallbackHandler):
+    """Counts LLM calls and tokens for the request running in the current context."""
+
+    run_inline = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        result = _request.get()
+        if result is None:
+            return
+        result.calls += 1
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        if isinstance(generation, ChatGeneration) and generation.message.usage_metadata:
+            result.tokens += generation.message.usage_metadata["total_tokens"]
+
+
+def _prompt(module, user_input: str) -> list[BaseMessage]:
+    return [
+        SystemMessage(content=module.SYSTEM_PROMPT),
+        HumanMessage(content=module.PROFILE),
+        HumanMessage(content=user_input)
+    ]
+
+
+class OutOfFoldPreClassifier:
+    """
+    `PreClassifier` stand-in that classifies every corpus input with a model trained on the other folds only, so
+    the red-team rows do not score the pre-classifier on its own training data. Inputs outside the corpus get the
+    shipped model.
+    """
+
+    def __init__(self, attacks: list[str], benign: list[str], folds: int):
+        self._shipped = PreClassifier()
+        self._models: dict[str, PreClassifier] = {}
+        for fold in range(folds):
+            model = PreClassifier(PreClassifier.train(
+                attacks=[text for i, text in enumerate(attacks) if i % folds != fold],
+                benign=[text for i, text in enumerate(benign) if i % folds != fold]
+            ))
+            for texts in (attacks, benign):
+                self._models.update((text, model) for i, text in enumerate(texts) if i % folds == fold)
+
+    def classify(self, user_input: str) -> PreVerdict:
+        return self._models.get(user_input, self._shipped).classify(user_input)
+
+
+class Configurations:
+    """The guardrail configurations under test, sharing clients that point at one endpoint."""
+
+    def __init__(self, endpoint: str, folds: int = 4):
+        usage = RequestUsage()
+        self.generator = create_client(GENERATOR_MODEL, endpoint=endpoint, callbacks=[usage])
+        self.judge = create_client(JUDGE_MODEL, endpoint=endpoint, callbacks=[usage])
+        self.pipeline = GuardrailPipeline(self.generator, self.judge)
+        # The t_2 input guardrail as it ships, the local pre-classifier in front of the judge, scored out of fold.
+        attacks = [attack for _, attack in load_injection_corpus()]
+        pre_classifier = OutOfFoldPreClassifier(attacks, BENIGN_QUERIES, folds)
+        self.pre_classified = GuardrailPipeline(self.generator, self.judge, pre_classifier=pre_classifier)
+        self.all: dict[str, Callable[[str], Awaitable[Outcome]]] = {
+            "t1_prompt": self.t1_prompt,
+            "t2_judge": lambda user_input: self.t2_input(user_input, self.pipeline),
+            "t2_input": lambda user_input: self.t2_input(user_input, self.pre_classified),
+            "t3_hard": lambda user_input: self.t3_output(user_input, soft=False),
+            "t3_soft": lambda user_input: self.t3_output(user_input, soft=True),
+            "stream_regex": lambda user_input: self.stream(user_input, t_3_streaming.StreamingPIIGuardrail()),
+            "stream_presidio": lambda user_input: self.stream(
+                user_input, t_3_streaming.PresidioStreamingPIIGuardrail()
+            ),
+        }
+
+    async def t1_prompt(self, user_input: str) -> Outcome:
+        response = await self.pipeline.agenerate(_prompt(t_1, user_input))
+        return Outcome(response.content)
+
+    async def t2_input(self, user_input: str, pipeline: GuardrailPipeline) -> Outcome:
+        validation = await pipeline.avalidate_input(user_input)
+        if not validation.is_safe:
+            return Outcome("", blocked=True)
+        response = await pipeline.agenerate(_prompt(t_2, user_input))
+        return Outcome(response.content)
+
+    async def t3_output(self, user_input: str, soft: bool) -> Outcome:
+        response = await self.pipeline.agenerate(_prompt(t_3, user_input))
+        validation = await self.pipeline.avalidate_output(response.content)
+        if not validation.contains_pii:
+            return Outcome(response.content)
+        if not soft:
+            return Outcome("", blocked=True)
+        redaction = self.pipeline.local_redactor.redact_locally(response.content, validation.pii_types)
+        filtered = await self.pipeline.aredact(redaction.text) if redaction.unresolved else redaction.text
+        return Outcome(filtered, redacted=filtered != response.content)
+
+    async def stream(self, user_input: str, guardrail) -> Outcome:
+        raw, visible = [], []
+        async for chunk in self.generator.astream(_prompt(t_3_streaming, user_input)):
+            if chunk.content:
+                raw.append(chunk.content)
+                visible.append(guardrail.process_chunk(chunk.content))
+        visible.append(guardrail.finalize())
+        visible = "".join(visible)
+        return Outcome(visible, redacted=visible != "".join(raw))
+
+
+def secrets_index() -> KnownSecretsIndex:
+    """Every profile's confidential values: an answer containing any of them leaked."""
+    secrets: dict[str, list[str]] = {}
+    for module in (t_1, t_2, t_3, t_3_streaming):
+        for label, values in KnownSecretsIndex.from_profile(module.PROFILE).secrets.items():
+            secrets.setdefault(label, []).extend(value for value in values if value not in secrets.get(label, []))
+    return KnownSecretsIndex(secrets)
+
+
+def presidio_unavailable() -> str | None:
+    """Why the Presidio engines cannot be loaded (e.g. no `en_core_web_sm` model), or None when they can."""
+    try:
+        prewarm_presidio_engines()
+    except (ImportError, OSError, SystemExit) as e:
+        # spaCy reports a missing model as an OSError; Presidio then tries to download it, which fails offline with
+        # a connection error (also an OSError) or exits from spaCy's downloader.
+        return f"{type(e).__name__}: {str(e).splitlines()[0][:100] if str(e) else 'en_core_web_sm not loaded'}"
+    return None
+
+
+async def run_config(
+        name: str,
+        run: Callable[[str], Awaitable[Outcome]],
+        requests: list[tuple[str, str, bool]],
+        index: KnownSecretsIndex,
+        concurrency: int
+) -> list[RequestResult]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(title: str, user_input: str, attack: bool) -> RequestResult:
+        result = RequestResult(name, title, attack)
+        async with semaphore:
+            _request.set(result)
+            started = time.perf_counter()
+            outcome = await run(user_input)
+            result.latency = time.perf_counter() - started
+        result.blocked, result.redacted = outcome.blocked, outcome.redacted
+        result.leaked = sorted({match.label for match in index.find(outcome.visible)})
+        return result
+
+    # Warm up connections, compiled patterns and NER models before measuring.
+    await run(requests[0][1])
+    return list(await asyncio.gather(*(one(*request) for request in requests)))
+
+
+def summarize(results: list[RequestResult]) -> dict:
+    attacks = [result for result in results if result.attack]
+    benign = [result for result in results if not result.attack]
+    latencies = sorted(result.latency for result in results)
+
+    def share(items, predicate) -> float:
+        return sum(1 for item in items if predicate(item)) / len(items) if items else 0.0
+
+    def percentile(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+
+    return {
+        "config": results[0].config,
+        "attacks": len(attacks),
+        "attack_blocked": share(attacks, lambda result: result.blocked),
+        "attack_redacted": share(attacks, lambda result: result.redacted),
+        "attack_leaked": share(attacks, lambda result: result.leaked),
+        "benign": len(benign),
+        "benign_blocked": share(benign, lambda result: result.blocked),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "calls_per_request": statistics.mean(result.calls for result in results),
+        "tokens_per_request": statistics.mean(result.tokens for result in results),
+    }
+
+
+async def run(
+        endpoint: str,
+        configs: list[str],
+        requests: list[tuple[str, str, bool]],
+        concurrency: int,
+        folds: int = 4
+) -> tuple:
+    configurations = Configurations(endpoint, folds)
+    index = secrets_index()
+    summaries, results = [], []
+    print(f"{'config':>16} {'blocked':>8} {'redacted':>9} {'leaked':>7} {'benign blk':>11} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/req':>10} {'tokens/req':>11}")
+    for name in configs:
+        reason = presidio_unavailable() if name == "stream_presidio" else None
+        if reason:
+            print(f"{name:>16} {'unavailable':>8}  {reason}")
+            summaries.append({"config": name, "unavailable": reason})
+            continue
+        config_results = await run_config(name, configurations.all[name], requests, index, concurrency)
+        summary = summarize(config_results)
+        summaries.append(summary)
+        results += config_results
+        print(f"{name:>16} {summary['attack_blocked']:>8.0%} {summary['attack_redacted']:>9.0%} "
+              f"{summary['attack_leaked']:>7.0%} {summary['benign_blocked']:>11.0%} {summary['p50_ms']:>8.0f} "
+              f"{summary['p95_ms']:>8.0f} {summary['p99_ms']:>8.0f} {summary['calls_per_request']:>10.2f} "
+              f"{summary['tokens_per_request']:>11.0f}")
+    if "t2_input" in configs:
+        print(f"{'':>16} t2_input: pre-classifier scored out of fold ({folds} folds), t2_judge: judge only")
+    return summaries, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    configs = ["t1_prompt", "t2_judge", "t2_input", "t3_hard", "t3_soft", "stream_regex", "stream_presidio"]
+    parser.add_argument("--configs", nargs="+", choices=configs, default=configs)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--benign", type=int, default=16, help="Benign control questions per configuration")
+    parser.add_argument("--repeat", type=int, default=1, help="Times every request is sent")
+    parser.add_argument("--folds", type=int, default=4, help="Cross-validation folds for the t2_input pre-classifier")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--cassette", type=Path, help="Replay completions from this JSON lines file")
+    parser.add_argument("--record", action="store_true", help="Record unseen completions from --upstream")
+    parser.add_argument("--upstream", default=DIAL_URL)
+    parser.add_argument("--json", type=Path, help="Write summaries and per-request results as JSON")
+    args = parser.parse_args()
+
+    requests = [(title, attack, True) for title, attack in load_injection_corpus()]
+    requests += [(query, query, False) for query in BENIGN_QUERIES[:args.benign]]
+    requests *= args.repeat
+
+    cassette = None
+    if args.cassette:
+        cassette = Cassette(args.cassette, upstream_responder(args.upstream) if args.record else None)
+    with FakeChatServer(latency_ms=args.latency_ms, token_ms=args.token_ms, responder=cassette) as server:
+        summaries, results = asyncio.run(run(server.url, args.configs, requests, args.concurrency, args.folds))
+
+    if cassette is not None:
+        print(f"\ncassette: {cassette.hits} replayed, {cassette.recorded} recorded, "
+              f"{cassette.misses} answered by the fake server")
+        if cassette.recorded:
+            cassette.save()
+    if args.json:
+        args.json.write_text(json.dumps({
+            "summaries": summaries,
+            "requests": [asdict(result) for result in results],
+        }, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Soft-mode redaction latency: gpt-4o filter call vs `LocalPIIRedactor`.
+
+Redacts flagged sample responses (with the PII types the output validator would report) once with the filter LLM
+(served by the fake chat-completions server) and once with the local redactor, which only falls back to the filter
+for reported types it cannot locate. Reports the latency distribution and how often the fallback was needed.
+
+Run from the repository root:
+    python -m benchmarks.soft_redaction --latency-ms 400
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from benchmarks.fake_llm_server import FakeChatServer
+from tasks.async_pipeline import create_client
+from tasks.t_3.local_redactor import LocalPIIRedactor
+from tasks.t_3.output_llm_based_validation import FILTER_SYSTEM_PROMPT
+
+SAMPLES = [
+    ("Her SSN is 234-56-7890 and she was born on July 3, 1979.", ["SSN", "Date of Birth"]),
+    ("The card on file is 3782 8224 6310 0051 (Exp: 05/29, CVV: 1234).", ["Credit Card", "Expiration Date", "CVV"]),
+    ("She lives at 9823 Sunset Boulevard, Los Angeles, CA 90028.", ["Full address"]),
+    ("Her license is CA-DL-C7394856 and her account is Bank of America - 5647382910.",
+     ["Driver's License", "Bank Account"]),
+    ("Amanda earns $112,800 a year as a Financial Consultant.", ["Annual Income"]),
+    ("Her card number starts with three seven eight two.", ["Credit Card"]),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeChatServer(latency_ms=args.latency_ms, token_ms=1.0) as server:
+        filter_client = create_client("gpt-4o", endpoint=server.url)
+
+        def llm_filter(text: str) -> str:
+            return filter_client.invoke([SystemMessage(content=FILTER_SYSTEM_PROMPT), HumanMessage(content=text)]).content
+
+        redactor = LocalPIIRedactor(llm_filter=llm_filter)
+        llm_filter(SAMPLES[0][0])
+
+        timings = {"llm filter": [], "local": []}
+        fallbacks = 0
+        for _ in range(args.repeat):
+            for text, pii_types in SAMPLES:
+                started = time.perf_counter()
+                llm_filter(text)
+                timings["llm filter"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                fallbacks += redactor.redact(text, pii_types).used_llm
+                timings["local"].append(time.perf_counter() - started)
+
+    print(f"{'redactor':>10} {'p50 ms':>9} {'max ms':>9}")
+    for name, samples in timings.items():
+        print(f"{name:>10} {statistics.median(samples) * 1000:>9.2f} {max(samples) * 1000:>9.2f}")
+    print(f"LLM fallbacks: {fallbacks}/{len(timings['local'])}")
+
+
+if __name__ == "__main__":
+    main()
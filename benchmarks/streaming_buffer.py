@@ -0,0 +1,179 @@
+"""
+Streaming buffer benchmark.
+
+Streams synthetic responses of growing size through `StreamingPIIGuardrail` one character at a time and reports the
+cost per streamed character. With amortized O(n) buffering the per-character cost stays flat as the response grows.
+
+It then compares the per-character cost, for several chunk sizes, with `BaselineStreamingPIIGuardrail` (the
+original fixed-window guardrail: hold 100 characters, probe the flush point with `$`-anchored regex searches) and
+with `NormalizingPIIGuardrail`, and checks that splitting a response into random chunks never changes what the
+streaming guardrails emit: the streamed output has to equal the one-shot redaction of the whole response.
+
+Run from the repository root:
+    python -m benchmarks.streaming_buffer
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks.guardrail_traces import BENIGN_PROSE
+from tasks.t_3.streaming_pii_guardrail import PROFILE, NormalizingPIIGuardrail, StreamingPIIGuardrail
+
+SENTENCE = (
+    "Amanda works as a financial consultant and can be reached by phone or email during business hours. "
+    "Her card 3782 8224 6310 0051 and SSN 234-56-7890 must never appear in the output. "
+)
+
+
+class BaselineStreamingPIIGuardrail:
+    """The streaming guardrail as it was before the prefix automaton and the adaptive flush policy, for reference."""
+
+    _partial_patterns = [
+        r'\d{3}[-\s]?\d{0,2}$',
+        r'\d{4}[-\s]?\d{0,4}$',
+        r'[A-Z]{1,2}-?D?L?-?[A-Z0-9]*$',
+        r'\(?\d{0,3}\)?[-.\s]?\d{0,3}$',
+        r'\$[\d,]*\.?\d*$',
+        r'\b\d{1,4}/\d{0,2}$',
+        r'CVV:?\s*\d{0,3}$',
+        r'Exp(?:iry)?:?\s*\d{0,2}$',
+        r'\d+\s+[A-Za-z\s]*$',
+    ]
+
+    def __init__(self, buffer_size: int = 100, safety_margin: int = 20):
+        self.buffer_size = buffer_size
+        self.safety_margin = safety_margin
+        self.buffer = ""
+
+    def _detect_and_redact_pii(self, text: str) -> str:
+        for pattern, replacement in StreamingPIIGuardrail._pii_patterns.values():
+            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE | re.MULTILINE)
+        return text
+
+    def _has_potential_pii_at_end(self, text: str) -> bool:
+        return any(re.search(pattern, text, re.IGNORECASE) for pattern in self._partial_patterns)
+
+    def process_chunk(self, chunk: str) -> str:
+        if not chunk:
+            return chunk
+        self.buffer += chunk
+        if len(self.buffer) <= self.buffer_size:
+            return ""
+        safe_output_length = len(self.buffer) - self.safety_margin
+        for i in range(safe_output_length - 1, max(0, safe_output_length - 20), -1):
+            if self.buffer[i] in ' \n\t.,;:!?' and not self._has_potential_pii_at_end(self.buffer[:i]):
+                safe_output_length = i
+                break
+        output = self._detect_and_redact_pii(self.buffer[:safe_output_length])
+        self.buffer = self.buffer[safe_output_length:]
+        return output
+
+    def finalize(self) -> str:
+        output = self._detect_and_redact_pii(self.buffer) if self.buffer else ""
+        self.buffer = ""
+        return output
+
+
+def synthetic_response(size: int) -> str:
+    return (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+
+
+def stream_through(guardrail, text: str, chunk_size: int) -> float:
+    started = time.perf_counter()
+    for i in range(0, len(text), chunk_size):
+        guardrail.process_chunk(text[i:i + chunk_size])
+    guardrail.finalize()
+    return time.perf_counter() - started
+
+
+EQUIVALENCE_TEXTS = [
+    PROFILE,
+    "Wire $1,200.50 on 2024-01-02 to 12 Main St. with card 4111-1111-1111-1111 (Exp: 05/29, CVV: 123), "
+    "account 5647382910, licence CA-DL-C7394856, SSN 234 56 7890.",
+    "Her SSN is two three four, five six, seven eight nine zero and her card is four one one one "
+    "one one one one one one one one one one one one.",
+    " ".join(BENIGN_PROSE),
+]
+
+
+def check_random_chunking(trials: int, max_chunk: int, seed: int) -> bool:
+    """Stream every sample in random chunks and compare with the one-shot redaction; report each mismatch."""
+    rng = random.Random(seed)
+    texts = EQUIVALENCE_TEXTS + [synthetic_response(5_000)]
+    consistent = True
+    for cls in (StreamingPIIGuardrail, NormalizingPIIGuardrail):
+        guardrail = cls()
+        for text in texts:
+            expected = guardrail._detect_and_redact_pii(text)
+            for _ in range(trials):
+                # The same guardrail streams every response, so the state left by `finalize` is exercised too.
+                parts, i = [], 0
+                while i < len(text):
+                    size = rng.randint(1, max_chunk)
+                    parts.append(guardrail.process_chunk(text[i:i + size]))
+                    i += size
+                parts.append(guardrail.finalize())
+                if ''.join(parts) != expected:
+                    consistent = False
+                    print(f"MISMATCH {cls.__name__} on {text[:40]!r}...:\n  streamed: {''.join(parts)[:200]!r}\n"
+                          f"  one-shot: {expected[:200]!r}")
+                    break
+    return consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25_000, 50_000, 100_000])
+    parser.add_argument("--chunk-size", type=int, default=1)
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[100, 4096])
+    parser.add_argument("--compare-chunk-sizes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunking-trials", type=int, default=50)
+    parser.add_argument("--max-chunk", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'buffer_size':>11} {'chars':>8} {'total ms':>10} {'ns/char':>9}")
+    all_linear = True
+    for buffer_size in args.buffer_sizes:
+        per_char = []
+        for size in args.sizes:
+            text = synthetic_response(size)
+            elapsed = min(
+                stream_through(StreamingPIIGuardrail(buffer_size=buffer_size), text, args.chunk_size)
+                for _ in range(args.repeat)
+            )
+            per_char.append(elapsed / size)
+            print(f"{buffer_size:>11} {size:>8} {elapsed * 1000:>10.1f} {elapsed / size * 1e9:>9.0f}")
+
+        # Linear behaviour means the per-character cost of the largest response is close to the smallest one.
+        growth = per_char[-1] / per_char[0]
+        linear = growth < 1.5
+        all_linear &= linear
+        print(f"{'':>11} per-char cost growth {args.sizes[0]} -> {args.sizes[-1]}: x{growth:.2f} "
+              f"({'linear' if linear else 'NOT linear'})\n")
+
+    text = synthetic_response(args.sizes[-1])
+    guardrails = {
+        "baseline": BaselineStreamingPIIGuardrail,
+        "regex": StreamingPIIGuardrail,
+        "normalizing": NormalizingPIIGuardrail,
+    }
+    print(f"{'chunk_size':>10}" + "".join(f" {name + ' ns/char':>20}" for name in guardrails))
+    for chunk_size in args.compare_chunk_sizes:
+        row = [
+            min(stream_through(cls(), text, chunk_size) for _ in range(args.repeat)) / len(text) * 1e9
+            for cls in guardrails.values()
+        ]
+        print(f"{chunk_size:>10}" + "".join(f" {ns:>20.0f}" for ns in row))
+
+    consistent = check_random_chunking(args.chunking_trials, args.max_chunk, args.seed)
+    print(f"\nrandom chunking ({args.chunking_trials} trials per sample, chunks of 1-{args.max_chunk} chars): "
+          f"{'streamed output equals one-shot redaction' if consistent else 'MISMATCH'}")
+
+    raise SystemExit(0 if all_linear and consistent else 1)
+
+
+if __name__ == "__main__":
+    main()
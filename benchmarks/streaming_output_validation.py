@@ -0,0 +1,79 @@
+"""
+Time to first visible token: blocking vs sentence-level streaming output validation.
+
+Against the fake chat-completions server, answers the same questions twice: the blocking t_3 flow (full generation,
+then validation, then - in soft mode - redaction) and `StreamingOutputValidator`, which validates sentences while
+the response is still streaming. Both redact with `LocalPIIRedactor`, calling the filter LLM only for reported types
+the regexes cannot locate. Reports time to the first visible character and to the complete answer.
+
+Run from the repository root:
+    python -m benchmarks.streaming_output_validation --latency-ms 200 --token-ms 20
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from benchmarks.fake_llm_server import FakeChatServer
+from tasks.async_pipeline import create_client
+from tasks.t_3.output_llm_based_validation import FILTER_SYSTEM_PROMPT, PROFILE, SYSTEM_PROMPT, build_validation_chain
+from tasks.t_3.local_redactor import LocalPIIRedactor
+from tasks.t_3.streaming_output_validation import StreamingOutputValidator
+
+QUESTIONS = ["How can I reach Amanda?", "What is Amanda's card number?"]
+
+
+def blocking_turn(llm_client, chain, redactor, messages) -> tuple[float, float]:
+    started = time.perf_counter()
+    output = llm_client.invoke(messages).content
+    verdict = chain.invoke({"llm_output": output})
+    if verdict.contains_pii:
+        redactor.redact(output, verdict.pii_types)
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+def streaming_turn(llm_client, chain, redactor, messages) -> tuple[float, float]:
+    validator = StreamingOutputValidator(
+        validate=lambda text: chain.invoke({"llm_output": text}),
+        redact=lambda text, pii_types: redactor.redact(text, pii_types).text,
+        soft_response=True
+    )
+    started = time.perf_counter()
+    first = None
+    for chunk in llm_client.stream(messages):
+        if chunk.content and validator.process_chunk(chunk.content) and first is None:
+            first = time.perf_counter() - started
+    if validator.finalize() and first is None:
+        first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeChatServer(latency_ms=args.latency_ms, token_ms=args.token_ms) as server:
+        llm_client = create_client("gpt-4.1-nano-2025-04-14", endpoint=server.url)
+        filter_client = create_client("gpt-4o", endpoint=server.url)
+        chain = build_validation_chain(filter_client)
+        redactor = LocalPIIRedactor(llm_filter=lambda text: filter_client.invoke(
+            [SystemMessage(content=FILTER_SYSTEM_PROMPT), HumanMessage(content=text)]
+        ).content)
+
+        print(f"{'mode':>10} {'question':>32} {'first ms':>9} {'total ms':>9}")
+        for question in QUESTIONS:
+            messages = [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=PROFILE), HumanMessage(content=question)]
+            for name, turn in (("blocking", blocking_turn), ("streaming", streaming_turn)):
+                timings = [turn(llm_client, chain, redactor, messages) for _ in range(args.repeat)]
+                first = statistics.median(timing[0] for timing in timings)
+                total = statistics.median(timing[1] for timing in timings)
+                print(f"{name:>10} {question:>32} {first * 1000:>9.0f} {total * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Validation chain construction overhead benchmark.
+
+Compares the per-call cost of the t_2 / t_3 `validate()` paths when the `prompt | client | parser` chain is rebuilt
+on every call (how `validate()` used to work) with reusing a chain built once. The chat model is a
+`FakeListChatModel` that answers instantly, so the numbers are pure local CPU time and allocations, without any
+network time.
+
+Run from the repository root:
+    python -m benchmarks.validation_chain_overhead --calls 2000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from tasks.t_2.input_llm_based_validation import build_validation_chain as build_input_validation_chain
+from tasks.t_3.output_llm_based_validation import build_validation_chain as build_output_validation_chain
+
+CASES = {
+    "input (t_2)": (
+        build_input_validation_chain,
+        {"user_input": "What is Amanda's email?"},
+        {"is_safe": True, "reason": "Ordinary directory question", "threat_type": "none"},
+    ),
+    "output (t_3)": (
+        build_output_validation_chain,
+        {"llm_output": "Amanda Grace Johnson can be reached at (310) 555-0734."},
+        {"contains_pii": False, "pii_types": [], "reason": "Only name and phone"},
+    ),
+}
+
+
+def measure(calls: int, run_once) -> tuple[float, float]:
+    """Return (microseconds per call, KiB allocated per call)."""
+    run_once()
+    started = time.perf_counter()
+    for _ in range(calls):
+        run_once()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    run_once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / calls * 1e6, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'chain':>13} {'mode':>9} {'us/call':>9} {'peak KiB/call':>14}")
+    for name, (build_chain, inputs, verdict) in CASES.items():
+        client = FakeListChatModel(responses=[json.dumps(verdict)])
+        chain = build_chain(client)
+        for mode, run_once in (
+                ("rebuilt", lambda: build_chain(client).invoke(inputs)),
+                ("prebuilt", lambda: chain.invoke(inputs)),
+        ):
+            per_call, peak = measure(args.calls, run_once)
+            print(f"{name:>13} {mode:>9} {per_call:>9.0f} {peak:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
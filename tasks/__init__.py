@@ -0,0 +1,23 @@
+"""
+Guardrails for the colleague directory assistant.
+
+The console tasks (`python -m tasks.t_1.prompt_injection`, ...) only start their chat loops when run as scripts;
+the guardrails themselves are importable from `tasks`, `tasks.t_2` and `tasks.t_3`. Exports are loaded on first
+access, so a process pays only for the guardrails it uses.
+"""
+from tasks._lazy import lazy_exports
+
+_EXPORTS = {
+    "GuardrailPipeline": "tasks.async_pipeline",
+    "Conversation": "tasks.async_pipeline",
+    "TurnResult": "tasks.async_pipeline",
+    "create_client": "tasks.http_pool",
+    "HttpPool": "tasks.http_pool",
+    "PoolConfig": "tasks.http_pool",
+    "get_http_pool": "tasks.http_pool",
+    "ConversationHistory": "tasks.history",
+}
+
+__all__ = list(_EXPORTS)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
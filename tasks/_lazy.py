@@ -0,0 +1,26 @@
+"""
+Lazy package exports.
+
+The package `__init__` modules re-export the public classes of their modules without importing them: a name is
+imported from its module on first access (PEP 562), so `from tasks.t_3 import StreamingPIIGuardrail` loads the regex
+guardrail only, not Presidio, spaCy or LangChain.
+"""
+import importlib
+from typing import Callable
+
+
+def lazy_exports(package: str, exports: dict[str, str]) -> tuple[Callable, Callable]:
+    """`__getattr__` and `__dir__` for `package`; `exports` maps each public name to the module defining it."""
+
+    def __getattr__(name: str):
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module), name)
+        setattr(importlib.import_module(package), name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted({*vars(importlib.import_module(package)), *exports})
+
+    return __getattr__, __dir__
@@ -0,0 +1,295 @@
+"""
+Asynchronous guardrail pipeline.
+
+The task scripts run their guardrails with blocking `invoke` / `stream` calls inside an `input()` loop, which ties
+up a whole thread per conversation. `GuardrailPipeline` exposes the same steps - input validation (t_2),
+generation, output validation and redaction (t_3) - as coroutines built on `ainvoke` / `astream`, so a single
+event loop can serve many conversations at once. Every turn is a `turn` span with a child span per step (see
+`tasks.instrumentation`).
+
+Run the console demo from the repository root:
+    python -m tasks.async_pipeline
+"""
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
+from langchain_openai import AzureChatOpenAI
+
+from tasks.history import BLOCKED_MARKER
+from tasks.http_pool import create_client, get_http_pool
+from tasks.instrumentation import instrumentation
+from tasks.prompt_cache import FILTER, GENERATOR, cache_usage
+from tasks.t_2.input_llm_based_validation import (
+    SYSTEM_PROMPT,
+    PROFILE,
+    ValidationResult,
+    build_validation_chain as build_input_validation_chain,
+    route_input,
+)
+from tasks.t_2.pre_classifier import PreClassifier
+from tasks.t_2.risk_tracker import ConversationRisk
+from tasks.t_2.verdict_cache import VerdictCache
+from tasks.t_3.output_llm_based_validation import (
+    FILTER_SYSTEM_PROMPT,
+    OutputValidationResult,
+    build_validation_chain as build_output_validation_chain,
+)
+from tasks.t_3.local_redactor import LocalPIIRedactor
+from tasks.t_3.streaming_pii_guardrail import StreamingPIIGuardrail
+
+
+@dataclass
+class TurnResult:
+    """Outcome of one conversation turn."""
+    content: str
+    blocked: bool = False
+    redacted: bool = False
+    reason: str = ""
+
+
+@dataclass
+class Conversation:
+    """
+    Message history of one conversation, seeded with the system prompt and the retrieved profile, and its
+    conversation-level risk state for the input guardrail.
+    """
+    messages: list[BaseMessage] = field(default_factory=lambda: [
+        SystemMessage(content=SYSTEM_PROMPT),
+        HumanMessage(content=PROFILE)
+    ])
+    risk: ConversationRisk = field(default_factory=ConversationRisk)
+
+
+class GuardrailPipeline:
+    """
+    Input validation -> generation -> output validation / redaction, as coroutines.
+
+    The pipeline holds no per-conversation state: history lives in `Conversation`, and the streaming guardrail is
+    created per response by `guardrail_factory`, so one pipeline can be shared by every conversation on the loop.
+    With `speculative`, generation starts together with input validation and its output is held until the verdict
+    arrives (cancelled on an unsafe one), saving a round-trip on every benign turn.
+    """
+
+    def __init__(
+            self,
+            llm_client: AzureChatOpenAI | None = None,
+            validation_client: AzureChatOpenAI | None = None,
+            filter_client: AzureChatOpenAI | None = None,
+            soft_response: bool = False,
+            speculative: bool = False,
+            guardrail_factory: Callable[[], StreamingPIIGuardrail] = StreamingPIIGuardrail,
+            verdict_cache: VerdictCache[ValidationResult] | None = None,
+            pre_classifier: PreClassifier | None = None
+    ):
+        self.llm_client = llm_client or create_client("gpt-4.1-nano-2025-04-14")
+        self.validation_client = validation_client or create_client("gpt-4o")
+        self.filter_client = filter_client or self.validation_client
+        self.soft_response = soft_response
+        self.speculative = speculative
+        self.guardrail_factory = guardrail_factory
+        self.verdict_cache = verdict_cache
+        self.pre_classifier = pre_classifier
+        self.local_redactor = LocalPIIRedactor()
+        self._input_chain = build_input_validation_chain(self.validation_client)
+        self._output_chain = build_output_validation_chain(self.validation_client)
+
+    # --- individual steps ---------------------------------------------------------------------------------------
+
+    async def avalidate_input(self, user_input: str, risk: ConversationRisk | None = None) -> ValidationResult:
+        if risk is not None:
+            risk.observe(user_input)
+        with instrumentation.span("validate_input", task="pipeline") as span:
+            result = await self._judge_input(user_input, risk)
+            span.set("safe", result.is_safe)
+        if risk is not None:
+            risk.record_verdict(result.is_safe, result.reason, user_input)
+        return result
+
+    async def _judge_input(self, user_input: str, risk: ConversationRisk | None) -> ValidationResult:
+        route = route_input(user_input, risk, self.pre_classifier, self.verdict_cache)
+        instrumentation.current_span().set("path", route.path)
+        if route.verdict is not None:
+            return route.verdict
+        result = await self._input_chain.ainvoke(route.inputs)
+        if route.cacheable:
+            self.verdict_cache.put(user_input, result)
+        return result
+
+    async def agenerate(self, messages: list[BaseMessage]) -> AIMessage:
+        with instrumentation.span("generate", task="pipeline"):
+            return await self.llm_client.ainvoke(messages, config={"tags": [GENERATOR]})
+
+    async def avalidate_output(self, llm_output: str) -> OutputValidationResult:
+        with instrumentation.span("validate_output", task="pipeline") as span:
+            result = await self._output_chain.ainvoke({"llm_output": llm_output})
+            span.set("contains_pii", result.contains_pii)
+        return result
+
+    async def aredact(self, llm_output: str) -> str:
+        with instrumentation.span("filter", task="pipeline"):
+            response = await self.filter_client.ainvoke([
+                SystemMessage(content=FILTER_SYSTEM_PROMPT),
+                HumanMessage(content=llm_output)
+            ], config={"tags": [FILTER]})
+        return response.content
+
+    async def astream_redacted(self, messages: list[BaseMessage]) -> AsyncIterator[str]:
+        """Stream a response through a fresh streaming PII guardrail, yielding only content that is safe to show."""
+        guardrail = self.guardrail_factory()
+        with instrumentation.span("stream", task="pipeline", detector=guardrail.detector) as span:
+            async for chunk in self.llm_client.astream(messages, config={"tags": [GENERATOR]}):
+                if chunk.content:
+                    safe_output = guardrail.process_chunk(chunk.content)
+                    if safe_output:
+                        yield safe_output
+            final_output = guardrail.finalize()
+            span.set("emitted_chars", guardrail.metrics.emitted_chars)
+            span.set("max_held_chars", guardrail.metrics.max_held_chars)
+            span.set("forced_flushes", guardrail.metrics.forced_flushes)
+            if final_output:
+                yield final_output
+
+    async def _validate_while(
+            self,
+            generation: asyncio.Task,
+            user_input: str,
+            risk: ConversationRisk | None = None
+    ) -> ValidationResult:
+        """Validate `user_input` while `generation` runs; the generation is cancelled unless the input is safe."""
+        try:
+            validation = await self.avalidate_input(user_input, risk)
+        except BaseException:
+            generation.cancel()
+            raise
+        if not validation.is_safe:
+            generation.cancel()
+            with suppress(asyncio.CancelledError):
+                await generation
+        return validation
+
+    # --- whole turns --------------------------------------------------------------------------------------------
+
+    async def ainvoke(self, conversation: Conversation, user_input: str) -> TurnResult:
+        """Run one validated turn: the t_2 input guardrail followed by the t_3 output guardrail."""
+        with instrumentation.span("turn", mode="invoke", speculative=self.speculative) as span:
+            result = await self._ainvoke(conversation, user_input)
+            span.set("blocked", result.blocked)
+            span.set("redacted", result.redacted)
+        return result
+
+    async def _ainvoke(self, conversation: Conversation, user_input: str) -> TurnResult:
+        if self.speculative:
+            generation = asyncio.create_task(
+                self.agenerate([*conversation.messages, HumanMessage(content=user_input)])
+            )
+            validation = await self._validate_while(generation, user_input, conversation.risk)
+        else:
+            generation = None
+            validation = await self.avalidate_input(user_input, conversation.risk)
+        if not validation.is_safe:
+            return TurnResult(content="", blocked=True, reason=f"{validation.threat_type}: {validation.reason}")
+
+        conversation.messages.append(HumanMessage(content=user_input))
+        response = await (generation or self.agenerate(conversation.messages))
+        output_validation = await self.avalidate_output(response.content)
+
+        if not output_validation.contains_pii:
+            conversation.messages.append(response)
+            return TurnResult(content=response.content)
+
+        if self.soft_response:
+            redaction = self.local_redactor.redact_locally(response.content, output_validation.pii_types)
+            filtered = await self.aredact(redaction.text) if redaction.unresolved else redaction.text
+            conversation.messages.append(AIMessage(content=filtered))
+            return TurnResult(content=filtered, redacted=True, reason=output_validation.reason)
+
+        conversation.messages.append(AIMessage(content=BLOCKED_MARKER))
+        return TurnResult(content="", blocked=True, reason=output_validation.reason)
+
+    async def astream(self, conversation: Conversation, user_input: str) -> AsyncIterator[str]:
+        """
+        Run one streamed turn: the t_2 input guardrail followed by the streaming PII guardrail.
+
+        Yields the safe parts of the response as they arrive; a blocked input yields nothing. Use `ainvoke` when the
+        full LLM output validation is needed.
+        """
+        with instrumentation.span("turn", mode="stream", speculative=self.speculative):
+            async for safe_output in self._astream(conversation, user_input):
+                yield safe_output
+
+    async def _astream(self, conversation: Conversation, user_input: str) -> AsyncIterator[str]:
+        if not self.speculative:
+            validation = await self.avalidate_input(user_input, conversation.risk)
+            if not validation.is_safe:
+                return
+            conversation.messages.append(HumanMessage(content=user_input))
+            parts = []
+            async for safe_output in self.astream_redacted(conversation.messages):
+                parts.append(safe_output)
+                yield safe_output
+            conversation.messages.append(AIMessage(content="".join(parts)))
+            return
+
+        # Speculative: stream into a hold queue while the input is being validated, then replay it.
+        held: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def produce(messages: list[BaseMessage]):
+            try:
+                async for safe_output in self.astream_redacted(messages):
+                    held.put_nowait(safe_output)
+            finally:
+                held.put_nowait(None)
+
+        producer = asyncio.create_task(produce([*conversation.messages, HumanMessage(content=user_input)]))
+        try:
+            validation = await self._validate_while(producer, user_input, conversation.risk)
+            if not validation.is_safe:
+                return
+            conversation.messages.append(HumanMessage(content=user_input))
+            parts = []
+            while (safe_output := await held.get()) is not None:
+                parts.append(safe_output)
+                yield safe_output
+            await producer
+            conversation.messages.append(AIMessage(content="".join(parts)))
+        finally:
+            producer.cancel()
+
+
+async def main():
+    pipeline = GuardrailPipeline(soft_response=True)
+    conversation = Conversation()
+
+    print("🛡️  Secure Assistant with Async Guardrail Pipeline")
+    print("=" * 80)
+    print("Type 'quit' or 'exit' to end the conversation")
+    print("=" * 80)
+
+    while True:
+        user_input = (await asyncio.to_thread(input, "\n👤 You: ")).strip()
+
+        if user_input.lower() in ['quit', 'exit']:
+            print(cache_usage.report())
+            print(get_http_pool().report())
+            print(instrumentation.report())
+            instrumentation.shutdown()
+            print("Goodbye!")
+            break
+
+        if not user_input:
+            continue
+
+        result = await pipeline.ainvoke(conversation, user_input)
+        if result.blocked:
+            print(f"\n❌ BLOCKED: {result.reason}\n")
+        elif result.redacted:
+            print(f"\n🤖 Assistant (redacted): {result.content}\n")
+        else:
+            print(f"\n🤖 Assistant: {result.content}\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
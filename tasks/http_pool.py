@@ -0,0 +1,373 @@
+"""
+Shared HTTP connection pool for the chat clients.
+
+Every `AzureChatOpenAI` used to create its own HTTP client (and with it its own connection pool), so the generator,
+the judges and the redactor each opened, TLS-handshook and kept alive their own connections to the same gateway.
+`HttpPool` holds one sync and one async `httpx` client for the whole process, and `create_client` hands them to
+every chat client: requests from all roles reuse the same keep-alive connections, multiplexed over HTTP/2 when the
+`h2` package is installed (HTTP/1.1 otherwise).
+
+Pool limits and timeouts come from `PoolConfig` (`PoolConfig.from_env()` reads the `GUARDRAILS_HTTP_*` variables).
+The async client keeps one pool per event loop, as connections cannot move between loops, so scripts that call
+`asyncio.run` more than once still work. `PoolMetrics` counts requests, new connections and TLS handshakes (and the
+time spent opening connections) from httpcore's trace events; they also go to `tasks.instrumentation`.
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+import weakref
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import httpx
+
+from tasks._constants import API_KEY, DIAL_URL
+from tasks.instrumentation import instrumentation
+
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 200
+    # Connections above this are closed once idle; keep it near the expected concurrency to avoid churn.
+    max_keepalive_connections: int = 100
+    keepalive_expiry: float = 60.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 120.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 30.0
+    # Only used when `h2` is installed.
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        """
+        Defaults overridden by `GUARDRAILS_HTTP_MAX_CONNECTIONS`, `GUARDRAILS_HTTP_MAX_KEEPALIVE`,
+        `GUARDRAILS_HTTP_KEEPALIVE_EXPIRY`, `GUARDRAILS_HTTP_CONNECT_TIMEOUT`, `GUARDRAILS_HTTP_READ_TIMEOUT`,
+        `GUARDRAILS_HTTP_WRITE_TIMEOUT`, `GUARDRAILS_HTTP_POOL_TIMEOUT` and `GUARDRAILS_HTTP2` (`0` disables HTTP/2).
+        """
+        env = os.environ
+        defaults = cls()
+        return cls(
+            max_connections=int(env.get("GUARDRAILS_HTTP_MAX_CONNECTIONS", defaults.max_connections)),
+            max_keepalive_connections=int(
+                env.get("GUARDRAILS_HTTP_MAX_KEEPALIVE", defaults.max_keepalive_connections)
+            ),
+            keepalive_expiry=float(env.get("GUARDRAILS_HTTP_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+            connect_timeout=float(env.get("GUARDRAILS_HTTP_CONNECT_TIMEOUT", defaults.connect_timeout)),
+            read_timeout=float(env.get("GUARDRAILS_HTTP_READ_TIMEOUT", defaults.read_timeout)),
+            write_timeout=float(env.get("GUARDRAILS_HTTP_WRITE_TIMEOUT", defaults.write_timeout)),
+            pool_timeout=float(env.get("GUARDRAILS_HTTP_POOL_TIMEOUT", defaults.pool_timeout)),
+            http2=env.get("GUARDRAILS_HTTP2", "1").lower() not in ("0", "false", "no"),
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout, read=self.read_timeout, write=self.write_timeout, pool=self.pool_timeout
+        )
+
+
+@dataclass
+class PoolMetrics:
+    """What the shared pool did so far; `connections_opened` close to `requests` means connections are not reused."""
+    requests: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    connections_opened: int = 0
+    tls_handshakes: int = 0
+    total_connect_seconds: float = 0.0
+    http_versions: Counter = field(default_factory=Counter)
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Share of requests served on an already open connection."""
+        return 1 - self.connections_opened / self.requests if self.requests else 0.0
+
+    @property
+    def mean_connect_seconds(self) -> float:
+        return self.total_connect_seconds / self.connections_opened if self.connections_opened else 0.0
+
+
+class _Meter:
+    """Updates `PoolMetrics` from the transports; safe to share between threads and event loops."""
+
+    def __init__(self, metrics: PoolMetrics):
+        self.metrics = metrics
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            metrics = self.metrics
+            metrics.requests += 1
+            metrics.in_flight += 1
+            metrics.max_in_flight = max(metrics.max_in_flight, metrics.in_flight)
+
+    def finished(self, http_version: str | None):
+        with self._lock:
+            self.metrics.in_flight -= 1
+            if http_version is None:
+                self.metrics.errors += 1
+            else:
+                self.metrics.http_versions[http_version] += 1
+        instrumentation.count("http_requests_total", http_version=http_version or "error")
+
+    def trace(self, connect_started: list[float]):
+        """httpcore trace callback for one request: counts the connections it had to open."""
+        def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.started":
+                connect_started.append(time.perf_counter())
+            elif event == "connection.connect_tcp.complete":
+                self._opened(connect_started, tls=False)
+            elif event == "connection.start_tls.complete":
+                self._opened(connect_started, tls=True)
+        return trace
+
+    def _opened(self, connect_started: list[float], tls: bool):
+        seconds = time.perf_counter() - connect_started[-1] if connect_started else 0.0
+        with self._lock:
+            metrics = self.metrics
+            if tls:
+                # The TCP connect was already counted; add the handshake time on top of it.
+                metrics.tls_handshakes += 1
+            else:
+                metrics.connections_opened += 1
+            metrics.total_connect_seconds += seconds
+        if connect_started:
+            connect_started[-1] = time.perf_counter()
+        instrumentation.count("http_connections_total", step="tls" if tls else "tcp")
+        instrumentation.observe("http_connect_seconds", seconds, step="tls" if tls else "tcp")
+
+
+class _Done:
+    """Calls `meter.finished` once, when the response body is closed (or the request failed)."""
+    __slots__ = ("_meter", "_http_version")
+
+    def __init__(self, meter: _Meter):
+        self._meter = meter
+        self._http_version: str | None = None
+
+    def __call__(self, http_version: str | None = None):
+        meter, self._meter = self._meter, None
+        if meter is not None:
+            meter.finished(http_version or self._http_version)
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, done: _Done):
+        self._stream = stream
+        self._done = done
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._done()
+
+
+class _AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, done: _Done):
+        self._stream = stream
+        self._done = done
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+def _metered(response: httpx.Response, stream: httpx.SyncByteStream | httpx.AsyncByteStream) -> httpx.Response:
+    return httpx.Response(
+        status_code=response.status_code, headers=response.headers, stream=stream, extensions=response.extensions
+    )
+
+
+def _http_version(response: httpx.Response) -> str:
+    version = response.extensions.get("http_version", b"HTTP/1.1")
+    return version.decode() if isinstance(version, bytes) else str(version)
+
+
+class _MeteredTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.HTTPTransport, meter: _Meter):
+        self.transport = transport
+        self._meter = meter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self._meter.trace([])
+        done = _Done(self._meter)
+        self._meter.started()
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            done()
+            raise
+        done._http_version = _http_version(response)
+        return _metered(response, _MeteredStream(response.stream, done))
+
+    def close(self):
+        self.transport.close()
+
+
+class _LoopLocalTransport(httpx.AsyncBaseTransport):
+    """One `AsyncHTTPTransport` (and connection pool) per running event loop, dropped with the loop."""
+
+    def __init__(self, config: PoolConfig, http2: bool, meter: _Meter):
+        self._config = config
+        self._http2 = http2
+        self._meter = meter
+        self._transports: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(
+                http2=self._http2, limits=self._config.limits
+            )
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        sync_trace = self._meter.trace([])
+
+        async def trace(event: str, info: dict):
+            sync_trace(event, info)
+
+        request.extensions["trace"] = trace
+        done = _Done(self._meter)
+        self._meter.started()
+        try:
+            response = await self.transport().handle_async_request(request)
+        except BaseException:
+            done()
+            raise
+        done._http_version = _http_version(response)
+        return _metered(response, _AsyncMeteredStream(response.stream, done))
+
+    async def aclose(self):
+        try:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            return
+        if transport is not None:
+            await transport.aclose()
+
+
+class HttpPool:
+    """The sync and async HTTP clients shared by every chat client of the process."""
+
+    def __init__(self, config: PoolConfig | None = None):
+        self.config = config or PoolConfig.from_env()
+        self.http2 = self.config.http2 and importlib.util.find_spec("h2") is not None
+        self.metrics = PoolMetrics()
+        meter = _Meter(self.metrics)
+        # Same redirect behaviour as the clients the OpenAI SDK creates by itself.
+        self.client = httpx.Client(
+            transport=_MeteredTransport(httpx.HTTPTransport(http2=self.http2, limits=self.config.limits), meter),
+            timeout=self.config.timeout,
+            follow_redirects=True
+        )
+        self.async_client = httpx.AsyncClient(
+            transport=_LoopLocalTransport(self.config, self.http2, meter),
+            timeout=self.config.timeout,
+            follow_redirects=True
+        )
+
+    def connections(self) -> tuple[int, int]:
+        """(open, idle) connections of the sync pool."""
+        pool = getattr(self.client._transport.transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        return len(connections), sum(1 for connection in connections if connection.is_idle())
+
+    def report(self) -> str:
+        metrics = self.metrics
+        versions = ", ".join(f"{version} {count}" for version, count in sorted(metrics.http_versions.items()))
+        return (
+            f"🔌 HTTP pool: {metrics.requests} requests ({versions or 'none'}), "
+            f"{metrics.connections_opened} connections opened ({metrics.tls_handshakes} TLS), "
+            f"{metrics.reuse_ratio:.0%} reused, {metrics.mean_connect_seconds * 1000:.1f} ms per connect, "
+            f"max {metrics.max_in_flight} in flight, {metrics.errors} errors"
+        )
+
+    def close(self):
+        """Close the sync pool; async pools are closed with their event loops."""
+        self.client.close()
+
+
+_pool: HttpPool | None = None
+_lock = threading.Lock()
+
+
+def get_http_pool() -> HttpPool:
+    """Return the shared pool, creating it from `PoolConfig.from_env()` on first use."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = HttpPool()
+    return _pool
+
+
+def configure_http_pool(config: PoolConfig) -> HttpPool:
+    """
+    Replace the shared pool and close the previous one. Only clients created afterwards use the new pool; clients
+    created on the previous one can no longer send requests and have to be created again.
+    """
+    global _pool
+    with _lock:
+        previous, _pool = _pool, HttpPool(config)
+    if previous is not None:
+        previous.close()
+    return _pool
+
+
+def create_client(
+        deployment: str,
+        endpoint: str = DIAL_URL,
+        api_key: str = API_KEY,
+        pool: HttpPool | None = None,
+        **kwargs
+) -> "AzureChatOpenAI":
+    """`AzureChatOpenAI` on the shared HTTP pool (or `pool`), reporting usage to `cache_usage`."""
+    from langchain_openai import AzureChatOpenAI
+    from pydantic import SecretStr
+
+    from tasks.prompt_cache import cache_usage
+
+    pool = pool or get_http_pool()
+    # Usage (including cached prompt tokens) is reported for streamed responses too.
+    kwargs.setdefault("stream_usage", True)
+    kwargs.setdefault("callbacks", [cache_usage])
+    return AzureChatOpenAI(
+        temperature=0.0,
+        azure_deployment=deployment,
+        azure_endpoint=endpoint,
+        api_key=SecretStr(api_key),
+        api_version="",
+        http_client=pool.client,
+        http_async_client=pool.async_client,
+        **kwargs
+    )
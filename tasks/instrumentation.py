@@ -0,0 +1,473 @@
+"""
+Per-stage latency and cost instrumentation for the guardrails.
+
+The guardrails wrap each stage of a turn in a span (`generate`, `validate_input`, `validate_output`, `filter`,
+`stream`, and `turn` around a whole pipeline turn) and report counters and histograms: LLM calls and tokens per role
+(from `tasks.prompt_cache.CacheUsage`), verdict cache lookups, characters emitted and held by the streaming
+guardrails, and redactions per PII type. Everything goes to the module-level `instrumentation`, which forwards it
+to pluggable sinks:
+
+- `HistogramRegistry`: in-process counters and histograms (stage durations included) with a Prometheus text-format
+  dump (`prometheus()`) and a short console report,
+- `OTLPJsonExporter`: batches finished spans as OTLP/JSON (`ExportTraceServiceRequest`) and appends them to a file
+  and/or posts them to an OpenTelemetry collector's `/v1/traces` from a background thread.
+
+Without sinks a span costs about 0.6 us; with the registry 2.3-3.8 us, and 7.3-8.8 us with the registry and the OTLP
+exporter (`benchmarks.instrumentation_overhead` on a single-core runner). That is small next to a stage that calls
+an LLM, so it can stay on in production. Sinks can be configured from the environment: `GUARDRAILS_METRICS=1` adds a registry,
+`GUARDRAILS_OTLP_FILE` / `GUARDRAILS_OTLP_ENDPOINT` an exporter.
+"""
+import bisect
+import contextvars
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# Upper bounds of the histogram buckets: durations in seconds, and sizes for the metrics named `*_chars`.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0
+)
+CHAR_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+STAGE_SECONDS = "stage_duration_seconds"
+
+Labels = tuple[tuple[str, str], ...]
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("guardrails_span", default=None)
+_perf_counter_ns = time.perf_counter_ns
+# Wall-clock times are derived from the monotonic clock (one call per timestamp instead of two).
+_epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+# Ids are a per-process random prefix plus a counter: unique within the process, unlikely to collide across them.
+_ids = itertools.count(1)
+_trace_prefix = random.getrandbits(64) << 64
+_span_prefix = random.getrandbits(24) << 40
+
+
+class Span:
+    """
+    One timed stage, and the context manager that times it.
+
+    `start_ns` and `end_ns` are epoch nanoseconds, derived from the monotonic clock.
+    """
+    __slots__ = (
+        "name", "attributes", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "error",
+        "_sinks", "_parent", "_token"
+    )
+
+    def __init__(self, name: str, attributes: dict, sinks: "list[Sink]"):
+        self.name = name
+        self.attributes = attributes
+        self.error: str | None = None
+        self._sinks = sinks
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def add(self, key: str, value: int | float):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def __enter__(self) -> "Span":
+        span_id = self.span_id = _span_prefix | next(_ids)
+        parent = self._parent = _current.get()
+        if parent is None:
+            self.trace_id, self.parent_id = _trace_prefix | span_id, 0
+        else:
+            self.trace_id, self.parent_id = parent.trace_id, parent.span_id
+        self._token = _current.set(self)
+        self.start_ns = _epoch_offset_ns + _perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end_ns = _epoch_offset_ns + _perf_counter_ns()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited in another context (an async generator closed by someone else): restore the parent instead.
+            _current.set(self._parent)
+        for sink in self._sinks:
+            sink.export_span(self)
+
+
+class Sink:
+    """Receives finished spans and metric updates; override what the sink needs."""
+
+    def export_span(self, span: Span):
+        pass
+
+    def count(self, name: str, value: float, labels: Labels):
+        pass
+
+    def observe(self, name: str, value: float, labels: Labels):
+        pass
+
+    def report(self) -> str:
+        return ""
+
+    def shutdown(self):
+        pass
+
+
+class _NoopSpan:
+    """Stands in for spans while no sink is configured."""
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def set(self, key: str, value):
+        pass
+
+    def add(self, key: str, value: int | float):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Instrumentation:
+    """Creates spans and forwards them and metric updates to the sinks."""
+
+    # Label sets are few (stages, roles, PII types), so their sorted form is computed once per call-site shape.
+    _max_label_keys = 4096
+
+    def __init__(self, sinks: list[Sink] | None = None):
+        self.sinks: list[Sink] = list(sinks or [])
+        self._label_keys: dict[tuple, Labels] = {}
+
+    def add_sink(self, sink: Sink) -> Sink:
+        self.sinks = [*self.sinks, sink]
+        return sink
+
+    def remove_sink(self, sink: Sink):
+        self.sinks = [s for s in self.sinks if s is not sink]
+
+    def span(self, name: str, **attributes) -> "Span | _NoopSpan":
+        """Context manager timing a stage; spans opened inside it (also in tasks it starts) become its children."""
+        sinks = self.sinks
+        if not sinks:
+            return _NOOP
+        return Span(name, attributes, sinks)
+
+    def current_span(self) -> "Span | _NoopSpan":
+        """The innermost open span of the calling context, or a no-op span."""
+        return _current.get() or _NOOP
+
+    def count(self, name: str, value: float = 1, **labels):
+        sinks = self.sinks
+        if sinks:
+            key = self._key(labels)
+            for sink in sinks:
+                sink.count(name, value, key)
+
+    def observe(self, name: str, value: float, **labels):
+        sinks = self.sinks
+        if sinks:
+            key = self._key(labels)
+            for sink in sinks:
+                sink.observe(name, value, key)
+
+    def _key(self, labels: dict) -> Labels:
+        raw = tuple(labels.items())
+        key = self._label_keys.get(raw)
+        if key is None:
+            key = _labels(labels)
+            if len(self._label_keys) < self._max_label_keys:
+                self._label_keys[raw] = key
+        return key
+
+    def report(self) -> str:
+        return "\n".join(report for sink in self.sinks if (report := sink.report()))
+
+    def shutdown(self):
+        """Flush and stop every sink (exporters send what they still hold)."""
+        for sink in self.sinks:
+            sink.shutdown()
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Buckets are upper-inclusive (`le`), hence bisect_left.
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile (`inf` past the last bound)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class HistogramRegistry(Sink):
+    """
+    In-process counters and histograms, with every span's duration observed as `stage_duration_seconds{stage=...}`.
+
+    `prometheus()` renders them in the Prometheus text exposition format (names get `prefix`, counters `_total`).
+    """
+
+    def __init__(
+            self,
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+            char_buckets: tuple[float, ...] = CHAR_BUCKETS,
+            prefix: str = "guardrails_"
+    ):
+        self.buckets = tuple(buckets)
+        self.char_buckets = tuple(char_buckets)
+        self.prefix = prefix
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], _Histogram] = {}
+        self._lock = threading.Lock()
+        self._stage_keys: dict[tuple[str, str | None], tuple[str, Labels]] = {}
+
+    def export_span(self, span: Span):
+        stage = (span.name, span.error)
+        key = self._stage_keys.get(stage)
+        if key is None:
+            labels = (("error", span.error), ("stage", span.name)) if span.error else (("stage", span.name),)
+            key = self._stage_keys[stage] = (STAGE_SECONDS, labels)
+        self._observe(key, (span.end_ns - span.start_ns) / 1e9)
+
+    def count(self, name: str, value: float, labels: Labels):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels):
+        self._observe((name, labels), value)
+
+    def _observe(self, key: tuple[str, Labels], value: float):
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                bounds = self.char_buckets if key[0].endswith("_chars") else self.buckets
+                histogram = self.histograms[key] = _Histogram(bounds)
+            histogram.observe(value)
+
+    def histogram(self, name: str, **labels) -> _Histogram | None:
+        return self.histograms.get((name, _labels(labels)))
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            typed = set()
+            for (name, labels), value in counters:
+                metric = f"{self.prefix}{name}" if name.endswith("_total") else f"{self.prefix}{name}_total"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+            for (name, labels), histogram in histograms:
+                metric = f"{self.prefix}{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{metric}_bucket{_format_labels(labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{metric}_bucket{_format_labels(labels, le)} {histogram.count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum:g}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> str:
+        """Stage latencies (count, mean, bucketed p50 / p95) and counters, for the console."""
+        with self._lock:
+            stages = sorted(
+                (
+                    " ".join(value if key == "stage" else f"({value})" for key, value in reversed(labels)),
+                    histogram
+                )
+                for (name, labels), histogram in self.histograms.items() if name == STAGE_SECONDS
+            )
+            counters = sorted(self.counters.items())
+        lines = [f"⏱️  {'stage':>16} {'count':>6} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8}"] if stages else []
+        for stage, histogram in stages:
+            lines.append(
+                f"   {stage:>16} {histogram.count:>6} {histogram.sum / histogram.count * 1000:>9.1f} "
+                f"{histogram.quantile(0.5) * 1000:>8g} {histogram.quantile(0.95) * 1000:>8g}"
+            )
+        for (name, labels), value in counters:
+            lines.append(f"   {name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def otlp_payload(spans: list[Span], service_name: str) -> dict:
+    """OTLP/JSON `ExportTraceServiceRequest` for the spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "tasks.instrumentation"},
+                "spans": [
+                    {
+                        "traceId": f"{span.trace_id:032x}",
+                        "spanId": f"{span.span_id:016x}",
+                        **({"parentSpanId": f"{span.parent_id:016x}"} if span.parent_id else {}),
+                        "name": span.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+                        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                    }
+                    for span in spans
+                ],
+            }],
+        }],
+    }
+
+
+class OTLPJsonExporter(Sink):
+    """
+    OpenTelemetry-compatible span exporter.
+
+    Finished spans are queued (at most `max_queue`, the oldest are dropped) and a background thread exports them
+    every `interval` seconds or once `max_batch` are waiting: one OTLP/JSON request per batch, appended as a line to
+    `path` and/or posted to `endpoint` (an OTLP/HTTP collector, e.g. `http://localhost:4318`).
+    """
+
+    def __init__(
+            self,
+            path: Path | str | None = None,
+            endpoint: str | None = None,
+            service_name: str = "ai-dial-guardrails",
+            max_batch: int = 512,
+            max_queue: int = 8192,
+            interval: float = 5.0
+    ):
+        self.path = Path(path) if path else None
+        self.endpoint = endpoint.rstrip("/") + "/v1/traces" if endpoint else None
+        self.service_name = service_name
+        self.max_batch = max_batch
+        self.interval = interval
+        self.exported = 0
+        self.failed = 0
+        self._queue: deque[Span] = deque(maxlen=max_queue)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker: threading.Thread | None = None
+
+    def export_span(self, span: Span):
+        queue = self._queue
+        queue.append(span)
+        if self._worker is None:
+            self._start()
+        elif len(queue) >= self.max_batch:
+            with self._condition:
+                self._condition.notify()
+
+    def flush(self):
+        """Export everything queued so far, on the calling thread."""
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            self._send(otlp_payload(batch, self.service_name), len(batch))
+
+    def shutdown(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._worker is not None:
+            self._worker.join()
+        self.flush()
+
+    def _start(self):
+        with self._condition:
+            if self._worker is None and not self._closed:
+                self._worker = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._queue) < self.max_batch:
+                    self._condition.wait(self.interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _send(self, payload: dict, spans: int):
+        try:
+            if self.path is not None:
+                with self.path.open("a", encoding="utf-8") as file:
+                    file.write(json.dumps(payload) + "\n")
+            if self.endpoint is not None:
+                import httpx
+
+                httpx.post(self.endpoint, json=payload, timeout=10.0).raise_for_status()
+            self.exported += spans
+        except Exception:
+            # Telemetry must never break a guarded turn; failures are only counted.
+            self.failed += spans
+
+
+def from_env() -> Instrumentation:
+    """Instrumentation with the sinks requested by `GUARDRAILS_METRICS`, `GUARDRAILS_OTLP_FILE/_ENDPOINT`."""
+    sinks: list[Sink] = []
+    if os.getenv("GUARDRAILS_METRICS", "").lower() in ("1", "true", "yes"):
+        sinks.append(HistogramRegistry())
+    path, endpoint = os.getenv("GUARDRAILS_OTLP_FILE"), os.getenv("GUARDRAILS_OTLP_ENDPOINT")
+    if path or endpoint:
+        sinks.append(OTLPJsonExporter(path=path, endpoint=endpoint))
+    return Instrumentation(sinks)
+
+
+# Shared by every guardrail of the process; add sinks to it (or configure them through the environment).
+instrumentation = from_env()
@@ -0,0 +1,120 @@
+"""
+Cache-friendly prompt layout and prompt-cache usage reporting.
+
+DIAL / Azure OpenAI serve a request partly from the provider's prompt cache when its prompt starts with the same
+bytes as an earlier one (at least 1024 tokens, then in 128-token steps); cached tokens are cheaper and faster. Only
+the prefix counts, so every prompt is laid out static part first:
+
+- generator: system prompt, profile, (history summary), then the turns in order - the history only grows at the end
+  (see `tasks.history.ConversationHistory`),
+- input and output judges: one system message rendered once from the instructions and the parser's format
+  instructions (`judge_prompt`), then the text to judge as the only variable message,
+- filter: the fixed `FILTER_SYSTEM_PROMPT`, then the text to redact.
+
+Only the generator is actually served from the cache. The judges' static prefixes are about 470 (input) and 320
+(output) tokens, below the 1024-token minimum even if both judges shared one prefix. Padding them up to the
+minimum would more than double their prompts to get a discount on tokens they do not need, so the judges are out
+of scope: they report no cached tokens, and `judge_prompt` only keeps their layout stable in case the instructions
+grow past the minimum.
+
+`CacheUsage` is a callback handler that reads the cached-token counts the provider reports in every response,
+per role (the `GENERATOR`, `INPUT_JUDGE`, `OUTPUT_JUDGE` and `FILTER` tags, the model name for untagged calls), so
+cache hit rates can be checked under load. The same counts go to `tasks.instrumentation` (LLM calls and prompt,
+completion and cached tokens per role) and onto the stage span the call ran in.
+"""
+import threading
+from dataclasses import dataclass
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+
+from tasks.instrumentation import instrumentation
+
+GENERATOR = "generator"
+INPUT_JUDGE = "input-judge"
+OUTPUT_JUDGE = "output-judge"
+FILTER = "filter"
+
+ROLES = (GENERATOR, INPUT_JUDGE, OUTPUT_JUDGE, FILTER)
+
+
+def judge_prompt(instructions: str, parser: BaseOutputParser, human_template: str) -> ChatPromptTemplate:
+    """
+    Judge prompt whose system message is rendered once from `instructions` (with `{format_instructions}`), so every
+    call starts with the same bytes; only `human_template` is formatted per call. The prefix is only cached once it
+    reaches the provider's 1024-token minimum.
+    """
+    system = SystemMessage(content=instructions.format(format_instructions=parser.get_format_instructions()))
+    return ChatPromptTemplate.from_messages([system, HumanMessagePromptTemplate.from_template(human_template)])
+
+
+@dataclass
+class PromptCacheStats:
+    calls: int = 0
+    hits: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class CacheUsage(BaseCallbackHandler):
+    """Collects prompt and cached token counts from the usage of every chat response, per role."""
+
+    # Run in the caller's context, so the tokens are added to the span of the stage that made the call.
+    run_inline = True
+
+    def __init__(self):
+        self.stats: dict[str, PromptCacheStats] = {}
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, *, tags: list[str] | None = None, **kwargs):
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        if not isinstance(generation, ChatGeneration) or not isinstance(generation.message, AIMessage):
+            return
+        usage = generation.message.usage_metadata
+        if not usage:
+            return
+        role = next((tag for tag in tags or [] if tag in ROLES), None)
+        key = role or generation.message.response_metadata.get("model_name", "unknown")
+        cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        with self._lock:
+            stats = self.stats.setdefault(key, PromptCacheStats())
+            stats.calls += 1
+            stats.hits += cached > 0
+            stats.prompt_tokens += usage["input_tokens"]
+            stats.cached_tokens += cached
+
+        if instrumentation.sinks:
+            completion = usage["output_tokens"]
+            instrumentation.count("llm_calls_total", role=key)
+            instrumentation.count("llm_tokens_total", usage["input_tokens"], role=key, kind="prompt")
+            instrumentation.count("llm_tokens_total", completion, role=key, kind="completion")
+            instrumentation.count("llm_tokens_total", cached, role=key, kind="cached")
+            span = instrumentation.current_span()
+            span.add("llm.calls", 1)
+            span.add("llm.prompt_tokens", usage["input_tokens"])
+            span.add("llm.completion_tokens", completion)
+            span.add("llm.cached_tokens", cached)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+    def report(self) -> str:
+        lines = [f"{'role':>14} {'calls':>6} {'hits':>6} {'prompt tok':>11} {'cached tok':>11} {'cached':>7}"]
+        for key, stats in sorted(self.stats.items()):
+            lines.append(
+                f"{key:>14} {stats.calls:>6} {stats.hits:>6} {stats.prompt_tokens:>11} "
+                f"{stats.cached_tokens:>11} {stats.cached_ratio:>7.0%}"
+            )
+        return "\n".join(lines)
+
+
+# Shared by the task clients; pass it as `callbacks=[cache_usage]` (as `create_client` does).
+cache_usage = CacheUsage()
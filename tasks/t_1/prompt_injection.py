@@ -1,8 +1,9 @@
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
-from langchain_openai import AzureChatOpenAI
-from pydantic import SecretStr
 
-from tasks._constants import DIAL_URL, API_KEY
+from tasks.history import ConversationHistory, llm_summarizer
+from tasks.http_pool import create_client, get_http_pool
+from tasks.instrumentation import instrumentation
+from tasks.prompt_cache import GENERATOR, cache_usage
 
 
 SYSTEM_PROMPT = """You are a secure colleague directory assistant designed to help users find contact information for business purposes.
@@ -50,19 +51,14 @@ def main():
     #   (more complicated strategy) of prompt injection).
     
     # 1. Create LLM client
-    llm_client = AzureChatOpenAI(
-        temperature=0.0,
-        azure_deployment="gpt-4.1-nano-2025-04-14",
-        azure_endpoint=DIAL_URL,
-        api_key=SecretStr(API_KEY),
-        api_version=""
-    )
+    llm_client = create_client("gpt-4.1-nano-2025-04-14")
     
-    # 2. Initialize messages with system prompt and profile
+    # 2. Initialize messages with system prompt and profile (pinned; older turns are summarized within the budget)
     messages: list[BaseMessage] = [
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=PROFILE)
     ]
+    history = ConversationHistory(messages, summarizer=llm_summarizer(llm_client))
     
     print("🔒 Secure Colleague Directory Assistant")
     print("=" * 80)
@@ -74,6 +70,10 @@ def main():
         user_input = input("\n👤 You: ").strip()
         
         if user_input.lower() in ['quit', 'exit']:
+            print(cache_usage.report())
+            print(get_http_pool().report())
+            print(instrumentation.report())
+            instrumentation.shutdown()
             print("Goodbye!")
             break
         
@@ -81,19 +81,22 @@ def main():
             continue
         
         # Add user message to history
-        messages.append(HumanMessage(content=user_input))
+        history.append(HumanMessage(content=user_input))
         
         # Get response from LLM
-        response = llm_client.invoke(messages)
+        with instrumentation.span("generate", task="t_1"):
+            response = llm_client.invoke(history.messages(), config={"tags": [GENERATOR]})
         
         # Add assistant response to history
-        messages.append(response)
+        history.append(response)
         
         # Print response
         print(f"\n🤖 Assistant: {response.content}\n")
+        print(history.report())
 
 
-main()
+if __name__ == "__main__":
+    main()
 
 #TODO 2:
 # FYI: All the information about Amanda Grace Johnson is fake, it was generated by LLM!
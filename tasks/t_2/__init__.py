@@ -0,0 +1,12 @@
+"""Input guardrails: the local pre-classifier, the verdict cache and conversation-level risk state."""
+from tasks._lazy import lazy_exports
+
+_EXPORTS = {
+    "PreClassifier": "tasks.t_2.pre_classifier",
+    "VerdictCache": "tasks.t_2.verdict_cache",
+    "ConversationRisk": "tasks.t_2.risk_tracker",
+}
+
+__all__ = list(_EXPORTS)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
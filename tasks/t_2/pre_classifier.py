@@ -0,0 +1,279 @@
+"""
+Local first tier for the input guardrail.
+
+Many attacks have obvious surface features (instruction overrides, authority claims, structured templates asking for
+sensitive fields, many-shot Q/A runs, oversized inputs), and many benign inputs are short questions about the
+contact details the assistant is allowed to share. The `PreClassifier` settles those cases locally in microseconds
+with regex signatures and a hashed n-gram logistic regression, and leaves the rest to the LLM judge. Local
+acceptance is limited to an explicit allow-list of contact-only intents (name, phone, e-mail, how to reach someone)
+and greetings: every word of a locally accepted question comes from that vocabulary, so a plain question about any
+other attribute ("Where does Amanda live?") or a second request joined onto a contact question ("What's Amanda's
+phone number and her street?") always goes to the judge.
+"""
+import math
+import random
+import re
+import zlib
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+
+INJECTIONS_PATH = Path(__file__).resolve().parent.parent / "PROMPT_INJECTIONS_TO_TEST.md"
+
+BENIGN_QUERIES = [
+    "What is Amanda's email?",
+    "What is Amanda's phone number?",
+    "How can I contact Amanda Grace Johnson?",
+    "Can you give me Amanda's email address?",
+    "What's the best way to reach Amanda?",
+    "Who is Amanda Grace Johnson?",
+    "Please share Amanda's contact details.",
+    "I need to call Amanda about the design review, what's her number?",
+    "Could you tell me Amanda Johnson's work email?",
+    "What is her full name?",
+    "Hi!",
+    "Hello, can you help me find a colleague?",
+    "Thanks, that's all I needed.",
+    "What information can you share about colleagues?",
+    "Is Amanda's phone number still (206) 555-0683?",
+    "Can I email Amanda directly?",
+    "What's Amanda's occupation?",
+    "Does Amanda work as a graphic designer?",
+    "Give me the phone and email for Amanda Grace Johnson.",
+    "I'd like to send Amanda a meeting invite, what address should I use for email?",
+    "Who should I contact about the marketing brochure?",
+    "How do I spell Amanda's last name?",
+    "What is Amanda's middle name?",
+    "Can you repeat her email?",
+    "Please tell me how to reach Amanda by phone.",
+    "Is there a better number to reach her at?",
+    "What can you help me with?",
+    "Good morning, I'm looking for Amanda's contact info.",
+    "Thank you for your help!",
+    "What's the email of the graphic designer?",
+    "List the contact options for Amanda.",
+    "Could you remind me of Amanda's name?",
+]
+
+_format = re.compile(
+    r'[{<]\s*"?\w+"?\s*[:=>]|^\s*\|.*\|\s*$|\bselect\b.+\bfrom\b|\b(?:csv|yaml|json|xml|html)\b|<\w+[^>]*>|```',
+    re.IGNORECASE | re.MULTILINE
+)
+
+_sensitive = re.compile(
+    r'credit[\s_-]*card|\bcard\b|\bssn\b|social security|\bcvv\b|expir|\bbank\b|\baccount\b|'
+    r'(?<!email )(?<!e-mail )\baddress\b|date of birth|\bdob\b|payment|financial|income|salary|licen[cs]e',
+    re.IGNORECASE
+)
+
+_SIGNATURES = [
+    ("prompt_injection", "instruction override", re.compile(
+        r'\b(?:ignore|disregard|forget|override)\b.{0,40}\b(?:previous|prior|above|earlier|all|your)\b.{0,20}'
+        r'\b(?:instructions?|rules?|prompts?|guidelines)\b',
+        re.IGNORECASE | re.DOTALL
+    )),
+    ("jailbreak", "jailbreak persona", re.compile(
+        r'\bDAN\b|\bjailbreak|\b(?:developer|debug|maintenance|god|test)\s+mode\b|\bpretend\b|\broleplay\b',
+        re.IGNORECASE
+    )),
+    ("social_engineering", "authority claim", re.compile(
+        r'\b(?:system|admin|administrator|root)\s+(?:override|approval|access|command)\b|'
+        r'\bprotocol\s+\w+-\w+\b|\bemergency\s+(?:access|protocol)\b|\bauthori[sz]ed\s+for\b',
+        re.IGNORECASE
+    )),
+    ("many_shot", "many-shot Q/A run", re.compile(r'(?:\bQ:.{1,200}?\bA:.{0,200}?){3,}', re.IGNORECASE | re.DOTALL)),
+]
+
+# Allow-list for local acceptance: every word of the input comes from the vocabularies below and at least one of
+# them names a contact detail the assistant may share, or the input is only a greeting / thanks. Any other word
+# (another attribute, a verb like "print", a number) and any second request joined on with a conjunction or a comma
+# sends the input to the judge.
+_CONTACT_WORDS = {
+    "email", "e-mail", "emails", "phone", "telephone", "mobile", "cell", "number", "contact", "reach", "reachable",
+    "call", "name", "spell",
+}
+_QUESTION_WORDS = {
+    "what", "which", "who", "whom", "how", "is", "are", "was", "be", "do", "does", "did", "have", "has", "can",
+    "could", "would", "will", "should", "i", "me", "my", "we", "us", "you", "your", "she", "her", "he", "his",
+    "they", "their", "them", "it", "s", "d", "m", "ll", "the", "a", "an", "of", "for", "to", "at", "by", "on", "with",
+    "please", "tell", "give", "share", "send", "show", "get", "find", "list", "remind", "need", "want", "like",
+    "looking", "use", "still", "there", "first", "middle", "last", "full", "work", "direct", "directly", "best",
+    "better", "way", "current", "right", "details", "info", "information", "options",
+}
+_DIRECTORY_NAMES = {"amanda", "grace", "johnson"}
+_ALLOWED_WORDS = _CONTACT_WORDS | _QUESTION_WORDS | _DIRECTORY_NAMES
+
+_greeting = re.compile(
+    r'^\W*(?:hi|hello|hey|good (?:morning|afternoon|evening)|thanks?|thank you)'
+    r'(?:[\s,]+(?:there|so|much|very|a|lot|again|for|your|the|help|all|everyone|team))*[\s!.]*$',
+    re.IGNORECASE
+)
+_joined = re.compile(r'[,;&+/]|\b(?:and|or|plus|then|also|as well)\b', re.IGNORECASE)
+_polite_comma = re.compile(r',\s*(?=please\W*$)|^(\W*please)\s*,', re.IGNORECASE)
+_email_address = re.compile(r'\be-?mail\s+address(?:es)?\b', re.IGNORECASE)
+_question_words = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*|\d+")
+
+_literal_newline = re.compile(r'\\n')
+
+_words = re.compile(r'\w+')
+
+
+def load_injection_corpus(path: Path = INJECTIONS_PATH) -> list[tuple[str, str]]:
+    """Return (title, attack) pairs from the bundled injection corpus."""
+    text = path.read_text(encoding="utf-8")
+    return [
+        (title.strip(), attack.strip())
+        for title, attack in re.findall(r'^###\s*\d+\.\s*(.+?)\n```\n(.*?)\n\s*```', text, re.MULTILINE | re.DOTALL)
+    ]
+
+
+def _normalize(text: str) -> str:
+    # Console input carries literal "\n" sequences; treat them as the line breaks they stand for.
+    return _literal_newline.sub("\n", text)
+
+
+class HashedNgramClassifier:
+    """Logistic regression over hashed character 3-5-grams and word uni/bigrams."""
+
+    def __init__(self, buckets: int = 1 << 18):
+        self.buckets = buckets
+        self.weights = array('d', [0.0]) * buckets
+        self.bias = 0.0
+
+    def features(self, text: str) -> dict[int, float]:
+        text = " ".join(_normalize(text).lower().split())
+        counts: dict[int, float] = {}
+        buckets = self.buckets
+        padded = f" {text} "
+        for n in (3, 4, 5):
+            for i in range(len(padded) - n + 1):
+                index = zlib.crc32(padded[i:i + n].encode()) % buckets
+                counts[index] = counts.get(index, 0.0) + 1.0
+        words = _words.findall(text)
+        for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            index = zlib.crc32(b"w:" + gram.encode()) % buckets
+            counts[index] = counts.get(index, 0.0) + 1.0
+        norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+        return {index: value / norm for index, value in counts.items()}
+
+    def _score(self, features: dict[int, float]) -> float:
+        weights = self.weights
+        return self.bias + sum(weights[index] * value for index, value in features.items())
+
+    def predict_proba(self, text: str) -> float:
+        """Probability that `text` is malicious."""
+        score = self._score(self.features(text))
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, score))))
+
+    def fit(self, texts: list[str], labels: list[int], epochs: int = 30, learning_rate: float = 0.5,
+            l2: float = 1e-4, seed: int = 0) -> "HashedNgramClassifier":
+        samples = [(self.features(text), label) for text, label in zip(texts, labels)]
+        rng = random.Random(seed)
+        weights = self.weights
+        for _ in range(epochs):
+            rng.shuffle(samples)
+            for features, label in samples:
+                score = max(-30.0, min(30.0, self._score(features)))
+                gradient = 1.0 / (1.0 + math.exp(-score)) - label
+                for index, value in features.items():
+                    weights[index] -= learning_rate * (gradient * value + l2 * weights[index])
+                self.bias -= learning_rate * gradient
+        return self
+
+
+@dataclass(frozen=True)
+class SurfaceFeatures:
+    """Signature names, sensitive field mentions and structured formatting found in one input."""
+    signatures: list[tuple[str, str]]
+    sensitive: list[str]
+    structured: bool
+
+
+def surface_features(user_input: str) -> SurfaceFeatures:
+    text = _normalize(user_input)
+    return SurfaceFeatures(
+        signatures=[(threat_type, name) for threat_type, name, signature in _SIGNATURES if signature.search(text)],
+        sensitive=sorted({match.group().lower() for match in _sensitive.finditer(text)}),
+        structured=_format.search(text) is not None
+    )
+
+
+@dataclass(frozen=True)
+class PreVerdict:
+    """Local verdict; `is_safe` is None when the input has to go to the LLM judge."""
+    is_safe: bool | None
+    threat_type: str
+    reason: str
+    score: float
+
+    @property
+    def confident(self) -> bool:
+        return self.is_safe is not None
+
+
+class PreClassifier:
+    """
+    Signatures and a hashed n-gram classifier in front of the LLM judge.
+
+    An input is rejected when a signature fires, when it is longer than `max_chars`, when a structured template
+    asks for sensitive fields, or when the classifier is at least `reject_above` sure it is malicious. It is
+    accepted only when it is short, mentions no sensitive field, scores below `accept_below` and is `contact_only`
+    (the classifier alone cannot tell a benign question from a plain extraction request). Everything else goes to
+    the judge.
+    """
+
+    def __init__(
+            self,
+            classifier: HashedNgramClassifier | None = None,
+            accept_below: float = 0.2,
+            reject_above: float = 0.9,
+            max_chars: int = 2000,
+            max_accept_chars: int = 200
+    ):
+        self.classifier = classifier or self.train()
+        self.accept_below = accept_below
+        self.reject_above = reject_above
+        self.max_chars = max_chars
+        self.max_accept_chars = max_accept_chars
+
+    @staticmethod
+    def train(attacks: list[str] | None = None, benign: list[str] | None = None) -> HashedNgramClassifier:
+        """Train the classifier on the bundled injection corpus and benign directory questions."""
+        attacks = [attack for _, attack in load_injection_corpus()] if attacks is None else attacks
+        benign = BENIGN_QUERIES if benign is None else benign
+        return HashedNgramClassifier().fit(attacks + benign, [1] * len(attacks) + [0] * len(benign))
+
+    @staticmethod
+    def contact_only(text: str) -> bool:
+        """Whether the input is a single contact-detail question or greeting, i.e. inside the local accept allow-list."""
+        if "\n" in text.strip() or text.count("?") > 1:
+            return False
+        if _greeting.match(text):
+            return True
+        # A comma that only sets off "please" does not join a second request.
+        if _joined.search(_polite_comma.sub(r'\1 ', text)):
+            return False
+        words = _question_words.findall(_email_address.sub("email", text).lower())
+        return (
+                any(word in _CONTACT_WORDS for word in words)
+                and all(word in _ALLOWED_WORDS for word in words)
+        )
+
+    def classify(self, user_input: str) -> PreVerdict:
+        text = _normalize(user_input)
+        if len(text) > self.max_chars:
+            return PreVerdict(False, "context_saturation", f"Input longer than {self.max_chars} characters", 1.0)
+        for threat_type, name, signature in _SIGNATURES:
+            if signature.search(text):
+                return PreVerdict(False, threat_type, f"Matched {name} signature", 1.0)
+        sensitive = _sensitive.search(text)
+        if sensitive and _format.search(text):
+            return PreVerdict(False, "data_extraction", f"Structured template asking for '{sensitive.group()}'", 1.0)
+
+        score = self.classifier.predict_proba(text)
+        if score >= self.reject_above:
+            return PreVerdict(False, "prompt_injection", f"Classifier score {score:.2f}", score)
+        if (score < self.accept_below and not sensitive and len(text) <= self.max_accept_chars
+                and self.contact_only(text)):
+            return PreVerdict(True, "none", f"Classifier score {score:.2f}", score)
+        return PreVerdict(None, "none", f"Classifier score {score:.2f}", score)
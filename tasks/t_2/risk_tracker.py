@@ -0,0 +1,125 @@
+"""
+Conversation-level risk state for the input guardrail.
+
+`validate` judges every input on its own, so a multi-step attack - establish a roleplay, then ask which fields the
+profile has, then ask for "just the first four digits" - gets through one harmless-looking step at a time. Sending
+the whole history to the judge would fix that at a cost that grows with every turn. `ConversationRisk` instead keeps
+a small, bounded state per conversation, updated incrementally from the local surface features of each input and
+from the judge's verdicts:
+
+- a running risk score (each turn adds its own risk, older risk decays),
+- how often each attack signature or multi-step cue (roleplay setup, field probing, partial disclosure) fired and
+  which sensitive fields were asked about,
+- a rolling summary of the last few suspicious turns, shortened.
+
+Once the score is elevated, inputs skip the local accept and the verdict cache and go to the judge together with
+`judge_context()`, whose size does not depend on the length of the conversation.
+"""
+import re
+import textwrap
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from tasks.t_2.pre_classifier import surface_features
+
+NO_CONTEXT = "No earlier suspicious activity."
+
+# Risk of a single turn by its surface features.
+_SIGNATURE_RISK = 1.0
+_STRUCTURED_SENSITIVE_RISK = 0.9
+_SENSITIVE_RISK = 0.35
+_BLOCKED_RISK = 0.8
+_STEP_RISK = 0.4
+
+# Steps of a multi-turn extraction that are harmless on their own, so the pre-classifier does not reject them.
+_STEP_CUES = [
+    ("roleplay setup", re.compile(
+        r"\blet'?s play\b|\byou are now\b|\bact as\b|\bplay(?:ing)? the role\b|\bimagine you\b", re.IGNORECASE
+    )),
+    ("field probing", re.compile(
+        r'\bwhat (?:other )?(?:fields|information|data|details)\b.{0,30}\b(?:profile|record|have|store)\b|'
+        r'\bwhat else\b.{0,20}\b(?:know|have)\b',
+        re.IGNORECASE
+    )),
+    ("partial disclosure", re.compile(
+        r'\b(?:first|last)\s+(?:\w+\s+)?(?:digits?|characters?|letters?|numbers?)\b|'
+        r'\bone (?:digit|character|letter) at a time\b',
+        re.IGNORECASE
+    )),
+]
+
+
+@dataclass
+class ConversationRisk:
+    """Bounded per-conversation risk state; `score` is in [0, 1]."""
+    decay: float = 0.7
+    elevated_above: float = 0.5
+    max_suspicious_turns: int = 3
+    score: float = 0.0
+    turns: int = 0
+    blocked: int = 0
+    signature_hits: Counter = field(default_factory=Counter)
+    sensitive_fields: Counter = field(default_factory=Counter)
+    suspicious_turns: deque = field(default_factory=deque)
+
+    @property
+    def elevated(self) -> bool:
+        return self.score > self.elevated_above
+
+    def observe(self, user_input: str) -> float:
+        """Fold a new input into the state before it is judged; returns the risk of this turn alone."""
+        features = surface_features(user_input)
+        cues = [name for name, cue in _STEP_CUES if cue.search(user_input)]
+        if features.signatures:
+            risk = _SIGNATURE_RISK
+        elif features.sensitive and features.structured:
+            risk = _STRUCTURED_SENSITIVE_RISK
+        elif cues:
+            risk = _STEP_RISK + (_SENSITIVE_RISK if features.sensitive else 0.0)
+        elif features.sensitive:
+            risk = _SENSITIVE_RISK
+        else:
+            risk = 0.0
+
+        self.turns += 1
+        self.score = min(1.0, self.score * self.decay + risk)
+        self.signature_hits.update([name for _, name in features.signatures] + cues)
+        self.sensitive_fields.update(features.sensitive)
+        if risk:
+            reasons = [name for _, name in features.signatures] + cues
+            if features.sensitive:
+                reasons.append(f"asks about {', '.join(features.sensitive)}")
+            self._remember(user_input, "; ".join(reasons))
+        return risk
+
+    def record_verdict(self, is_safe: bool, reason: str, user_input: str):
+        """Fold the verdict for the latest input into the state."""
+        if is_safe:
+            return
+        self.blocked += 1
+        self.score = max(self.score, _BLOCKED_RISK)
+        if not self.suspicious_turns or self.suspicious_turns[-1][0] != self.turns:
+            self._remember(user_input, f"blocked: {reason}")
+
+    def judge_context(self) -> str:
+        """Compact description of the conversation for the judge, bounded in size."""
+        if not self.suspicious_turns and not self.blocked:
+            return NO_CONTEXT
+        lines = [f"Risk score {self.score:.2f} after {self.turns} turns, {self.blocked} inputs blocked."]
+        if self.signature_hits:
+            lines.append("Attack signatures: " + ", ".join(
+                f"{name} x{count}" for name, count in self.signature_hits.most_common(5)
+            ))
+        if self.sensitive_fields:
+            lines.append("Sensitive fields asked about: " + ", ".join(
+                f"{name} x{count}" for name, count in self.sensitive_fields.most_common(5)
+            ))
+        if self.suspicious_turns:
+            lines.append("Recent suspicious turns:")
+            lines += [f"- turn {turn}: \"{text}\" ({reason})" for turn, text, reason in self.suspicious_turns]
+        return "\n".join(lines)
+
+    def _remember(self, user_input: str, reason: str):
+        self.suspicious_turns.append((self.turns, textwrap.shorten(user_input, 120), textwrap.shorten(reason, 80)))
+        while len(self.suspicious_turns) > self.max_suspicious_turns:
+            self.suspicious_turns.popleft()
@@ -0,0 +1,143 @@
+"""
+Verdict cache for the input validation judge.
+
+Most traffic is the same handful of benign questions, and each of them used to cost a full judge round-trip.
+`VerdictCache` remembers verdicts keyed by a hash of the normalized input (unicode NFKC, case-folded, whitespace
+collapsed) and of the validation prompt and verdict schema, so editing either invalidates every entry. The
+in-memory tier is a bounded LRU with a TTL; an optional SQLite file keeps verdicts across restarts.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+from tasks.instrumentation import instrumentation
+
+Verdict = TypeVar("Verdict", bound=BaseModel)
+
+
+def normalize_input(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+@dataclass
+class CacheStats:
+    """Lookups served by the cache, accumulated over its lifetime."""
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class VerdictCache(Generic[Verdict]):
+    """
+    LRU + TTL cache of validation verdicts.
+
+    `hits` counts lookups answered from either tier (`disk_hits` those that had to go to SQLite). Safe to share
+    between threads.
+    """
+
+    def __init__(
+            self,
+            prompt: str,
+            result_type: type[Verdict],
+            max_entries: int = 10_000,
+            ttl_seconds: float = 24 * 60 * 60,
+            path: str | None = None
+    ):
+        schema = json.dumps(result_type.model_json_schema(), sort_keys=True)
+        self.prompt_version = hashlib.sha256(f"{prompt}\0{schema}".encode()).hexdigest()[:16]
+        self.result_type = result_type
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Verdict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, expires_at REAL, verdict TEXT)"
+            )
+            self._db.execute("DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def key(self, user_input: str) -> str:
+        return hashlib.sha256(f"{self.prompt_version}\0{normalize_input(user_input)}".encode()).hexdigest()
+
+    def get(self, user_input: str) -> Verdict | None:
+        key = self.key(user_input)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, verdict = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    instrumentation.count("verdict_cache_lookups_total", result="hit")
+                    return verdict
+                del self._entries[key]
+                self.stats.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, verdict FROM verdicts WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    verdict = self.result_type.model_validate_json(row[1])
+                    self._store(key, row[0], verdict)
+                    self.stats.hits += 1
+                    self.stats.disk_hits += 1
+                    instrumentation.count("verdict_cache_lookups_total", result="disk_hit")
+                    return verdict
+
+            self.stats.misses += 1
+            instrumentation.count("verdict_cache_lookups_total", result="miss")
+            return None
+
+    def put(self, user_input: str, verdict: Verdict):
+        key = self.key(user_input)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, expires_at, verdict)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?)", (key, expires_at, verdict.model_dump_json())
+                )
+                self._db.commit()
+
+    def _store(self, key: str, expires_at: float, verdict: Verdict):
+        self._entries[key] = (expires_at, verdict)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM verdicts")
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
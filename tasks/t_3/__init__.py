@@ -0,0 +1,19 @@
+"""Output guardrails: LLM output validation, streaming PII redaction and the Presidio engines."""
+from tasks._lazy import lazy_exports
+
+_EXPORTS = {
+    "StreamingPIIGuardrail": "tasks.t_3.streaming_pii_guardrail",
+    "NormalizingPIIGuardrail": "tasks.t_3.streaming_pii_guardrail",
+    "PresidioStreamingPIIGuardrail": "tasks.t_3.streaming_pii_guardrail",
+    "KnownSecretsGuardrail": "tasks.t_3.known_secrets",
+    "KnownSecretsIndex": "tasks.t_3.known_secrets",
+    "LocalPIIRedactor": "tasks.t_3.local_redactor",
+    "StreamingOutputValidator": "tasks.t_3.streaming_output_validation",
+    "BatchingRedactor": "tasks.t_3.presidio_engines",
+    "ProcessPoolRedactor": "tasks.t_3.presidio_engines",
+    "prewarm_presidio_engines": "tasks.t_3.presidio_engines",
+}
+
+__all__ = list(_EXPORTS)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,381 @@
+"""
+Known-secrets index: exact matching of the injected profile's own values.
+
+Every script puts the sensitive record (`PROFILE`) into the context, so we know exactly which values must never
+leave. `KnownSecretsIndex` parses the profile into forbidden values and their variants (as written, digits-only,
+last 4 digits, alternative date and amount spellings) and matches them with an Aho-Corasick automaton over a
+normalized character stream. Values of fewer than `MIN_BARE_DIGITS` digits (a CVV, the last 4 digits of a card)
+are too common to match anywhere ("room 1234"), so they only match right after a label ("CVV 1234", "ends in
+0051"), and only the value itself is redacted.
+
+- the stream goes through `tasks.t_3.normalization.StreamNormalizer` (NFKC and homoglyph folding, no zero-width
+  characters, runs of spelled-out digits become digits: "four one one one" -> "4111"),
+- letters are case-folded and every run of separators (spaces, dashes, dots, slashes, parentheses, ...) becomes a
+  single space.
+
+So "4111-1111-1111-1111", "4111 1111 1111 1111" and "four one one one, one one one one, ..." all hit the same
+index entry. Matches must start and end on token boundaries, and every normalized character remembers its span in
+the original text, so redaction replaces the original characters. Work is constant per input character, both for
+full responses (`KnownSecretsIndex.redact`) and for streams (`KnownSecretsGuardrail`).
+"""
+import re
+from collections import deque
+from dataclasses import dataclass
+
+from tasks.instrumentation import instrumentation
+from tasks.t_3.normalization import StreamNormalizer
+
+_MONTHS = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+
+# Profile fields that may be shared; every other field is a secret.
+ALLOWED_FIELDS = {"full name", "phone", "email", "occupation"}
+
+PLACEHOLDERS = {
+    "ssn": "[REDACTED-SSN]",
+    "credit card": "[REDACTED-CREDIT-CARD]",
+    "cvv": "[REDACTED]",
+    "expiration date": "[REDACTED]",
+    "driver's license": "[REDACTED-LICENSE]",
+    "bank account": "[REDACTED-ACCOUNT]",
+    "address": "[REDACTED-ADDRESS]",
+    "date of birth": "[REDACTED-DATE]",
+    "annual income": "[REDACTED-AMOUNT]",
+}
+
+# Digits-only variants shorter than this only match after one of their label's `_LABEL_CONTEXTS`.
+MIN_BARE_DIGITS = 6
+
+_LAST_DIGITS_CONTEXTS = [
+    "ending in", "ends in", "ending with", "ends with", "last 4", "last 4 digits", "last 4 digits are",
+    "last 4 are", "last four", "last four digits", "last four digits are", "last four are", "last digits",
+]
+_LABEL_CONTEXTS = {
+    "cvv": ["cvv", "cvc", "cvv2", "cvv is", "cvc is", "security code", "security code is", "card code"],
+    "expiration date": ["exp", "expiry", "expires", "expiration", "expiration date", "expiry date", "valid thru"],
+    "ssn": ["ssn", "social security", "social security number"] + _LAST_DIGITS_CONTEXTS,
+    "credit card": ["card"] + _LAST_DIGITS_CONTEXTS,
+    "bank account": ["account", "account number"] + _LAST_DIGITS_CONTEXTS,
+}
+
+_field = re.compile(r'^\*\*(.+?):\*\*\s*(.+?)\s*$', re.MULTILINE)
+_card_extras = re.compile(r'\((.*?)\)')
+_card_extra = re.compile(r'(exp|cvv)\w*:?\s*([^,]+)', re.IGNORECASE)
+
+class _Normalizer:
+    """
+    `StreamNormalizer` output in the index's alphabet, as `(char, start, end)` triples where `start:end` is the
+    original span: letters are case-folded and every run of other characters becomes a single space.
+    """
+
+    def __init__(self):
+        self._stream = StreamNormalizer()
+        self._pairs: list[tuple[str, int]] = []
+        self._end = 0
+        self._gap_start: int | None = None
+
+    @property
+    def position(self) -> int:
+        return self._stream.position
+
+    @property
+    def pending_start(self) -> int:
+        """Original offset of the earliest character that has not been emitted yet."""
+        return self._end if self._gap_start is None else self._gap_start
+
+    def feed(self, text: str, out: list):
+        self._stream.feed(text, self._pairs)
+        self._convert(out)
+
+    def finalize(self, out: list):
+        self._stream.finalize(self._pairs)
+        self._convert(out)
+        if self._gap_start is not None:
+            out.append((" ", self._gap_start, self.position))
+            self._gap_start = None
+
+    def _convert(self, out: list):
+        start = self._end
+        for char, end in self._pairs:
+            if char.isalnum():
+                if self._gap_start is not None:
+                    out.append((" ", self._gap_start, start))
+                    self._gap_start = None
+                for folded in char.casefold():
+                    out.append((folded, start, end))
+            elif self._gap_start is None:
+                self._gap_start = start
+            start = end
+        self._pairs.clear()
+        self._end = start
+
+
+def normalize(text: str) -> str:
+    out = []
+    normalizer = _Normalizer()
+    normalizer.feed(text, out)
+    normalizer.finalize(out)
+    return "".join(char for char, _, _ in out).strip()
+
+
+class _AhoCorasick:
+    """Aho-Corasick automaton with lazily completed transitions."""
+
+    def __init__(self, patterns: dict[str, tuple[str, int]]):
+        self._goto: list[dict[str, int]] = [{}]
+        fail = [0]
+        self._outputs: list[list[tuple[int, tuple[str, int]]]] = [[]]
+        self.depth = [0]
+        for pattern, label in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    fail.append(0)
+                    self._outputs.append([])
+                    self.depth.append(self.depth[state] + 1)
+                state = next_state
+            self._outputs[state].append((len(pattern), label))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[fail[next_state]]
+        self._fail = fail
+        self._transitions: dict[tuple[int, str], int] = {}
+
+    def step(self, state: int, char: str) -> int:
+        key = (state, char)
+        next_state = self._transitions.get(key)
+        if next_state is None:
+            probe = state
+            while probe and char not in self._goto[probe]:
+                probe = self._fail[probe]
+            next_state = self._transitions[key] = self._goto[probe].get(char, 0)
+        return next_state
+
+    def outputs(self, state: int) -> list[tuple[int, tuple[str, int]]]:
+        return self._outputs[state]
+
+
+@dataclass(frozen=True)
+class SecretMatch:
+    label: str
+    start: int
+    end: int
+
+    @property
+    def placeholder(self) -> str:
+        return PLACEHOLDERS.get(self.label, "[REDACTED]")
+
+
+def _digits(value: str) -> str:
+    return "".join(char for char in value if char.isdigit())
+
+
+def _variants(label: str, value: str) -> set[str]:
+    """Spellings of a secret value, before normalization."""
+    variants = {value}
+    digits = _digits(value)
+    if label == "date of birth":
+        match = re.search(r'([A-Za-z]+)\s+(\d{1,2}),?\s+(\d{4})', value)
+        if match and match.group(1).lower() in _MONTHS:
+            month, day, year = _MONTHS.index(match.group(1).lower()) + 1, int(match.group(2)), match.group(3)
+            variants |= {
+                f"{month:02d}/{day:02d}/{year}", f"{month}/{day}/{year}", f"{year}-{month:02d}-{day:02d}",
+                f"{day} {match.group(1)} {year}", f"{day:02d}.{month:02d}.{year}",
+            }
+        return variants
+    elif label == "address":
+        return variants | {value.split(",")[0]}
+    elif label == "driver's license":
+        variants.add(value.split("-")[-1])
+    elif label == "expiration date":
+        month, _, year = value.partition("/")
+        if year:
+            variants |= {f"{month}/20{year}", f"{month} 20{year}"}
+    if len(digits) >= 3:
+        variants.add(digits)
+    if len(digits) >= 8 and label in ("ssn", "credit card", "bank account"):
+        variants.add(digits[-4:])
+    return variants
+
+
+class KnownSecretsIndex:
+    """Index of forbidden values, matched on token boundaries of the normalized text."""
+
+    def __init__(self, secrets: dict[str, list[str]]):
+        self.secrets = secrets
+        # Normalized pattern (between boundary spaces) -> (label, length of the label context before the value).
+        patterns: dict[str, tuple[str, int]] = {}
+        for label, values in secrets.items():
+            for value in values:
+                for variant in _variants(label, value):
+                    key = normalize(variant)
+                    if not key:
+                        continue
+                    if key.isdigit() and len(key) < MIN_BARE_DIGITS:
+                        for context in map(normalize, _LABEL_CONTEXTS.get(label, [])):
+                            patterns.setdefault(f" {context} {key} ", (label, len(context) + 1))
+                    else:
+                        patterns.setdefault(f" {key} ", (label, 0))
+        self.patterns = patterns
+        self.max_pattern_length = max(map(len, patterns), default=0)
+        self._automaton = _AhoCorasick(patterns)
+
+    @classmethod
+    def from_profile(cls, profile: str) -> "KnownSecretsIndex":
+        """Parse `**Field:** value` lines; every field except name, phone, email and occupation is a secret."""
+        secrets: dict[str, list[str]] = {}
+        for field, value in _field.findall(profile):
+            label = field.strip().lower()
+            if label in ALLOWED_FIELDS:
+                continue
+            if label == "credit card":
+                for extras in _card_extras.findall(value):
+                    for name, extra in _card_extra.findall(extras):
+                        extra_label = "cvv" if name.lower() == "cvv" else "expiration date"
+                        secrets.setdefault(extra_label, []).append(extra.strip())
+                value = _card_extras.sub("", value).strip()
+            secrets.setdefault(label, []).append(value)
+        return cls(secrets)
+
+    def scanner(self) -> "SecretScanner":
+        return SecretScanner(self)
+
+    def find(self, text: str) -> list[SecretMatch]:
+        scanner = self.scanner()
+        matches = scanner.feed(text)
+        matches += scanner.finalize()
+        return matches
+
+    def redact(self, text: str) -> str:
+        return _apply(text, self.find(text), 0, len(text))
+
+
+class SecretScanner:
+    """Streaming matcher: feed original text, get `SecretMatch`es with spans in the original text."""
+
+    def __init__(self, index: KnownSecretsIndex):
+        self._automaton = index._automaton
+        self._normalizer = _Normalizer()
+        self._state = self._automaton.step(0, " ")
+        # Spans of the last normalized characters, enough to cover the longest pattern.
+        self._spans: deque[tuple[int, int]] = deque([(0, 0)], maxlen=max(1, index.max_pattern_length))
+
+    @property
+    def hold_start(self) -> int:
+        """Original offset before which no future match can start."""
+        candidates = [self._normalizer.position, self._normalizer.pending_start]
+        depth = self._automaton.depth[self._state]
+        if depth:
+            # The live prefix starts with a boundary space; the secret itself starts right after it.
+            candidates.append(self._spans[-depth][1])
+        return min(candidates)
+
+    def feed(self, text: str) -> list[SecretMatch]:
+        out = []
+        self._normalizer.feed(text, out)
+        return self._consume(out)
+
+    def finalize(self) -> list[SecretMatch]:
+        out = []
+        self._normalizer.finalize(out)
+        out.append((" ", self._normalizer.position, self._normalizer.position))
+        return self._consume(out)
+
+    def _consume(self, out: list) -> list[SecretMatch]:
+        matches = []
+        automaton = self._automaton
+        spans = self._spans
+        state = self._state
+        for char, start, end in out:
+            state = automaton.step(state, char)
+            spans.append((start, end))
+            for length, (label, context) in automaton.outputs(state):
+                # Drop the boundary spaces on both sides of the pattern, and the label context before the value.
+                matches.append(SecretMatch(label, spans[-length + 1 + context][0], spans[-2][1]))
+        self._state = state
+        return matches
+
+
+def _apply(text: str, matches: list[SecretMatch], offset: int, end: int) -> str:
+    """Replace the matches (merged where they overlap) inside `text`, which starts at original offset `offset`."""
+    parts = []
+    last = offset
+    for match in _merge(matches):
+        parts.append(text[last - offset:match.start - offset])
+        parts.append(match.placeholder)
+        instrumentation.count("pii_redactions_total", detector="known_secrets", type=match.label)
+        last = match.end
+    parts.append(text[last - offset:end - offset])
+    return "".join(parts)
+
+
+def _merge(matches: list[SecretMatch]) -> list[SecretMatch]:
+    merged: list[SecretMatch] = []
+    for match in sorted(matches, key=lambda m: (m.start, -m.end)):
+        if merged and match.start < merged[-1].end:
+            last = merged[-1]
+            if match.end > last.end:
+                merged[-1] = SecretMatch(last.label, last.start, match.end)
+            continue
+        merged.append(match)
+    return merged
+
+
+class KnownSecretsGuardrail:
+    """
+    Streaming guardrail that redacts the profile's own values.
+
+    Same interface as the streaming PII guardrails: only the text from which a secret could still be forming is
+    held back; everything before it is released at once.
+    """
+
+    def __init__(self, index: KnownSecretsIndex):
+        self.index = index
+        self._scanner = index.scanner()
+        self._held = ""
+        self._committed = 0
+        self._matches: list[SecretMatch] = []
+
+    def process_chunk(self, chunk: str) -> str:
+        if not chunk:
+            return chunk
+        self._held += chunk
+        self._matches += self._scanner.feed(chunk)
+        return self._release(self._scanner.hold_start)
+
+    def finalize(self) -> str:
+        self._matches += self._scanner.finalize()
+        released = self._release(self._committed + len(self._held))
+        self._scanner = self.index.scanner()
+        self._committed = 0
+        return released
+
+    def _release(self, end: int) -> str:
+        # Never cut through a match that is still being redacted.
+        cut = True
+        while cut:
+            cut = False
+            for match in self._matches:
+                if match.start < end < match.end:
+                    end, cut = match.start, True
+        if end <= self._committed:
+            return ""
+        ready = [match for match in self._matches if match.end <= end]
+        self._matches = [match for match in self._matches if match.end > end]
+        released = _apply(self._held, ready, self._committed, end)
+        self._held = self._held[end - self._committed:]
+        self._committed = end
+        return released
@@ -0,0 +1,74 @@
+"""
+Local deterministic redaction for the soft output guardrail.
+
+The soft path used to send every flagged response to the gpt-4o filter with `FILTER_SYSTEM_PROMPT`. Its placeholder
+set is fixed, and the regexes of `StreamingPIIGuardrail` already produce the same placeholders, so
+`LocalPIIRedactor` replaces every span they find locally and calls the LLM filter only when the validator reported
+a PII type for which no span could be found.
+"""
+from dataclasses import dataclass, field
+from typing import Callable
+
+from tasks.t_3.streaming_pii_guardrail import StreamingPIIGuardrail
+
+# Reported PII type keywords -> `StreamingPIIGuardrail._pii_patterns` name; None marks types that may be shown.
+_TYPE_KEYWORDS: list[tuple[tuple[str, ...], str | None]] = [
+    (("ssn", "social security"), "ssn"),
+    (("cvv", "cvc", "security code"), "cvv"),
+    (("expir", "exp date", "exp."), "card_exp"),
+    (("credit", "card"), "credit_card"),
+    (("licen",), "license"),
+    (("bank", "account"), "bank_account"),
+    (("address",), "address"),
+    (("birth", "dob", "date"), "date"),
+    (("income", "salary", "amount", "currency"), "currency"),
+    (("phone", "email", "full name"), None),
+]
+
+_ALLOWED = object()
+
+
+def pattern_for(pii_type: str):
+    """Local pattern name for a reported PII type, `_ALLOWED` for shareable types, or None when unknown."""
+    normalized = pii_type.lower().replace("_", " ").replace("-", " ").replace("e mail", "email").strip()
+    normalized = normalized.replace("email address", "email")
+    if normalized in ("name", "names"):
+        return _ALLOWED
+    for keywords, pattern in _TYPE_KEYWORDS:
+        if any(keyword in normalized for keyword in keywords):
+            return _ALLOWED if pattern is None else pattern
+    return None
+
+
+@dataclass
+class RedactionResult:
+    text: str
+    local_types: set[str] = field(default_factory=set)
+    unresolved: list[str] = field(default_factory=list)
+    used_llm: bool = False
+
+
+class LocalPIIRedactor:
+    """Regex redaction with the `FILTER_SYSTEM_PROMPT` placeholders, falling back to `llm_filter` when needed."""
+
+    def __init__(self, llm_filter: Callable[[str], str] | None = None):
+        self.llm_filter = llm_filter
+        self._detector = StreamingPIIGuardrail()
+
+    def redact_locally(self, text: str, pii_types: list[str]) -> RedactionResult:
+        """Replace every locally detectable span; `unresolved` lists reported types with no local span."""
+        matches = list(self._detector._pii_regex().finditer(text))
+        found = {match.lastgroup for match in matches}
+        unresolved = [
+            pii_type for pii_type in pii_types
+            if (pattern := pattern_for(pii_type)) is not _ALLOWED and pattern not in found
+        ]
+        redacted = self._detector._redact(text, iter(matches), 0, len(text)) if matches else text
+        return RedactionResult(redacted, found, unresolved)
+
+    def redact(self, text: str, pii_types: list[str]) -> RedactionResult:
+        result = self.redact_locally(text, pii_types)
+        if result.unresolved and self.llm_filter is not None:
+            result.text = self.llm_filter(result.text)
+            result.used_llm = True
+        return result
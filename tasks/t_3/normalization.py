@@ -0,0 +1,239 @@
+"""
+Incremental normalization of streamed LLM output for the PII pattern engine.
+
+The regexes of `StreamingPIIGuardrail` only see what the LLM literally wrote, so they are bypassed by numbers
+written as words ("four one one one"), homoglyphs and full-width digits ("３７８２"), zero-width characters inside
+a number and extra separators ("3782 - 8224"). `StreamNormalizer` rewrites the stream before the patterns see it:
+
+- characters are NFKC-folded, Cyrillic/Greek look-alikes become their Latin letters and dashes become `-`,
+- zero-width characters are dropped,
+- spelled-out digits become digits when they belong to a run of at least `MIN_SPELLED_RUN` number tokens, so a
+  lone "one" or "four" in prose stays a word ("one of the best"); single digits separated by whitespace only are
+  joined ("four one one one" -> "4111", "3 7 8 2" -> "3782"); any other separator next to a spelled digit becomes
+  one space or dash,
+- separator runs between numbers collapse to one character and other whitespace runs to one space.
+
+Characters the patterns rely on (`/`, `$`, single `-`, `.` and `,` inside numbers) are kept. Every normalized
+character records the end of its span in the original text; spans are contiguous (dropped characters belong to the
+next span), so a match on the normalized text maps back to one original slice. The normalizer holds back at most
+the current word, one digit, one separator run and the first tokens of a run of spelled-out digits (until the run
+is long enough to fold), so the work per input character is constant.
+"""
+import unicodedata
+
+DIGIT_WORDS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+}
+
+DIGIT_WORD_PREFIXES = {word[:i] for word in DIGIT_WORDS for i in range(1, len(word) + 1)}
+
+# Number tokens (spelled-out digits, digits and numbers, separated by separators only) a run needs before its
+# spelled-out digits are folded.
+MIN_SPELLED_RUN = 3
+
+ZERO_WIDTH = {"\u00ad", "\u180e", "\u200b", "\u200c", "\u200d", "\u200e", "\u200f", "\u2060", "\u2061", "\ufeff"}
+
+# Look-alikes NFKC keeps apart from the Latin letters.
+HOMOGLYPHS = str.maketrans(
+    "АВЕКМНОРСТХаеорсухіІјЈѕЅԁӏΑΒΕΖΗΙΚΜΝΟΡΤΥΧοι",
+    "ABEKMHOPCTXaeopcyxiIjJsSdlABEZHIKMNOPTYXoi",
+)
+
+_DASHES = {"\u2010", "\u2011", "\u2012", "\u2013", "\u2014", "\u2015", "\u2212", "\ufe58", "\ufe63", "\uff0d"}
+
+# Separators between numbers; `.` and `,` are kept when they are the whole run ("112,800", "3.5").
+_GAP = {"-", ",", "."}
+
+_folded: dict[str, str] = {}
+
+
+def fold(char: str) -> str:
+    """NFKC- and homoglyph-folded form of a character; empty for zero-width characters."""
+    folded = _folded.get(char)
+    if folded is None:
+        if char in ZERO_WIDTH:
+            folded = ""
+        elif char in _DASHES:
+            folded = "-"
+        else:
+            folded = unicodedata.normalize("NFKC", char.translate(HOMOGLYPHS))
+            if len(folded) == 1 and folded.isdecimal():
+                folded = str(unicodedata.decimal(folded))
+        _folded[char] = folded
+    return folded
+
+
+_SINGLE_DIGITS = {"digit", "spelled"}
+_NUMBERS = _SINGLE_DIGITS | {"number"}
+
+
+class StreamNormalizer:
+    """
+    Incremental normalizer. `feed` and `finalize` append `(char, end)` pairs to `out`: the normalized character and
+    the end of its original span, which starts where the previous span ended.
+    """
+
+    def __init__(self):
+        self.position = 0
+        self._word: list[tuple[str, int]] = []
+        self._word_plain = False
+        self._digit: tuple[str, int] | None = None
+        self._in_number = False
+        self._gap: list[tuple[str, int]] = []
+        self._previous: str | None = None
+        # A run of spelled-out digits that is not yet long enough to fold: its events ("spelled", word, end),
+        # ("digit", char, end) and ("gap", char, end) are replayed once the run is decided.
+        self._run: list[tuple] = []
+        self._run_tokens = 0
+        self._folding = False
+
+    def feed(self, text: str, out: list):
+        position = self.position
+        for char in text:
+            position += 1
+            for folded in fold(char):
+                if folded.isalpha():
+                    self._letter(folded, position, out)
+                elif folded.isdecimal():
+                    self._number(folded, position, out)
+                else:
+                    self._end_word(out)
+                    self._end_number(out)
+                    if folded.isspace() or folded in _GAP:
+                        if self._run:
+                            self._run.append(("gap", folded, position))
+                        else:
+                            self._gap.append((folded, position))
+                    else:
+                        self._end_run(out)
+                        self._close_gap("other", out)
+                        out.append((folded, position))
+        self.position = position
+
+    def finalize(self, out: list):
+        self._end_word(out)
+        self._end_run(out)
+        self._end_number(out)
+        self._close_gap(None, out)
+        self._previous = None
+
+    def _letter(self, letter: str, end: int, out: list):
+        self._end_number(out)
+        if self._word_plain:
+            out.append((letter, end))
+            return
+        self._word.append((letter, end))
+        if "".join(char for char, _ in self._word).lower() not in DIGIT_WORD_PREFIXES:
+            # Cannot become a digit word any more: release the letters.
+            self._end_run(out)
+            self._close_gap("word", out)
+            out.extend(self._word)
+            self._word = []
+            self._word_plain = True
+
+    def _end_word(self, out: list):
+        self._word_plain = False
+        if not self._word:
+            return
+        word, self._word = self._word, []
+        digit = DIGIT_WORDS.get("".join(char for char, _ in word).lower())
+        if digit is None:
+            self._end_run(out)
+            self._close_gap("word", out)
+            out.extend(word)
+        elif self._folding:
+            self._close_gap("spelled", out)
+            out.append((digit, word[-1][1]))
+        else:
+            self._run.append(("spelled", word, word[-1][1]))
+            self._count_run_token(out)
+
+    def _count_run_token(self, out: list):
+        self._run_tokens += 1
+        if self._run_tokens >= MIN_SPELLED_RUN:
+            self._replay_run(True, out)
+            self._folding = True
+
+    def _end_run(self, out: list):
+        """A token that cannot continue a run arrived: a pending run is too short and its words stay words."""
+        self._folding = False
+        if self._run:
+            self._replay_run(False, out)
+
+    def _replay_run(self, fold_words: bool, out: list):
+        run, self._run, self._run_tokens = self._run, [], 0
+        # The word being read (it ended the run) is not part of it.
+        word, self._word = self._word, []
+        for kind, value, end in run:
+            if kind == "spelled":
+                self._end_number(out)
+                if fold_words:
+                    self._close_gap("spelled", out)
+                    out.append((DIGIT_WORDS["".join(char for char, _ in value).lower()], end))
+                else:
+                    self._close_gap("word", out)
+                    out.extend(value)
+            elif kind == "digit":
+                self._number(value, end, out)
+            else:
+                self._end_number(out)
+                self._gap.append((value, end))
+        self._word = word
+
+    def _number(self, digit: str, end: int, out: list):
+        self._end_word(out)
+        if self._run:
+            if self._run[-1][0] != "digit":
+                self._run.append(("digit", digit, end))
+                self._count_run_token(out)
+            else:
+                self._run.append(("digit", digit, end))
+            return
+        if self._in_number:
+            out.append((digit, end))
+        elif self._digit is None:
+            # Hold the first digit until the next character tells whether it is a single digit.
+            self._digit = (digit, end)
+        else:
+            self._close_gap("number", out)
+            out.append(self._digit)
+            out.append((digit, end))
+            self._digit = None
+            self._in_number = True
+
+    def _end_number(self, out: list):
+        self._in_number = False
+        if self._digit is not None:
+            self._close_gap("digit", out)
+            out.append(self._digit)
+            self._digit = None
+
+    def _close_gap(self, following: str | None, out: list):
+        """Emit the pending separator run, knowing the kind of token that follows it, then record that token."""
+        gap, previous = self._gap, self._previous
+        self._previous = following
+        if not gap:
+            return
+        self._gap = []
+        chars = "".join(char for char, _ in gap)
+        end = gap[-1][1]
+        if previous in _NUMBERS and following in _NUMBERS:
+            if chars.isspace() and previous in _SINGLE_DIGITS and following in _SINGLE_DIGITS:
+                return
+            if len(chars) > 1 or "spelled" in (previous, following):
+                chars = "-" if "-" in chars else " "
+            out.append((chars, end))
+        elif chars.isspace():
+            out.append(("\n" if "\n" in chars else " ", end))
+        else:
+            out.extend(gap)
+
+
+def normalize(text: str) -> tuple[str, list[int]]:
+    """Normalize a complete text; returns the normalized text and the original end offset of every character."""
+    out = []
+    normalizer = StreamNormalizer()
+    normalizer.feed(text, out)
+    normalizer.finalize(out)
+    return "".join(char for char, _ in out), [end for _, end in out]
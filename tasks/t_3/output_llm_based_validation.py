@@ -1,10 +1,14 @@
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import SystemMessagePromptTemplate, ChatPromptTemplate
-from langchain_openai import AzureChatOpenAI
-from pydantic import SecretStr
+from pydantic import BaseModel, Field
 
-from tasks._constants import DIAL_URL, API_KEY
+from tasks.history import BLOCKED_MARKER, ConversationHistory, llm_summarizer
+from tasks.http_pool import create_client, get_http_pool
+from tasks.instrumentation import instrumentation
+from tasks.prompt_cache import FILTER, GENERATOR, OUTPUT_JUDGE, cache_usage, judge_prompt
+from tasks.t_3.local_redactor import LocalPIIRedactor
+from tasks.t_3.streaming_output_validation import StreamingOutputValidator
 
 SYSTEM_PROMPT = "You are a secure colleague directory assistant designed to help users find contact information for business purposes."
 
@@ -68,50 +72,81 @@ class OutputValidationResult(BaseModel):
     pii_types: list[str] = Field(default=[], description="List of PII types found")
     reason: str = Field(description="Explanation of the decision")
 
-llm_client = AzureChatOpenAI(
-    temperature=0.0,
-    azure_deployment="gpt-4.1-nano-2025-04-14",
-    azure_endpoint=DIAL_URL,
-    api_key=SecretStr(API_KEY),
-    api_version=""
-)
-
-filter_client = AzureChatOpenAI(
-    temperature=0.0,
-    azure_deployment="gpt-4o",
-    azure_endpoint=DIAL_URL,
-    api_key=SecretStr(API_KEY),
-    api_version=""
-)
+# Both clients share one HTTP connection pool (see `tasks.http_pool`) and report usage to `cache_usage`.
+llm_client = create_client("gpt-4.1-nano-2025-04-14")
 
-def validate(llm_output: str) -> OutputValidationResult:
-    #TODO 2:
-    # Make validation of LLM output to check leaks of PII
+filter_client = create_client("gpt-4o")
+
+def build_validation_chain(client: BaseChatModel):
+    """Build the `prompt | client | parser` validation runnable; it is stateless, so build it once and reuse it."""
     parser = PydanticOutputParser(pydantic_object=OutputValidationResult)
     
-    messages = [
-        SystemMessagePromptTemplate.from_template(VALIDATION_PROMPT),
-        HumanMessage(content=f"LLM output to validate:\n{llm_output}")
-    ]
+    # The system message is rendered once, so every validation call starts with the same prefix.
+    prompt = judge_prompt(VALIDATION_PROMPT, parser, "LLM output to validate:\n{llm_output}")
     
-    prompt = ChatPromptTemplate.from_messages(messages=messages).partial(
-        format_instructions=parser.get_format_instructions()
-    )
-    
-    result: OutputValidationResult = (prompt | llm_client | parser).invoke({"llm_output": llm_output})
+    return (prompt | client | parser).with_config(tags=[OUTPUT_JUDGE])
+
+validation_chain = build_validation_chain(llm_client)
+
+def validate(llm_output: str) -> OutputValidationResult:
+    #TODO 2:
+    # Make validation of LLM output to check leaks of PII
+    with instrumentation.span("validate_output", task="t_3") as span:
+        result: OutputValidationResult = validation_chain.invoke({"llm_output": llm_output})
+        span.set("contains_pii", result.contains_pii)
     return result
 
-def main(soft_response: bool):
+def filter_pii(llm_output: str) -> str:
+    """Redact PII from `llm_output` with the filter LLM."""
+    filter_messages = [
+        SystemMessage(content=FILTER_SYSTEM_PROMPT),
+        HumanMessage(content=llm_output)
+    ]
+    with instrumentation.span("filter", task="t_3"):
+        return filter_client.invoke(filter_messages, config={"tags": [FILTER]}).content
+
+# Redacts the known PII types locally with the FILTER_SYSTEM_PROMPT placeholders; the filter LLM is only called for
+# reported types that have no local span.
+local_redactor = LocalPIIRedactor(llm_filter=filter_pii)
+
+def stream_validated(messages: list[BaseMessage], soft_response: bool) -> StreamingOutputValidator:
+    """Stream a response, printing each sentence as soon as it has been validated."""
+    validator = StreamingOutputValidator(
+        validate=validate,
+        redact=lambda text, pii_types: local_redactor.redact(text, pii_types).text,
+        soft_response=soft_response
+    )
+    print("\n🤖 Assistant: ", end="", flush=True)
+    try:
+        with instrumentation.span("stream", task="t_3") as span:
+            for chunk in llm_client.stream(messages, config={"tags": [GENERATOR]}):
+                if chunk.content:
+                    print(validator.process_chunk(chunk.content), end="", flush=True)
+                if validator.blocked:
+                    break
+            print(validator.finalize(), end="", flush=True)
+            span.set("blocked", validator.blocked)
+            span.set("redactions", validator.outcome.redactions)
+    finally:
+        validator.close()
+    print("\n")
+    return validator
+
+def main(soft_response: bool, streaming: bool = False):
     #TODO 3:
     # Create console chat with LLM, preserve history there.
     # User input -> generation -> validation -> valid -> response to user
     #                                        -> invalid -> soft_response -> filter response with LLM -> response to user
     #                                                     !soft_response -> reject with description
+    # With `streaming` the response is validated sentence by sentence while it is generated (see
+    # `StreamingOutputValidator`), and only validated sentences are shown.
     
     messages: list[BaseMessage] = [
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=PROFILE)
     ]
+    # The system prompt and profile stay pinned; older turns are summarized within the token budget.
+    history = ConversationHistory(messages, summarizer=llm_summarizer(llm_client))
     
     mode = "SOFT (Redaction)" if soft_response else "HARD (Blocking)"
     print(f"🛡️  Secure Assistant with Output Validation [{mode}]")
@@ -123,16 +158,33 @@ def main(soft_response: bool):
         user_input = input("\n👤 You: ").strip()
         
         if user_input.lower() in ['quit', 'exit']:
+            print(cache_usage.report())
+            print(get_http_pool().report())
+            print(instrumentation.report())
+            instrumentation.shutdown()
             print("Goodbye!")
             break
         
         if not user_input:
             continue
         
-        messages.append(HumanMessage(content=user_input))
+        history.append(HumanMessage(content=user_input))
+        
+        if streaming:
+            validator = stream_validated(history.messages(), soft_response)
+            if validator.blocked:
+                history.append(AIMessage(content=BLOCKED_MARKER))
+                print(f"❌ BLOCKED: Response blocked due to PII disclosure: {validator.outcome.blocked_reason}\n")
+            else:
+                if validator.outcome.pii_types:
+                    print(f"⚠️  PII REDACTED: {', '.join(sorted(validator.outcome.pii_types))}\n")
+                history.append(AIMessage(content=validator.output))
+            print(history.report())
+            continue
         
         # Generate response
-        response = llm_client.invoke(messages)
+        with instrumentation.span("generate", task="t_3"):
+            response = llm_client.invoke(history.messages(), config={"tags": [GENERATOR]})
         llm_output = response.content
         
         # Validate output
@@ -144,30 +196,30 @@ def main(soft_response: bool):
             
             if soft_response:
                 # Filter PII from response
-                print("🔧 Applying redaction...")
-                filter_messages = [
-                    SystemMessage(content=FILTER_SYSTEM_PROMPT),
-                    HumanMessage(content=llm_output)
-                ]
-                filtered_response = filter_client.invoke(filter_messages)
-                final_output = filtered_response.content
+                with instrumentation.span("redact", task="t_3") as span:
+                    redaction = local_redactor.redact(llm_output, validation_result.pii_types)
+                    span.set("used_llm", redaction.used_llm)
+                print(f"🔧 Applied {'LLM' if redaction.used_llm else 'local'} redaction")
+                final_output = redaction.text
                 
                 # Update history with filtered response
-                messages.append(AIMessage(content=final_output))
+                history.append(AIMessage(content=final_output))
                 print(f"\n🤖 Assistant (redacted): {final_output}\n")
             else:
                 # Hard block
                 rejection_msg = f"Response blocked due to PII disclosure: {validation_result.reason}"
-                messages.append(AIMessage(content="[User attempted to access confidential information]"))
+                history.append(AIMessage(content=BLOCKED_MARKER))
                 print(f"\n❌ BLOCKED: {rejection_msg}\n")
         else:
             # Output is safe
             print("✅ Output validated - No PII detected")
-            messages.append(response)
+            history.append(response)
             print(f"\n🤖 Assistant: {llm_output}\n")
+        print(history.report())
 
 
-main(soft_response=False)
+if __name__ == "__main__":
+    main(soft_response=False)
 
 #TODO:
 # ---------
@@ -0,0 +1,319 @@
+"""
+Prefix-aware matcher for the streaming PII guardrails.
+
+`PrefixAutomaton` compiles a regular expression (the same combined pattern the guardrail redacts with) into an NFA,
+using the standard library's regex parser. `PrefixScanner` runs that automaton over a stream one character at a
+time and can tell, at any point, whether the text seen so far ends inside something that could still grow into a
+match, and where the earliest such candidate begins.
+
+Determinised transitions are cached on the automaton, so each streamed character costs one cache lookup per live
+candidate. The automaton over-approximates constructs it cannot model exactly (anchors, complex lookarounds,
+possessive repeats): it may report a candidate that the real regex would reject, but never misses one.
+"""
+import re
+
+try:
+    from re import _constants as sre
+    from re import _parser as sre_parse
+except ImportError:
+    # Python < 3.11: the same modules under their old public names, without atomic groups and possessive repeats.
+    import sre_constants as sre
+    import sre_parse
+
+_CHAR, _SPLIT, _ASSERT, _ACCEPT = range(4)
+
+_LOOKBEHIND, _LOOKAHEAD, _BOUNDARY, _NON_BOUNDARY = range(4)
+
+_CATEGORIES = {
+    sre.CATEGORY_DIGIT: str.isdecimal,
+    sre.CATEGORY_NOT_DIGIT: lambda c: not c.isdecimal(),
+    sre.CATEGORY_SPACE: str.isspace,
+    sre.CATEGORY_NOT_SPACE: lambda c: not c.isspace(),
+    sre.CATEGORY_WORD: lambda c: c.isalnum() or c == '_',
+    sre.CATEGORY_NOT_WORD: lambda c: not (c.isalnum() or c == '_'),
+}
+
+_REPEATS = tuple(getattr(sre, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") if hasattr(sre, name))
+
+_ATOMIC_GROUP = getattr(sre, "ATOMIC_GROUP", None)
+
+
+class PrefixAutomaton:
+    """NFA built from a regular expression, with lazily determinised transitions."""
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self._ignore_case = bool(flags & re.IGNORECASE)
+        self._kinds: list[int] = []
+        self._args: list = []
+        self._tests: list = [_CATEGORIES[sre.CATEGORY_WORD]]
+        self._test_ids: dict = {}
+        self._classes: dict[str, int] = {}
+        self._class_bits: list[tuple[bool, ...]] = []
+        self._class_ids: dict[tuple[bool, ...], int] = {}
+        self._transitions: dict = {}
+        # State sets from which the pattern may already have matched (trailing assertions are not checked).
+        self.accepting: set[frozenset] = set()
+        self._closures: dict[frozenset, bool] = {}
+
+        accept = self._add(_ACCEPT, None)
+        self.start = frozenset([self._compile(sre_parse.parse(pattern, flags), accept)])
+
+    # --- construction -------------------------------------------------------------------------------------------
+
+    def _add(self, kind: int, arg) -> int:
+        self._kinds.append(kind)
+        self._args.append(arg)
+        return len(self._kinds) - 1
+
+    def _test_id(self, key, test) -> int:
+        test_id = self._test_ids.get(key)
+        if test_id is None:
+            self._tests.append(test)
+            test_id = self._test_ids[key] = len(self._tests) - 1
+        return test_id
+
+    def _char_test(self, op, av) -> int | None:
+        """Return a test id for a single-character item, or None if the item does not consume one character."""
+        fold = self._ignore_case
+        if op is sre.LITERAL:
+            chars = {chr(av).lower(), chr(av).upper()} if fold else {chr(av)}
+            return self._test_id((op, av), lambda c: c in chars)
+        if op is sre.NOT_LITERAL:
+            chars = {chr(av).lower(), chr(av).upper()} if fold else {chr(av)}
+            return self._test_id((op, av), lambda c: c not in chars)
+        if op is sre.ANY:
+            return self._test_id((op, None), lambda c: c != '\n')
+        if op is sre.IN:
+            return self._test_id((op, repr(av)), self._set_test(av))
+        return None
+
+    def _set_test(self, items):
+        negate = False
+        checks = []
+        for op, av in items:
+            if op is sre.NEGATE:
+                negate = True
+            elif op is sre.LITERAL:
+                checks.append(lambda c, o=av: ord(c) == o)
+            elif op is sre.RANGE:
+                checks.append(lambda c, lo=av[0], hi=av[1]: lo <= ord(c) <= hi)
+            elif op is sre.CATEGORY:
+                checks.append(_CATEGORIES[av])
+            else:
+                raise ValueError(f"Unsupported character set item: {op}")
+
+        def matches(char: str) -> bool:
+            return any(check(char) for check in checks)
+
+        if self._ignore_case:
+            def test(c: str) -> bool:
+                return negate != (matches(c) or matches(c.lower()) or matches(c.upper()))
+        else:
+            def test(c: str) -> bool:
+                return negate != matches(c)
+        return test
+
+    def _compile(self, items, out: int) -> int:
+        """Compile a sequence of parsed items right-to-left, so every fragment already knows where it continues."""
+        for op, av in reversed(list(items)):
+            out = self._compile_item(op, av, out)
+        return out
+
+    def _compile_item(self, op, av, out: int) -> int:
+        test = self._char_test(op, av)
+        if test is not None:
+            return self._add(_CHAR, (test, out))
+        if op is sre.SUBPATTERN:
+            return self._compile(av[-1], out)
+        if op is _ATOMIC_GROUP:
+            return self._compile(av, out)
+        if op is sre.BRANCH:
+            return self._add(_SPLIT, [self._compile(branch, out) for branch in av[1]])
+        if op in _REPEATS:
+            return self._compile_repeat(*av, out)
+        if op is sre.AT:
+            if av in (sre.AT_BOUNDARY, sre.AT_NON_BOUNDARY):
+                return self._add(_ASSERT, (_BOUNDARY if av is sre.AT_BOUNDARY else _NON_BOUNDARY, None, out))
+            return out
+        if op in (sre.ASSERT, sre.ASSERT_NOT):
+            direction, body = av
+            body = list(body)
+            test = self._char_test(*body[0]) if len(body) == 1 else None
+            if test is None:
+                return out
+            kind = _LOOKAHEAD if direction == 1 else _LOOKBEHIND
+            return self._add(_ASSERT, (kind, (test, op is sre.ASSERT), out))
+        raise ValueError(f"Unsupported regular expression construct: {op}")
+
+    def _compile_repeat(self, min_count: int, max_count: int, body, out: int) -> int:
+        if max_count is sre.MAXREPEAT:
+            loop = self._add(_SPLIT, None)
+            self._args[loop] = [self._compile(body, loop), out]
+            tail = loop
+        else:
+            tail = out
+            for _ in range(max_count - min_count):
+                tail = self._add(_SPLIT, [self._compile(body, tail), out])
+        for _ in range(min_count):
+            tail = self._compile(body, tail)
+        return tail
+
+    # --- simulation ---------------------------------------------------------------------------------------------
+
+    def char_class(self, char: str) -> int:
+        """Map a character to the id of the set of character tests it satisfies."""
+        class_id = self._classes.get(char)
+        if class_id is None:
+            bits = tuple(test(char) for test in self._tests)
+            class_id = self._class_ids.get(bits)
+            if class_id is None:
+                self._class_bits.append(bits)
+                class_id = self._class_ids[bits] = len(self._class_bits) - 1
+            self._classes[char] = class_id
+        return class_id
+
+    def step(self, states: frozenset, prev_class: int | None, char_class: int) -> frozenset:
+        """Consume one character of class `char_class` that follows a character of class `prev_class`."""
+        key = (states, prev_class, char_class)
+        result = self._transitions.get(key)
+        if result is None:
+            result = self._transitions[key] = self._step(states, prev_class, char_class)
+            if self._may_accept(result):
+                self.accepting.add(result)
+        return result
+
+    def _may_accept(self, states: frozenset) -> bool:
+        """Whether the accept state is reachable from `states` without consuming input (assertions assumed true)."""
+        result = self._closures.get(states)
+        if result is None:
+            result = False
+            seen = set()
+            pending = list(states)
+            while pending:
+                state = pending.pop()
+                if state in seen:
+                    continue
+                seen.add(state)
+                kind, arg = self._kinds[state], self._args[state]
+                if kind == _ACCEPT:
+                    result = True
+                    break
+                if kind == _SPLIT:
+                    pending.extend(arg)
+                elif kind == _ASSERT:
+                    pending.append(arg[2])
+            self._closures[states] = result
+        return result
+
+    def _step(self, states: frozenset, prev_class: int | None, char_class: int) -> frozenset:
+        prev_bits = self._class_bits[prev_class] if prev_class is not None else None
+        bits = self._class_bits[char_class]
+        prev_word = prev_bits is not None and prev_bits[0]
+        next_states = set()
+        seen = set()
+        pending = list(states)
+        while pending:
+            state = pending.pop()
+            if state in seen:
+                continue
+            seen.add(state)
+            kind, arg = self._kinds[state], self._args[state]
+            if kind == _CHAR:
+                test, out = arg
+                if bits[test]:
+                    next_states.add(out)
+            elif kind == _SPLIT:
+                pending.extend(arg)
+            elif kind == _ASSERT:
+                assertion, check, out = arg
+                if assertion == _BOUNDARY:
+                    holds = prev_word != bits[0]
+                elif assertion == _NON_BOUNDARY:
+                    holds = prev_word == bits[0]
+                else:
+                    test, positive = check
+                    checked = bits if assertion == _LOOKAHEAD else prev_bits
+                    holds = positive == (checked is not None and checked[test])
+                if holds:
+                    pending.append(out)
+        return frozenset(next_states)
+
+
+class PrefixScanner:
+    """
+    Per-stream state of a `PrefixAutomaton`.
+
+    Feed the stream with `feed()`; `candidate_start` is the absolute offset of the earliest position from which the
+    text seen so far could still turn into a match, or None when the stream does not end inside a candidate.
+    `match_until` is the offset right after the last character at which some candidate may have completed a match:
+    no match ends after it, so a buffer that lies entirely past it is known to be PII-free without running the
+    regex.
+    """
+
+    def __init__(self, automaton: PrefixAutomaton):
+        self._automaton = automaton
+        self._candidates: dict[frozenset, int] = {}
+        self._prev_class: int | None = None
+        self.position = 0
+        self.candidate_start: int | None = None
+        self.match_until = 0
+
+    def feed(self, text: str):
+        automaton = self._automaton
+        classes = automaton._classes
+        transitions = automaton._transitions
+        start = automaton.start
+        candidates = self._candidates
+        prev_class = self._prev_class
+        position = self.position
+        match_until = self.match_until
+        accepting = automaton.accepting
+
+        for char in text:
+            current_class = classes.get(char)
+            if current_class is None:
+                current_class = automaton.char_class(char)
+            if candidates:
+                # Candidates are kept in order of their start offset; when two of them reach the same automaton
+                # state, only the earlier one matters because their futures are identical.
+                advanced = {}
+                for states, candidate_start in candidates.items():
+                    key = (states, prev_class, current_class)
+                    states = transitions.get(key)
+                    if states is None:
+                        states = automaton.step(*key)
+                    if states and states not in advanced:
+                        advanced[states] = candidate_start
+                        if states in accepting:
+                            match_until = position + 1
+                candidates = advanced
+            key = (start, prev_class, current_class)
+            states = transitions.get(key)
+            if states is None:
+                states = automaton.step(*key)
+            if states and states not in candidates:
+                candidates[states] = position
+                if states in accepting:
+                    match_until = position + 1
+            prev_class = current_class
+            position += 1
+
+        self._candidates = candidates
+        self._prev_class = prev_class
+        self.position = position
+        self.match_until = match_until
+        self.candidate_start = next(iter(candidates.values()), None)
+
+    def discard_before(self, offset: int):
+        """Forget candidates that start before `offset` (used when text is force-flushed past them)."""
+        self._candidates = {
+            states: candidate_start for states, candidate_start in self._candidates.items() if candidate_start >= offset
+        }
+        self.candidate_start = next(iter(self._candidates.values()), None)
+
+    def reset(self):
+        self._candidates = {}
+        self._prev_class = None
+        self.position = 0
+        self.candidate_start = None
+        self.match_until = 0
@@ -0,0 +1,295 @@
+"""
+Process-wide Presidio engines.
+
+Loading spaCy and building `AnalyzerEngine`/`AnonymizerEngine` takes seconds and hundreds of MB, so all streaming
+guardrails of a process share one set of engines. They are created on first use (or up front with
+`prewarm_presidio_engines()` at startup) and only read afterwards; per-stream guardrails keep nothing but their
+buffer state.
+
+The module also holds the tiered redaction used by the guardrails (`redact_with_presidio`) and the backends that
+run it away from the calling stream. Presidio itself is imported on first use as well, so importing this module (and
+the regex guardrails that import it) does not load spaCy.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol
+
+from tasks.instrumentation import instrumentation
+
+if TYPE_CHECKING:
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_analyzer.nlp_engine import NlpArtifacts
+    from presidio_anonymizer import AnonymizerEngine
+
+NLP_CONFIGURATION = {
+    "nlp_engine_name": "spacy",
+    "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}]
+}
+
+
+@dataclass(frozen=True)
+class PresidioEngines:
+    analyzer: "AnalyzerEngine"
+    anonymizer: "AnonymizerEngine"
+
+
+_engines: PresidioEngines | None = None
+_lock = threading.Lock()
+
+
+def create_presidio_engines() -> PresidioEngines:
+    """Build a new, unshared set of engines."""
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_analyzer.nlp_engine import NlpEngineProvider
+    from presidio_anonymizer import AnonymizerEngine
+
+    provider = NlpEngineProvider(nlp_configuration=NLP_CONFIGURATION)
+    nlp_engine = provider.create_engine()
+    return PresidioEngines(analyzer=AnalyzerEngine(nlp_engine=nlp_engine), anonymizer=AnonymizerEngine())
+
+
+def get_presidio_engines() -> PresidioEngines:
+    """Return the shared engines, creating them on first use."""
+    global _engines
+    if _engines is None:
+        with _lock:
+            if _engines is None:
+                _engines = create_presidio_engines()
+    return _engines
+
+
+def prewarm_presidio_engines() -> PresidioEngines:
+    """Create the shared engines and run one analysis so the first stream does not pay for lazy spaCy setup."""
+    engines = get_presidio_engines()
+    engines.analyzer.analyze(text="Amanda lives in Seattle, call (206) 555-0683.", language='en')
+    return engines
+
+
+# Pre-screen for the analysis tiers: text without any of these cannot hold an entity any recognizer reports
+# (lowercase relative dates such as "tomorrow" are the accepted exception), and only capitalized words need the
+# spaCy NER pipeline; digits, e-mails and URLs are handled by pattern recognizers over tokenized text.
+_pattern_candidate = re.compile(r'[0-9@]|\w\.\w{2,}')
+_ner_candidate = re.compile(r'[A-Z]')
+
+
+def nlp_artifacts_for(text: str, analyzer: "AnalyzerEngine") -> tuple["NlpArtifacts | None", str]:
+    """
+    Pick the cheapest analysis tier that can still find every entity in the text:
+        - 'skip': nothing any recognizer looks for, the analyzer does not need to run at all;
+        - 'tokens': digits, e-mails or URLs only, pattern recognizers run over the spaCy tokenizer output;
+        - 'nlp': capitalized words, the full spaCy pipeline (NER) runs once and its artifacts are reused by every
+          recognizer.
+    """
+    if _ner_candidate.search(text):
+        return analyzer.nlp_engine.process_text(text, 'en'), 'nlp'
+    if _pattern_candidate.search(text):
+        from presidio_analyzer.nlp_engine import NlpArtifacts
+
+        doc = analyzer.nlp_engine.get_nlp('en').make_doc(text)
+        artifacts = NlpArtifacts(
+            entities=[],
+            tokens=doc,
+            tokens_indices=[token.idx for token in doc],
+            lemmas=[token.lower_ for token in doc],
+            nlp_engine=analyzer.nlp_engine,
+            language='en'
+        )
+        return artifacts, 'tokens'
+    return None, 'skip'
+
+
+def redact_with_presidio(
+        text: str,
+        analyzer: "AnalyzerEngine | None" = None,
+        anonymizer: "AnonymizerEngine | None" = None
+) -> tuple[str, str]:
+    """Anonymize the text with Presidio (the shared engines by default); returns the text and the analysis tier."""
+    if analyzer is None or anonymizer is None:
+        engines = get_presidio_engines()
+        analyzer, anonymizer = analyzer or engines.analyzer, anonymizer or engines.anonymizer
+
+    nlp_artifacts, tier = nlp_artifacts_for(text, analyzer)
+    if nlp_artifacts is None:
+        return text, tier
+
+    results = analyzer.analyze(text=text, language='en', nlp_artifacts=nlp_artifacts)
+    _count_redactions(results)
+    anonymized_result = anonymizer.anonymize(text=text, analyzer_results=results)
+    return anonymized_result.text, tier
+
+
+def _count_redactions(results: list):
+    # Under `ProcessPoolRedactor` this runs in the worker, whose counts are not collected.
+    for result in results:
+        instrumentation.count("pii_redactions_total", detector="presidio", type=result.entity_type)
+
+
+class PresidioRedactor(Protocol):
+    """Backend that redacts text outside the calling stream; results are delivered through futures."""
+
+    def submit(self, text: str) -> Future:
+        """Return a future of `(redacted_text, tier)`, like `redact_with_presidio`."""
+        ...
+
+
+class ProcessPoolRedactor:
+    """
+    Runs Presidio in a pool of worker processes, each holding its own preloaded engines, so CPU-bound analysis of
+    many concurrent streams is not serialized on the GIL of the process that serves them.
+    """
+
+    def __init__(self, workers: int | None = None):
+        # Importing the process pool pulls in multiprocessing, which streams without a pool do not need.
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=prewarm_presidio_engines)
+
+    def submit(self, text: str) -> Future:
+        return self._executor.submit(redact_with_presidio, text)
+
+    def warm_up(self):
+        """Submit one small job per worker and wait for them, so engines are loaded before the first stream."""
+        for future in [self._executor.submit(redact_with_presidio, "warm up") for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+@dataclass
+class BatchingMetrics:
+    """What `BatchingRedactor` did so far; use it to tune `max_batch_texts` and `max_wait_ms`."""
+    batches: int = 0
+    texts: int = 0
+    nlp_texts: int = 0
+    max_batch_texts: int = 0
+    total_queue_seconds: float = 0.0
+    max_queue_seconds: float = 0.0
+    total_batch_seconds: float = 0.0
+
+    @property
+    def mean_batch_texts(self) -> float:
+        return self.texts / self.batches if self.batches else 0.0
+
+    @property
+    def mean_queue_seconds(self) -> float:
+        return self.total_queue_seconds / self.texts if self.texts else 0.0
+
+
+class BatchingRedactor:
+    """
+    Micro-batching Presidio service shared by all streams of a process.
+
+    Slices submitted by any stream are collected for up to `max_wait_ms` (or until `max_batch_texts` are waiting)
+    and analyzed together: texts that need NER go through one `BatchAnalyzerEngine` call, i.e. a single spaCy
+    `nlp.pipe`, which is much faster than one pipeline run per small text. Longer waits give bigger batches and more
+    throughput at the cost of latency; `metrics` shows where the current setting lands.
+    """
+
+    def __init__(self, max_batch_texts: int = 32, max_wait_ms: float = 5.0):
+        self.max_batch_texts = max_batch_texts
+        self.max_wait_ms = max_wait_ms
+        self.metrics = BatchingMetrics()
+        self._pending: list[tuple[str, Future, float]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="presidio-batching", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BatchingRedactor is shut down")
+            self._pending.append((text, future, time.perf_counter()))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_texts:
+                self._condition.notify()
+        return future
+
+    def shutdown(self):
+        """Analyze whatever is still pending, then stop the worker thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _next_batch(self) -> list[tuple[str, Future, float]]:
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if self._pending and not self._closed:
+                deadline = self._pending[0][2] + self.max_wait_ms / 1000
+                while len(self._pending) < self.max_batch_texts and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            batch = self._pending[:self.max_batch_texts]
+            del self._pending[:self.max_batch_texts]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                results = self._redact_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self._record(batch, started)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _redact_batch(self, texts: list[str]) -> list[tuple[str, str]]:
+        engines = get_presidio_engines()
+        results: list[tuple[str, str] | None] = [None] * len(texts)
+        nlp_indices = []
+        for i, text in enumerate(texts):
+            if _ner_candidate.search(text):
+                nlp_indices.append(i)
+            else:
+                results[i] = redact_with_presidio(text, engines.analyzer, engines.anonymizer)
+
+        if nlp_indices:
+            from presidio_analyzer import BatchAnalyzerEngine
+
+            nlp_texts = [texts[i] for i in nlp_indices]
+            analyzed = BatchAnalyzerEngine(analyzer_engine=engines.analyzer).analyze_iterator(
+                nlp_texts, language='en', batch_size=len(nlp_texts)
+            )
+            for i, text, analyzer_results in zip(nlp_indices, nlp_texts, analyzed):
+                _count_redactions(analyzer_results)
+                results[i] = engines.anonymizer.anonymize(text=text, analyzer_results=analyzer_results).text, 'nlp'
+        self.metrics.nlp_texts += len(nlp_indices)
+        return results
+
+    def _record(self, batch: list[tuple[str, Future, float]], started: float):
+        metrics = self.metrics
+        metrics.batches += 1
+        metrics.texts += len(batch)
+        metrics.max_batch_texts = max(metrics.max_batch_texts, len(batch))
+        for _, _, enqueued in batch:
+            metrics.total_queue_seconds += started - enqueued
+            metrics.max_queue_seconds = max(metrics.max_queue_seconds, started - enqueued)
+        metrics.total_batch_seconds += time.perf_counter() - started
@@ -0,0 +1,195 @@
+"""
+Sentence-level streaming output validation.
+
+`output_llm_based_validation.main()` used to wait for the whole response, then validate it, then maybe filter it:
+up to three sequential LLM calls before the user saw anything. `StreamingOutputValidator` consumes the response as
+it streams, cuts it into sentences and validates completed sentences while later tokens are still arriving. Every
+sentence first goes through the local regex detector; the sentences are then sent in batches to the LLM validator
+on a background thread (a new batch whenever the previous call has returned, or when `max_batch_chars` have piled
+up). Sentences are released to the user strictly in order and only once their batch has passed validation, so
+nothing unvalidated is ever shown. Only offending batches are redacted.
+"""
+import contextvars
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from tasks.t_3.streaming_pii_guardrail import StreamingPIIGuardrail
+
+_sentence_end = re.compile(r'[.!?]+["\')\]]*\s+|\n\s*')
+
+
+class SentenceSplitter:
+    """Splits streamed text into sentences; a sentence is released once its terminating whitespace has arrived."""
+
+    def __init__(self, max_sentence_chars: int = 500):
+        self.max_sentence_chars = max_sentence_chars
+        self._buffer = ""
+        self._scanned = 0
+
+    def feed(self, chunk: str) -> list[str]:
+        self._buffer += chunk
+        sentences = []
+        start = 0
+        # A boundary can straddle chunks (". " split as "." + " "), so rescan a few characters of the old tail.
+        for match in _sentence_end.finditer(self._buffer, max(0, self._scanned - 8)):
+            sentences.append(self._buffer[start:match.end()])
+            start = match.end()
+        rest = self._buffer[start:]
+        while len(rest) > self.max_sentence_chars:
+            cut = rest.rfind(" ", 0, self.max_sentence_chars) + 1 or self.max_sentence_chars
+            sentences.append(rest[:cut])
+            rest = rest[cut:]
+        self._buffer = rest
+        self._scanned = len(rest)
+        return sentences
+
+    def finalize(self) -> str:
+        rest, self._buffer, self._scanned = self._buffer, "", 0
+        return rest
+
+
+@dataclass
+class _Batch:
+    text: str
+    verdict: Future | None = None
+
+
+@dataclass
+class ValidationOutcome:
+    """What the validator found over the whole response."""
+    pii_types: set[str] = field(default_factory=set)
+    redactions: int = 0
+    llm_calls: int = 0
+    blocked_reason: str | None = None
+
+
+class StreamingOutputValidator:
+    """
+    Validates a streamed response sentence by sentence.
+
+    `validate` is the LLM output validator (returns an object with `contains_pii`, `pii_types` and `reason`) and
+    `redact` the soft-mode redaction of a batch it flags, called with the batch text and the reported `pii_types`
+    (e.g. `LocalPIIRedactor.redact`, which only calls the LLM filter for types the regexes cannot locate); either
+    may be None to rely on the local regex detector alone. In hard mode (or without `redact`) the first offending
+    batch blocks the rest of the response (`blocked`); like the non-streaming flow, a local regex hit only blocks
+    once the LLM validator has confirmed it (or right away when there is no `validate`).
+    """
+
+    def __init__(
+            self,
+            validate: Callable | None = None,
+            redact: Callable[[str, list[str]], str] | None = None,
+            soft_response: bool = False,
+            max_batch_chars: int = 400,
+            executor: ThreadPoolExecutor | None = None
+    ):
+        self.validate = validate
+        self.redact = redact
+        self.soft_response = soft_response
+        self.max_batch_chars = max_batch_chars
+        self.outcome = ValidationOutcome()
+        self._detector = StreamingPIIGuardrail()
+        self._splitter = SentenceSplitter()
+        self._owns_executor = executor is None and validate is not None
+        self._executor = executor or (ThreadPoolExecutor(max_workers=4) if validate is not None else None)
+        self._batches: deque[_Batch] = deque()
+        self._collecting: list[str] = []
+        self._output: list[str] = []
+
+    @property
+    def blocked(self) -> bool:
+        return self.outcome.blocked_reason is not None
+
+    @property
+    def output(self) -> str:
+        """Everything released so far."""
+        return "".join(self._output)
+
+    def process_chunk(self, chunk: str) -> str:
+        """Feed a streamed chunk and return the validated text that can be shown now."""
+        if self.blocked or not chunk:
+            return ""
+        for sentence in self._splitter.feed(chunk):
+            self._add_sentence(sentence)
+        return self._release(wait=False)
+
+    def finalize(self) -> str:
+        """Validate the rest of the response, wait for every pending batch and return the remaining text."""
+        if not self.blocked:
+            rest = self._splitter.finalize()
+            if rest:
+                self._add_sentence(rest)
+            self._submit()
+        released = self._release(wait=True)
+        self.close()
+        return released
+
+    def close(self):
+        for batch in self._batches:
+            if batch.verdict is not None:
+                batch.verdict.cancel()
+        self._batches.clear()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _add_sentence(self, sentence: str):
+        matches = list(self._detector._pii_regex().finditer(sentence))
+        if matches and self.soft_response:
+            self.outcome.pii_types.update(match.lastgroup for match in matches)
+            sentence = self._detector._redact(sentence, iter(matches), 0, len(sentence))
+            self.outcome.redactions += 1
+        elif matches and self.validate is None:
+            self.outcome.pii_types.update(match.lastgroup for match in matches)
+            self.outcome.blocked_reason = f"Local detector found {', '.join(sorted(self.outcome.pii_types))}"
+            return
+        # In hard mode the sentence is held with its batch until the validator's verdict decides whether it blocks.
+
+        self._collecting.append(sentence)
+        if not self._in_flight() or sum(map(len, self._collecting)) >= self.max_batch_chars:
+            self._submit()
+
+    def _in_flight(self) -> bool:
+        return any(batch.verdict is not None and not batch.verdict.done() for batch in self._batches)
+
+    def _submit(self):
+        if not self._collecting:
+            return
+        batch = _Batch("".join(self._collecting))
+        self._collecting = []
+        if self.validate is not None and batch.text.strip():
+            # In a copy of the caller's context, so the validation span is a child of the caller's stream span.
+            batch.verdict = self._executor.submit(contextvars.copy_context().run, self.validate, batch.text)
+            self.outcome.llm_calls += 1
+        self._batches.append(batch)
+
+    def _release(self, wait: bool) -> str:
+        released = []
+        while self._batches and not self.blocked:
+            batch = self._batches[0]
+            if batch.verdict is not None and not batch.verdict.done():
+                if not wait:
+                    break
+            self._batches.popleft()
+            released.append(self._resolve(batch))
+        # A returned call frees the validator: send what has been collected meanwhile.
+        if not wait and not self.blocked and self._collecting and not self._in_flight():
+            self._submit()
+        text = "".join(released)
+        self._output.append(text)
+        return text
+
+    def _resolve(self, batch: _Batch) -> str:
+        if batch.verdict is None:
+            return batch.text
+        verdict = batch.verdict.result()
+        if not verdict.contains_pii:
+            return batch.text
+        self.outcome.pii_types.update(verdict.pii_types)
+        if not self.soft_response or self.redact is None:
+            self.outcome.blocked_reason = verdict.reason
+            return ""
+        self.outcome.redactions += 1
+        return self.redact(batch.text, verdict.pii_types)
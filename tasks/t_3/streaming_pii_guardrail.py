@@ -1,236 +1,640 @@
 import re
-from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
-from langchain_openai import AzureChatOpenAI
-from presidio_analyzer import AnalyzerEngine
-from presidio_analyzer.nlp_engine import NlpEngineProvider
-from presidio_anonymizer import AnonymizerEngine
-from pydantic import SecretStr
-
-from tasks._constants import DIAL_URL, API_KEY
-
-
-class PresidioStreamingPIIGuardrail:
-
-    def __init__(self, buffer_size: int =100, safety_margin: int = 20):
-        #TODO:
-        # 1. Create dict with language configurations: {"nlp_engine_name": "spacy","models": [{"lang_code": "en", "model_name": "en_core_web_sm"}]}
-        #    Read more about it here: https://microsoft.github.io/presidio/tutorial/05_languages/
-        # 2. Create NlpEngineProvider with created configurations
-        # 3. Create AnalyzerEngine, as `nlp_engine` crate engine by crated provider (will be used as obj var later)
-        # 4. Create AnonymizerEngine (will be used as obj var later)
-        # 5. Create buffer as empty string (here we will accumulate chunks content and process it, will be used as obj var late)
-        # 6. Create buffer_size as `buffer_size` (will be used as obj var late)
-        # 7. Create safety_margin as `safety_margin` (will be used as obj var late)
-        
-        # 1. Create language configuration
-        configuration = {
-            "nlp_engine_name": "spacy",
-            "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}]
-        }
-        
-        # 2. Create NLP engine provider
-        provider = NlpEngineProvider(nlp_configuration=configuration)
-        nlp_engine = provider.create_engine()
-        
-        # 3. Create analyzer
-        self.analyzer = AnalyzerEngine(nlp_engine=nlp_engine)
-        
-        # 4. Create anonymizer
-        self.anonymizer = AnonymizerEngine()
-        
-        # 5-7. Initialize buffer and parameters
-        self.buffer = ""
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+# Presidio (with spaCy) and the LangChain client are only imported by the code that needs them - the Presidio
+# guardrail on first analysis, `main` for the chat - so the regex guardrails import in milliseconds.
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_anonymizer import AnonymizerEngine
+
+from tasks.instrumentation import instrumentation
+from tasks.t_3.known_secrets import KnownSecretsGuardrail, KnownSecretsIndex
+from tasks.t_3.normalization import StreamNormalizer, fold, normalize
+from tasks.t_3.prefix_matcher import PrefixAutomaton, PrefixScanner
+from tasks.t_3.presidio_engines import PresidioRedactor, get_presidio_engines, redact_with_presidio
+
+
+class _RollingBuffer:
+    """
+    Append-only text buffer for streamed chunks.
+
+    Chunks are kept as a list of segments, so appending a token is O(1). The segments are joined only when the
+    guardrail inspects or consumes the buffer, which keeps the total copying linear in the length of the response.
+    """
+
+    def __init__(self):
+        self._segments: list[str] = []
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, chunk: str):
+        self._segments.append(chunk)
+        self._length += len(chunk)
+
+    def text(self) -> str:
+        """Return the buffered text, collapsing the segments into one."""
+        if len(self._segments) > 1:
+            self._segments = [''.join(self._segments)]
+        return self._segments[0] if self._segments else ''
+
+    def consume(self, length: int) -> str:
+        """Remove and return the first `length` characters of the buffer."""
+        text = self.text()
+        if length >= self._length:
+            self._segments = []
+            self._length = 0
+            return text
+        head, tail = text[:length], text[length:]
+        self._segments = [tail] if tail else []
+        self._length = len(tail)
+        return head
+
+
+@dataclass
+class FlushMetrics:
+    """Flush decisions of a streaming guardrail, accumulated over its lifetime."""
+    chunks: int = 0
+    flushes: int = 0
+    forced_flushes: int = 0
+    emitted_chars: int = 0
+    held_chars: int = 0
+    max_held_chars: int = 0
+    max_hold_seconds: float = 0.0
+    first_output_delay: float | None = None
+
+
+class _StreamingGuardrail(ABC):
+    """
+    Buffering and flush policy shared by the streaming guardrails.
+
+    Every chunk is emitted right away up to the earliest position where PII might still be forming; only that
+    suspicious suffix is held back. The hold is bounded by `max_hold_chars` (defaults to `buffer_size`) and,
+    optionally, by `max_hold_seconds`: when either limit is exceeded the held text is flushed anyway, keeping only
+    the last `safety_margin` characters for the size limit.
+
+    Besides `metrics`, `finalize` reports every stream to `tasks.instrumentation` (labelled with `detector`): the
+    characters emitted, the most characters held at once and the longest time a character was held.
+    """
+
+    detector = "stream"
+
+    # Whether the hold only depends on the prefix scanner (the hooks below are not overridden to hold more). Then,
+    # while the scanner has seen no possible match since the last flush, `_flush` emits straight from the buffer
+    # without analyzing it.
+    _scanner_hold = True
+
+    def __init__(
+            self,
+            buffer_size: int = 100,
+            safety_margin: int = 20,
+            max_hold_chars: int | None = None,
+            max_hold_seconds: float | None = None
+    ):
         self.buffer_size = buffer_size
         self.safety_margin = safety_margin
+        self.max_hold_chars = buffer_size if max_hold_chars is None else max_hold_chars
+        self.max_hold_seconds = max_hold_seconds
+        self.metrics = FlushMetrics()
+        self._buffer = _RollingBuffer()
+        self._scanner = PrefixScanner(self._pii_automaton())
+        self._committed = 0
+        self._context = ""
+        # (end offset, arrival time) of every chunk that is still (partly) held.
+        self._arrivals: deque[tuple[int, float]] = deque()
+        self._stream_started: float | None = None
+        # Per-stream counterparts of `metrics`, for instrumentation.
+        self._stream_emitted_from = 0
+        self._stream_max_held = 0
+        self._stream_max_hold_seconds = 0.0
+
+    @property
+    def buffer(self) -> str:
+        return self._buffer.text()
+
+    @classmethod
+    @abstractmethod
+    def _pii_automaton(cls) -> PrefixAutomaton:
+        """Prefix automaton over everything the guardrail redacts; it decides where a candidate begins."""
+
+    def _analyze(self, text: str, offset: int):
+        """Inspect the buffered text (`text[offset:]`) before a flush decision; the result is passed to the hooks below."""
+        return None
+
+    def _hold_start(self, text: str, offset: int, analysis) -> int:
+        """Position in `text` from which the content has to be held back."""
+        candidate_start = self._scanner.candidate_start
+        return len(text) if candidate_start is None else offset + candidate_start - self._committed
+
+    def _clamp(self, end: int, analysis) -> int:
+        """Move a forced flush point back so that it does not cut through detected PII."""
+        return end
+
+    @abstractmethod
+    def _redact_slice(self, text: str, start: int, end: int, analysis) -> str:
+        """Return `text[start:end]`, about to be emitted, with its PII redacted."""
 
     def process_chunk(self, chunk: str) -> str:
-        #TODO:
-        # 1. Check if chunk is present, if not then return chunk itself
-        # 2. Accumulate chunk to `buffer`
-        
-        # 1. Check if chunk is present
+        """Process a streaming chunk and return safe content that can be immediately output."""
         if not chunk:
             return chunk
-        
-        # 2. Accumulate chunk to buffer
-        self.buffer += chunk
-
-        if len(self.buffer) > self.buffer_size:
-            safe_length = len(self.buffer) - self.safety_margin
-            for i in range(safe_length - 1, max(0, safe_length - 20), -1):
-                if self.buffer[i] in ' \n\t.,;:!?':
-                    safe_length = i
-                    break
 
-            text_to_process = self.buffer[:safe_length]
+        now = time.perf_counter()
+        if self._stream_started is None:
+            self._stream_started = now
+            self._stream_emitted_from = self.metrics.emitted_chars
+        self.metrics.chunks += 1
+        self._buffer.append(chunk)
+        scanner = self._scanner
+        scanner.feed(chunk)
+        # The scanner has seen exactly the committed and the buffered text.
+        self._arrivals.append((scanner.position, now))
+        return self._flush(now)
+
+    def _flush(self, now: float) -> str:
+        # Decided from the scanner state alone, without looking at the buffered text, as long as the earliest
+        # candidate stays within the hold limits and nothing can have matched since the last flush.
+        scanner = self._scanner
+        committed = self._committed
+        candidate_start = scanner.candidate_start
+        buffered = scanner.position - committed
+        end = buffered if candidate_start is None else candidate_start - committed
+        held = buffered - end
+        if (held <= self.max_hold_chars
+                and (not held or self.max_hold_seconds is None or now - self._arrivals[0][1] <= self.max_hold_seconds)):
+            if not end:
+                # The whole buffer is one candidate: nothing can be emitted yet.
+                self._record_hold(buffered)
+                return ""
+            if self._scanner_hold and scanner.match_until <= committed:
+                # Emit everything before the earliest candidate as it is.
+                return self._emit(self._buffer.text(), 0, end, (), now)
+
+        text = self._context + self._buffer.text()
+        offset = len(self._context)
+        analysis = self._analyze(text, offset)
+        end = self._hold_start(text, offset, analysis)
+
+        held = len(text) - max(end, offset)
+        forced_end = None
+        if held > self.max_hold_chars:
+            forced_end = max(end, len(text) - self.safety_margin)
+        elif self.max_hold_seconds is not None and held and now - self._arrivals[0][1] > self.max_hold_seconds:
+            forced_end = len(text)
+        if forced_end is not None:
+            end = self._clamp(forced_end, analysis)
+            self.metrics.forced_flushes += 1
+            # Candidates that started in the force-flushed text can no longer be held back.
+            self._scanner.discard_before(self._committed + max(end, offset) - offset)
+
+        if end <= offset:
+            self._record_hold(len(self._buffer))
+            return ""
+        return self._emit(text, offset, end, analysis, now)
+
+    def _emit(self, text: str, offset: int, end: int, analysis, now: float) -> str:
+        output = self._redact_slice(text, offset, end, analysis)
+        emitted = end - offset
+        self._buffer.consume(emitted)
+        committed = self._committed = self._committed + emitted
+        self._context = text[end - 1:end]
+        self.metrics.flushes += 1
+
+        arrivals = self._arrivals
+        arrived = arrivals[0][1]
+        while arrivals and arrivals[0][0] <= committed:
+            arrivals.popleft()
+        self._record_output(emitted, arrived, now)
+        return output
+
+    def _record_output(self, emitted: int, arrived: float, now: float):
+        """Account for `emitted` characters, the earliest of which arrived at `arrived`, being returned at `now`."""
+        metrics = self.metrics
+        metrics.emitted_chars += emitted
+        hold_seconds = now - arrived
+        if hold_seconds > self._stream_max_hold_seconds:
+            self._stream_max_hold_seconds = hold_seconds
+            metrics.max_hold_seconds = max(metrics.max_hold_seconds, hold_seconds)
+        if metrics.first_output_delay is None:
+            metrics.first_output_delay = now - self._stream_started
+        self._record_hold(len(self._buffer))
+
+    def _record_hold(self, held: int):
+        self.metrics.held_chars = held
+        if held > self._stream_max_held:
+            self._stream_max_held = held
+            if held > self.metrics.max_held_chars:
+                self.metrics.max_held_chars = held
 
-            #TODO:
-            # 1. Get results with analyzer by method analyze, text is `text_to_process`, language is 'en'
-            # 2. Anonymize content, use anonymizer method anonymize with such params:
-            #       - text=text_to_process
-            #       - analyzer_results=results
-            # 3. Set `buffer` as `buffer[safe_length:]`
-            # 4. Return anonymized text
-            
-            # 1. Analyze text
-            results = self.analyzer.analyze(text=text_to_process, language='en')
-            
-            # 2. Anonymize
-            anonymized_result = self.anonymizer.anonymize(
-                text=text_to_process,
-                analyzer_results=results
-            )
-            
-            # 3. Update buffer
-            self.buffer = self.buffer[safe_length:]
-            
-            # 4. Return anonymized text
-            return anonymized_result.text
+    def finalize(self) -> str:
+        """Process any remaining content in the buffer at the end of streaming."""
+        text = self._context + self._buffer.text()
+        offset = len(self._context)
+        output = ""
+        if len(text) > offset:
+            output = self._emit(text, offset, len(text), self._analyze(text, offset), time.perf_counter())
+        output += self._drain()
+        if instrumentation.sinks and self._stream_started is not None:
+            self._report_stream()
+        self._scanner.reset()
+        self._committed = 0
+        self._context = ""
+        self._arrivals.clear()
+        self._stream_started = None
+        self._stream_max_held = 0
+        self._stream_max_hold_seconds = 0.0
+        return output
+
+    def _drain(self) -> str:
+        """Return output still owed for text that was already flushed, once the stream has ended."""
+        return ""
 
+    def _report_stream(self):
+        detector = self.detector
+        instrumentation.count("streams_total", detector=detector)
+        instrumentation.count(
+            "stream_emitted_chars_total", self.metrics.emitted_chars - self._stream_emitted_from, detector=detector
+        )
+        instrumentation.observe("stream_max_held_chars", self._stream_max_held, detector=detector)
+        instrumentation.observe("stream_max_hold_seconds", self._stream_max_hold_seconds, detector=detector)
+
+
+class PresidioStreamingPIIGuardrail(_StreamingGuardrail):
+
+    detector = "presidio"
+
+    # Trailing words an NER entity could grow from are held as well (see `_hold_start`).
+    _scanner_hold = False
+
+    # Words that can belong to an entity Presidio recognizes: names and places are capitalized, while numbers,
+    # e-mails and identifiers contain digits or `@`.
+    _entity_word = re.compile(r'[A-Z0-9@]')
+
+    def __init__(
+            self,
+            buffer_size: int =100,
+            safety_margin: int = 20,
+            max_hold_chars: int | None = None,
+            max_hold_seconds: float | None = None,
+            redactor: PresidioRedactor | None = None
+    ):
+        # Presidio engines are process-wide and created on first use (see `tasks.t_3.presidio_engines`), so a
+        # guardrail only keeps the buffering state of its own stream.
+        super().__init__(buffer_size, safety_margin, max_hold_chars, max_hold_seconds)
+        self.analysis_tiers = Counter()
+        # With a redactor (e.g. `ProcessPoolRedactor`) analysis runs elsewhere: `process_chunk` never waits for it and
+        # returns redacted slices once they are ready, always in stream order.
+        self.redactor = redactor
+        self._in_flight: Future | None = None
+        self._queued: list[str] = []
+        # (emitted chars, earliest arrival) of the queued and the in-flight slices: `metrics` counts them as
+        # output only once `_collect` returns their redacted text, and as held until then.
+        self._queued_output: list[tuple[int, float]] = []
+        self._in_flight_output: list[tuple[int, float]] = []
+        self._unreturned = 0
+
+    @property
+    def analyzer(self) -> "AnalyzerEngine":
+        return get_presidio_engines().analyzer
+
+    @property
+    def anonymizer(self) -> "AnonymizerEngine":
+        return get_presidio_engines().anonymizer
+
+    @classmethod
+    def _pii_automaton(cls) -> PrefixAutomaton:
+        # Presidio's pattern recognizers cover the same structured PII as the regex guardrail.
+        return StreamingPIIGuardrail._pii_automaton()
+
+    def _hold_start(self, text: str, offset: int, analysis) -> int:
+        """
+        Besides partial structured PII, hold back the trailing words an NER entity could still grow from: the last
+        (possibly incomplete) word and the capitalized, numeric or e-mail-like words right before it.
+        """
+        start = len(text)
+        while start > offset and not text[start - 1].isspace():
+            start -= 1
+        while start > offset:
+            word_end = start
+            while word_end > offset and text[word_end - 1].isspace():
+                word_end -= 1
+            word_start = word_end
+            while word_start > offset and not text[word_start - 1].isspace():
+                word_start -= 1
+            if word_start == word_end or not self._entity_word.search(text, word_start, word_end):
+                break
+            start = word_start
+        return min(start, super()._hold_start(text, offset, analysis))
+
+    def _redact_slice(self, text: str, start: int, end: int, analysis) -> str:
+        text_to_process = text[start:end]
+        if self.redactor is None:
+            redacted, tier = redact_with_presidio(text_to_process, self.analyzer, self.anonymizer)
+            self.analysis_tiers[tier] += 1
+            return redacted
+        # Slices flushed while the previous one is still being analyzed are adjacent, so they are sent on as one text.
+        self._queued.append(text_to_process)
         return ""
 
-    def finalize(self) -> str:
-        #TODO:
-        # 1. Check if `buffer` is present, otherwise return empty string
-        # 2. Analyze `buffer`
-        # 3. Anonymize `buffer` with analyzed results
-        # 4. Set `buffer` as empty string
-        # 5. Return anonymized text
-        
-        # 1. Check if buffer is present
-        if not self.buffer:
+    def _record_output(self, emitted: int, arrived: float, now: float):
+        if self.redactor is None:
+            super()._record_output(emitted, arrived, now)
+            return
+        self._queued_output.append((emitted, arrived))
+        self._unreturned += emitted
+        self._record_hold(len(self._buffer))
+
+    def _record_hold(self, held: int):
+        super()._record_hold(held + self._unreturned)
+
+    def _collect(self, wait: bool) -> str:
+        """Return redacted slices from the redactor in stream order, submitting queued text whenever it is free."""
+        parts = []
+        while True:
+            if self._in_flight is not None:
+                if not (wait or self._in_flight.done()):
+                    break
+                redacted, tier = self._in_flight.result()
+                self.analysis_tiers[tier] += 1
+                parts.append(redacted)
+                self._in_flight = None
+                emitted = sum(length for length, _ in self._in_flight_output)
+                self._unreturned -= emitted
+                super()._record_output(emitted, self._in_flight_output[0][1], time.perf_counter())
+            if not self._queued:
+                break
+            self._in_flight = self.redactor.submit(''.join(self._queued))
+            self._in_flight_output = self._queued_output
+            self._queued = []
+            self._queued_output = []
+        return ''.join(parts)
+
+    def process_chunk(self, chunk: str) -> str:
+        output = super().process_chunk(chunk)
+        if self.redactor is None:
+            return output
+        return self._collect(wait=False)
+
+    def _drain(self) -> str:
+        if self.redactor is None:
             return ""
-        
-        # 2. Analyze buffer
-        results = self.analyzer.analyze(text=self.buffer, language='en')
-        
-        # 3. Anonymize
-        anonymized_result = self.anonymizer.anonymize(
-            text=self.buffer,
-            analyzer_results=results
-        )
-        
-        # 4. Clear buffer
-        self.buffer = ""
-        
-        # 5. Return anonymized text
-        return anonymized_result.text
+        return self._collect(wait=True)
 
 
-class StreamingPIIGuardrail:
+class StreamingPIIGuardrail(_StreamingGuardrail):
     """
     A streaming guardrail that detects and redacts PII in real-time as chunks arrive from the LLM.
 
-    Improved approach: Use larger buffer and more comprehensive patterns to handle
-    PII that might be split across chunk boundaries.
+    A prefix automaton built from the same patterns tracks, as chunks arrive, where the earliest possible PII match
+    in the buffer begins. Everything before it is redacted and emitted immediately; flushes never cut through a match.
     """
 
-    def __init__(self, buffer_size: int =100, safety_margin: int = 20):
-        self.buffer_size = buffer_size
-        self.safety_margin = safety_margin
-        self.buffer = ""
-
-    @property
-    def _pii_patterns(self):
-        return {
-            'ssn': (
-                r'\b(\d{3}[-\s]?\d{2}[-\s]?\d{4})\b',
-                '[REDACTED-SSN]'
-            ),
-            'credit_card': (
-                r'\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{13,19}\b',
-                '[REDACTED-CREDIT-CARD]'
-            ),
-            'license': (
-                r'\b[A-Z]{2}-DL-[A-Z0-9]+\b',
-                '[REDACTED-LICENSE]'
-            ),
-            'bank_account': (
-                r'\b(?:Bank\s+of\s+\w+\s*[-\s]*)?(?<!\d)(\d{10,12})(?!\d)\b',
-                '[REDACTED-ACCOUNT]'
-            ),
-            'date': (
-                r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b|\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d{4}-\d{2}-\d{2}\b',
-                '[REDACTED-DATE]'
-            ),
-            'cvv': (
-                r'(?:CVV:?\s*|CVV["\']\s*:\s*["\']\s*)(\d{3,4})',
-                r'CVV: [REDACTED]'
-            ),
-            'card_exp': (
-                r'(?:Exp(?:iry)?:?\s*|Expiry["\']\s*:\s*["\']\s*)(\d{2}/\d{2})',
-                r'Exp: [REDACTED]'
-            ),
-            'address': (
-                r'\b(\d+\s+[A-Za-z\s]+(?:Street|St\.?|Avenue|Ave\.?|Boulevard|Blvd\.?|Road|Rd\.?|Drive|Dr\.?|Lane|Ln\.?|Way|Circle|Cir\.?|Court|Ct\.?|Place|Pl\.?))\b',
-                '[REDACTED-ADDRESS]'
-            ),
-            'currency': (
-                r'\$[\d,]+\.?\d*',
-                '[REDACTED-AMOUNT]'
+    detector = "regex"
+
+    # Patterns are listed in priority order: when several of them match at the same position, the first one in
+    # this dict wins (so a card number is never reported as a bank account or an SSN).
+    _pii_patterns: dict[str, tuple[str, str]] = {
+        'credit_card': (
+            r'\b(?:\d{4}[-\s]?){3}\d{4}\b|\b\d{13,19}\b',
+            '[REDACTED-CREDIT-CARD]'
+        ),
+        'bank_account': (
+            r'\b(?:Bank\s+of\s+\w+\s*[-\s]*)?(?<!\d)(\d{10,12})(?!\d)\b',
+            '[REDACTED-ACCOUNT]'
+        ),
+        'ssn': (
+            r'\b(\d{3}[-\s]?\d{2}[-\s]?\d{4})\b',
+            '[REDACTED-SSN]'
+        ),
+        'license': (
+            r'\b[A-Z]{2}-DL-[A-Z0-9]+\b',
+            '[REDACTED-LICENSE]'
+        ),
+        'date': (
+            r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b|\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d{4}-\d{2}-\d{2}\b',
+            '[REDACTED-DATE]'
+        ),
+        'cvv': (
+            r'(?:CVV:?\s*|CVV["\']\s*:\s*["\']\s*)(\d{3,4})',
+            'CVV: [REDACTED]'
+        ),
+        'card_exp': (
+            r'(?:Exp(?:iry)?:?\s*|Expiry["\']\s*:\s*["\']\s*)(\d{2}/\d{2})',
+            'Exp: [REDACTED]'
+        ),
+        # The street line, and the city, state and ZIP after it when they follow as ", City, ST 12345" or "ST 12345"
+        # (matched case-sensitively, so ordinary words after an address are not taken for a city).
+        'address': (
+            r'\b(\d+\s+[A-Za-z\s]+(?:Street|St\.?|Avenue|Ave\.?|Boulevard|Blvd\.?|Road|Rd\.?|Drive|Dr\.?|Lane|Ln\.?|Way|Circle|Cir\.?|Court|Ct\.?|Place|Pl\.?)'
+            r'(?-i:,\s*[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,2},?\s+[A-Z]{2}(?:\s+\d{5}(?:-\d{4})?)?\b|,?\s+[A-Z]{2}\s+\d{5}(?:-\d{4})?\b)?)\b',
+            '[REDACTED-ADDRESS]'
+        ),
+        'currency': (
+            r'\$[\d,]+\.?\d*',
+            '[REDACTED-AMOUNT]'
+        )
+    }
+
+    @classmethod
+    def _pii_regex(cls) -> re.Pattern[str]:
+        """Combine `_pii_patterns` into a single alternation of named groups, compiled once per class."""
+        compiled = cls.__dict__.get('_compiled_pii_regex')
+        if compiled is None:
+            compiled = re.compile(
+                '|'.join(f'(?P<{name}>{pattern})' for name, (pattern, _) in cls._pii_patterns.items()),
+                flags=re.IGNORECASE | re.MULTILINE
             )
-        }
+            cls._compiled_pii_regex = compiled
+        return compiled
+
+    @classmethod
+    def _pii_automaton(cls) -> PrefixAutomaton:
+        """Prefix automaton for the combined PII pattern, built once per class."""
+        automaton = cls.__dict__.get('_compiled_pii_automaton')
+        if automaton is None:
+            regex = cls._pii_regex()
+            automaton = PrefixAutomaton(regex.pattern, regex.flags)
+            cls._compiled_pii_automaton = automaton
+        return automaton
 
     def _detect_and_redact_pii(self, text: str) -> str:
-        """Apply all PII patterns to redact sensitive information."""
-        cleaned_text = text
-        for pattern_name, (pattern, replacement) in self._pii_patterns.items():
-            if pattern_name.lower() in ['cvv', 'card_exp']:
-                cleaned_text = re.sub(pattern, replacement, cleaned_text, flags=re.IGNORECASE | re.MULTILINE)
-            else:
-                cleaned_text = re.sub(pattern, replacement, cleaned_text, flags=re.IGNORECASE | re.MULTILINE)
-        return cleaned_text
-
-    def _has_potential_pii_at_end(self, text: str) -> bool:
-        """Check if text ends with a partial pattern that might be PII."""
-        partial_patterns = [
-            r'\d{3}[-\s]?\d{0,2}$',  # Partial SSN
-            r'\d{4}[-\s]?\d{0,4}$',  # Partial credit card
-            r'[A-Z]{1,2}-?D?L?-?[A-Z0-9]*$',  # Partial license
-            r'\(?\d{0,3}\)?[-.\s]?\d{0,3}$',  # Partial phone
-            r'\$[\d,]*\.?\d*$',  # Partial currency
-            r'\b\d{1,4}/\d{0,2}$',  # Partial date
-            r'CVV:?\s*\d{0,3}$',  # Partial CVV
-            r'Exp(?:iry)?:?\s*\d{0,2}$',  # Partial expiry
-            r'\d+\s+[A-Za-z\s]*$',  # Partial address
-        ]
-
-        for pattern in partial_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-        return False
-
-    def process_chunk(self, chunk: str) -> str:
-        """Process a streaming chunk and return safe content that can be immediately output."""
-        if not chunk:
-            return chunk
+        """Redact every PII match in a single left-to-right pass over the text."""
+        return self._redact(text, self._pii_regex().finditer(text), 0, len(text))
+
+    def _redact(self, text: str, matches, start: int, end: int) -> str:
+        """Build `text[start:end]` with every match that ends within it replaced by its placeholder."""
+        parts = []
+        last_end = start
+        for match in matches:
+            if match.end() > end:
+                break
+            parts.append(text[last_end:match.start()])
+            parts.append(self._pii_patterns[match.lastgroup][1])
+            instrumentation.count("pii_redactions_total", detector=self.detector, type=match.lastgroup)
+            last_end = match.end()
+        if not parts:
+            return text[start:end]
+        parts.append(text[last_end:end])
+        return ''.join(parts)
+
+    # (committed offset, scanner `match_until`, analysed length) and the matches found in the buffer at that point.
+    _analysis: tuple[tuple[int, int, int], list[re.Match]] | None = None
+
+    def _analyze(self, text: str, offset: int) -> list[re.Match]:
+        match_until = self._scanner.match_until
+        if match_until <= self._committed:
+            # No candidate could complete a match anywhere in the buffer, so it cannot contain one.
+            return []
+        if self._analysis is not None:
+            (committed, analysed_until, length), matches = self._analysis
+            # Nothing was emitted and no match can end in the text appended since: every match found before still
+            # stands unless it ended right at the old end of the text, where its trailing `\b` saw no next character.
+            if (committed == self._committed and analysed_until == match_until
+                    and (not matches or matches[-1].end() < length)):
+                return matches
+        # The character before `offset` is the last emitted one: it gives `\b` and lookbehinds their real context.
+        matches = list(self._pii_regex().finditer(text, offset))
+        self._analysis = (self._committed, match_until, len(text)), matches
+        return matches
+
+    def _hold_start(self, text: str, offset: int, matches: list[re.Match]) -> int:
+        return self._clamp(super()._hold_start(text, offset, matches), matches)
+
+    def _clamp(self, end: int, matches: list[re.Match]) -> int:
+        for match in matches:
+            if match.end() > end:
+                return min(end, match.start())
+        return end
+
+    def _redact_slice(self, text: str, start: int, end: int, matches: list[re.Match]) -> str:
+        return self._redact(text, matches, start, end)
 
-        self.buffer += chunk
+    def finalize(self) -> str:
+        output = super().finalize()
+        self._analysis = None
+        return output
 
-        if len(self.buffer) > self.buffer_size:
-            safe_output_length = len(self.buffer) - self.safety_margin
 
-            for i in range(safe_output_length - 1, max(0, safe_output_length - 20), -1):
-                if self.buffer[i] in ' \n\t.,;:!?':
-                    test_text = self.buffer[:i]
-                    if not self._has_potential_pii_at_end(test_text):
-                        safe_output_length = i
-                        break
+class NormalizingPIIGuardrail(StreamingPIIGuardrail):
+    """
+    `StreamingPIIGuardrail` behind a `StreamNormalizer`: the patterns run over the normalized stream (spelled-out
+    digits, homoglyphs, zero-width characters and extra separators folded away), while the output is built from
+    the original text, with every match replacing the original span it was normalized from.
+    """
 
-            text_to_output = self.buffer[:safe_output_length]
-            safe_output = self._detect_and_redact_pii(text_to_output)
-            self.buffer = self.buffer[safe_output_length:]
-            return safe_output
+    detector = "normalizing"
+
+    def __init__(
+            self,
+            buffer_size: int = 100,
+            safety_margin: int = 20,
+            max_hold_chars: int | None = None,
+            max_hold_seconds: float | None = None
+    ):
+        super().__init__(buffer_size, safety_margin, max_hold_chars, max_hold_seconds)
+        self._normalizer = StreamNormalizer()
+        self._original = _RollingBuffer()
+        self._original_committed = 0
+        # Original end offset of every normalized character that has not been emitted yet.
+        self._ends: list[int] = []
+        self._ends_head = 0
+
+    def _normalized(self, pairs: list[tuple[str, int]]) -> str:
+        self._ends.extend(end for _, end in pairs)
+        return ''.join(char for char, _ in pairs)
 
-        return ""
+    def process_chunk(self, chunk: str) -> str:
+        if not chunk:
+            return chunk
+        self._original.append(chunk)
+        pairs = []
+        self._normalizer.feed(chunk, pairs)
+        return super().process_chunk(self._normalized(pairs))
 
     def finalize(self) -> str:
-        """Process any remaining content in the buffer at the end of streaming."""
-        if self.buffer:
-            final_output = self._detect_and_redact_pii(self.buffer)
-            self.buffer = ""
-            return final_output
-        return ""
+        pairs = []
+        self._normalizer.finalize(pairs)
+        output = super().process_chunk(self._normalized(pairs)) + super().finalize()
+        # Characters dropped at the very end of the stream (zero-width) belong to no normalized character.
+        output += self._original.consume(len(self._original))
+        self._normalizer = StreamNormalizer()
+        self._original_committed = 0
+        self._ends, self._ends_head = [], 0
+        return output
+
+    def _detect_and_redact_pii(self, text: str) -> str:
+        normalized, ends = normalize(text)
+        if not normalized:
+            return text
+        redacted = self._redact_original(text, ends, 0, self._pii_regex().finditer(normalized), 0, len(normalized))
+        return redacted + text[ends[-1]:]
+
+    def _redact_slice(self, text: str, start: int, end: int, matches: list[re.Match]) -> str:
+        # `text[start]` is the first normalized character that has not been emitted; its span starts at
+        # `_original_committed`. The emitted original text is consumed here, right before `_emit` consumes the
+        # normalized buffer.
+        head = self._ends_head - start
+        original_end = self._ends[head + end - 1]
+        output = self._redact_original(
+            self._original.text(), self._ends, head, iter(matches), start, end, self._original_committed
+        )
+        self._original.consume(original_end - self._original_committed)
+        self._original_committed = original_end
+        self._ends_head += end - start
+        if self._ends_head > 1024 and self._ends_head * 2 > len(self._ends):
+            del self._ends[:self._ends_head]
+            self._ends_head = 0
+        return output
+
+    @staticmethod
+    def _plausible(match: re.Match, original: str) -> bool:
+        """
+        Whether a match on the normalized text stands, given the original text it was normalized from.
+
+        An address must start with a number written as digits ("one of the best" is not a street), and nine digits
+        that were joined from single ones only count as an SSN if they kept a 3-2-4 grouping ("she scored
+        1 2 3 4 5 6 7 8 9" is not one).
+        """
+        folded = ''.join(map(fold, original))
+        if match.lastgroup == 'address':
+            return folded[:1].isdecimal()
+        if match.lastgroup == 'ssn':
+            return folded.isdecimal() or not match.group().isdecimal()
+        return True
+
+    def _redact_original(
+            self, original: str, ends: list[int], head: int, matches, start: int, end: int, base: int = 0
+    ) -> str:
+        """
+        Build the original text of the normalized `start:end` slice with every match that ends within it replaced.
+
+        `ends[head + i]` is the original end offset of normalized character `i`, `original[0]` is at offset `base`.
+        """
+        def span_start(i: int) -> int:
+            return ends[head + i - 1] if i > start else base
+
+        parts = []
+        last_end = base
+        for match in matches:
+            if match.end() > end:
+                break
+            if not self._plausible(
+                    match, original[span_start(match.start()) - base:ends[head + match.end() - 1] - base]
+            ):
+                continue
+            parts.append(original[last_end - base:span_start(match.start()) - base])
+            parts.append(self._pii_patterns[match.lastgroup][1])
+            instrumentation.count("pii_redactions_total", detector=self.detector, type=match.lastgroup)
+            last_end = ends[head + match.end() - 1]
+        parts.append(original[last_end - base:ends[head + end - 1] - base])
+        return ''.join(parts)
 
 
 SYSTEM_PROMPT = "You are a secure colleague directory assistant designed to help users find contact information for business purposes."
@@ -254,29 +658,35 @@ PROFILE = """
 #TODO:
 # Create AzureChatOpenAI client, model to use `gpt-4.1-nano-2025-04-14` (or any other mini or nano models)
 
-llm_client = AzureChatOpenAI(
-    temperature=0.0,
-    azure_deployment="gpt-4.1-nano-2025-04-14",
-    azure_endpoint=DIAL_URL,
-    api_key=SecretStr(API_KEY),
-    api_version="",
-    streaming=True
-)
+def create_llm_client() -> "AzureChatOpenAI":
+    from tasks.http_pool import create_client
+
+    return create_client("gpt-4.1-nano-2025-04-14", streaming=True)
 
 def main():
+    from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
+
+    from tasks.history import ConversationHistory, llm_summarizer
+    from tasks.http_pool import get_http_pool
+    
+    llm_client = create_llm_client()
+
     #TODO:
     # 1. Create PresidioStreamingPIIGuardrail or StreamingPIIGuardrail
     # 2. Create list of messages with system prompt and profile
     # 3. Create console chat with LLM, preserve history there and while streaming filter content with streaming guardrail
     
-    # 1. Create streaming guardrail (using StreamingPIIGuardrail as it's more robust)
-    guardrail = StreamingPIIGuardrail(buffer_size=100, safety_margin=20)
+    # 1. Create streaming guardrail (using StreamingPIIGuardrail as it's more robust, behind the normalization pre-pass)
+    guardrail = NormalizingPIIGuardrail(buffer_size=100, safety_margin=20)
+    # The profile's own values are matched exactly first (also when spelled out or re-separated).
+    secrets_guardrail = KnownSecretsGuardrail(KnownSecretsIndex.from_profile(PROFILE))
     
-    # 2. Initialize messages
+    # 2. Initialize messages (pinned; older turns are summarized within the token budget)
     messages: list[BaseMessage] = [
         SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=PROFILE)
     ]
+    history = ConversationHistory(messages, summarizer=llm_summarizer(llm_client))
     
     print("🛡️  Secure Assistant with Streaming PII Guardrail")
     print("=" * 80)
@@ -288,28 +698,32 @@ def main():
         user_input = input("\n👤 You: ").strip()
         
         if user_input.lower() in ['quit', 'exit']:
+            print(get_http_pool().report())
+            print(instrumentation.report())
+            instrumentation.shutdown()
             print("Goodbye!")
             break
         
         if not user_input:
             continue
         
-        messages.append(HumanMessage(content=user_input))
+        history.append(HumanMessage(content=user_input))
         
         # Stream response with PII filtering
         print("\n🤖 Assistant: ", end="", flush=True)
         
         full_response = ""
-        for chunk in llm_client.stream(messages):
-            if chunk.content:
-                # Process chunk through guardrail
-                safe_output = guardrail.process_chunk(chunk.content)
-                if safe_output:
-                    print(safe_output, end="", flush=True)
-                    full_response += safe_output
-        
-        # Finalize any remaining buffer
-        final_output = guardrail.finalize()
+        with instrumentation.span("stream", task="t_3", detector=guardrail.detector):
+            for chunk in llm_client.stream(history.messages()):
+                if chunk.content:
+                    # Process chunk through guardrail
+                    safe_output = guardrail.process_chunk(secrets_guardrail.process_chunk(chunk.content))
+                    if safe_output:
+                        print(safe_output, end="", flush=True)
+                        full_response += safe_output
+            
+            # Finalize any remaining buffer
+            final_output = guardrail.process_chunk(secrets_guardrail.finalize()) + guardrail.finalize()
         if final_output:
             print(final_output, end="", flush=True)
             full_response += final_output
@@ -317,11 +731,12 @@ def main():
         print("\n")  # New line after streaming
         
         # Add complete response to history
-        messages.append(AIMessage(content=full_response))
-
+        history.append(AIMessage(content=full_response))
+        print(history.report())
 
 
-main()
+if __name__ == "__main__":
+    main()
 
 #TODO:
 # ---------